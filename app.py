@@ -1,20 +1,40 @@
+import csv
+import hashlib
+import io
+import json
 import os
+import re
+import secrets
+import socket
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date as date_type, datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache, partial
 from urllib.parse import unquote, urlparse
 
-from flask import Flask, render_template, redirect, url_for, flash, session, request
+from flask import Flask, Response, make_response, render_template, redirect, url_for, flash, session, request, g, has_app_context, has_request_context, jsonify, stream_with_context
+import click
 import pymysql
-from pymysql.cursors import DictCursor
+from pymysql.constants import SERVER_STATUS
+from pymysql.cursors import DictCursor, SSCursor
 from werkzeug.security import generate_password_hash, check_password_hash
 from forms import RegisterForm, LoginForm
+import sqlite_backend
 
 app = Flask(__name__)
 app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "dev")  # change to strong secret in production
 
 
-def _build_db_config():
-    url = os.getenv("DATABASE_URL")
+def _build_db_config(url=None):
+    url = url or os.getenv("DATABASE_URL")
     if url:
         parsed = urlparse(url)
+        if parsed.scheme == "sqlite":
+            # sqlite:///mess.db is relative to the working directory, sqlite:////var/lib/mess.db absolute
+            return {"database": unquote(parsed.path[1:]) or "mess.db", "timeout": float(os.getenv("DB_BUSY_TIMEOUT", "10"))}
         database = parsed.path.lstrip("/") or None
         config = {
             "host": parsed.hostname,
@@ -39,497 +59,1464 @@ def _build_db_config():
     return {k: v for k, v in config.items() if v is not None}
 
 
+DB_BACKEND = "sqlite" if urlparse(os.getenv("DATABASE_URL", "")).scheme == "sqlite" else "mysql"
 DB_CONFIG = _build_db_config()
-DEFAULT_DB_NAME = os.getenv("DB_NAME") or DB_CONFIG.get("database") or "mess_management"
+if DB_BACKEND == "sqlite":
+    DEFAULT_DB_NAME = DB_CONFIG["database"]
+else:
+    DEFAULT_DB_NAME = os.getenv("DB_NAME") or DB_CONFIG.get("database") or "mess_management"
 
+# Optional read replica (same backend as the primary) for read-only pages. Replica
+# connections run in autocommit so every query sees the latest replicated data.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL")
+READ_DB_CONFIG = None
+if READ_DATABASE_URL:
+    READ_DB_CONFIG = {"database": DEFAULT_DB_NAME, **_build_db_config(READ_DATABASE_URL), "autocommit": True}
+# After a write, the same session keeps reading from the primary for this long (0 disables)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 
-def get_connection(database=None, use_default=True):
-    config = DB_CONFIG.copy()
-    if database:
-        config["database"] = database
-    elif use_default and DEFAULT_DB_NAME:
-        config["database"] = DEFAULT_DB_NAME
-    else:
-        config.pop("database", None)
+
+# --------- Connection Pool ---------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+DB_POOL_PING_INTERVAL = int(os.getenv("DB_POOL_PING_INTERVAL", "30"))
+READ_DB_POOL_SIZE = int(os.getenv("READ_DB_POOL_SIZE", str(DB_POOL_SIZE)))
+
+
+def connect_database(**config):
+    """Open a raw connection for the configured backend"""
+    if DB_BACKEND == "sqlite":
+        return sqlite_backend.connect(**config)
     return pymysql.connect(**config)
 
 
-def init_db():
-    # Create database and users table if they don't exist
-    try:
-        # Ensure database exists
-        conn = get_connection(use_default=False)
-        conn.autocommit(True)
-        cur = conn.cursor()
-        try:
-            cur.execute(
-                f"CREATE DATABASE IF NOT EXISTS {DEFAULT_DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
-            )
-        except Exception as create_err:
-            print(f"Database creation skipped/failed: {create_err}")
-        cur.close()
-        conn.close()
+class PoolTimeout(pymysql.err.OperationalError):
+    """No pooled connection became free within DB_POOL_TIMEOUT seconds."""
 
-        # Ensure users table exists
-        conn = get_connection()
-        conn.autocommit(True)
-        cur = conn.cursor()
-        
-        # First check if users table exists
-        cur.execute("SHOW TABLES LIKE 'users'")
-        if not cur.fetchone():
-            # Create new table with all columns
-            cur.execute(
-                """
-                CREATE TABLE users (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    name VARCHAR(100) NOT NULL,
-                    email VARCHAR(255) NOT NULL UNIQUE,
-                    password_hash VARCHAR(255) NOT NULL,
-                    role ENUM('admin','member') NOT NULL DEFAULT 'member',
-                    mess_start_date DATE DEFAULT NULL,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                ) ENGINE=InnoDB
-                """
-            )
-        else:
-            # Table exists, add missing columns
-            try:
-                cur.execute("SHOW COLUMNS FROM users LIKE 'role'")
-                if not cur.fetchone():
-                    cur.execute("ALTER TABLE users ADD COLUMN role ENUM('admin','member') NOT NULL DEFAULT 'member' AFTER password_hash")
-                    print("Added role column")
-            except Exception as e:
-                print(f"Role column check: {e}")
-                
-            try:
-                cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-                if not cur.fetchone():
-                    cur.execute("ALTER TABLE users ADD COLUMN mess_start_date DATE DEFAULT NULL AFTER role")
-                    print("Added mess_start_date column")
-            except Exception as e:
-                print(f"Mess start date column check: {e}")
-                
-            try:
-                cur.execute("SHOW COLUMNS FROM users LIKE 'is_active'")
-                if not cur.fetchone():
-                    cur.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT TRUE AFTER mess_start_date")
-                    print("Added is_active column")
-            except Exception as e:
-                print(f"Is active column check: {e}")
-        
-        # Other core tables
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS meals (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                date DATE NOT NULL,
-                breakfast TINYINT(1) DEFAULT 0,
-                lunch TINYINT(1) DEFAULT 0,
-                dinner TINYINT(1) DEFAULT 0,
-                UNIQUE KEY uniq_user_date (user_id, date),
-                CONSTRAINT fk_meals_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            ) ENGINE=InnoDB
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS expenses (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                date DATE NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                category VARCHAR(100),
-                notes VARCHAR(255),
-                created_by INT,
-                CONSTRAINT fk_expenses_user FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
-            ) ENGINE=InnoDB
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS payments (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                date DATE NOT NULL,
-                amount DECIMAL(10,2) NOT NULL,
-                method VARCHAR(50),
-                reference VARCHAR(100),
-                status ENUM('pending','approved','rejected') NOT NULL DEFAULT 'pending',
-                approved_by INT NULL,
-                approved_at TIMESTAMP NULL,
-                CONSTRAINT fk_payments_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                CONSTRAINT fk_payments_approver FOREIGN KEY (approved_by) REFERENCES users(id) ON DELETE SET NULL
-            ) ENGINE=InnoDB
-            """
-        )
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS menu (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                date DATE NOT NULL UNIQUE,
-                breakfast_menu VARCHAR(255),
-                lunch_menu VARCHAR(255),
-                dinner_menu VARCHAR(255)
-            ) ENGINE=InnoDB
-            """
-        )
-        # Weekly fixed fees for meals
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS weekly_fees (
-                weekday ENUM('Sunday','Monday','Tuesday','Wednesday','Thursday','Friday','Saturday') PRIMARY KEY,
-                breakfast_fee DECIMAL(10,2) DEFAULT 0,
-                lunch_fee DECIMAL(10,2) DEFAULT 0,
-                dinner_fee DECIMAL(10,2) DEFAULT 0
-            ) ENGINE=InnoDB
-            """
-        )
-        # Monthly billing table
-        cur.execute(
-            """
-            CREATE TABLE IF NOT EXISTS monthly_bills (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                month VARCHAR(7) NOT NULL,
-                total_meals INT DEFAULT 0,
-                cancelled_meals INT DEFAULT 0,
-                billable_meals INT DEFAULT 0,
-                meal_rate DECIMAL(10,2) DEFAULT 0,
-                total_amount DECIMAL(10,2) DEFAULT 0,
-                paid_amount DECIMAL(10,2) DEFAULT 0,
-                due_amount DECIMAL(10,2) DEFAULT 0,
-                status ENUM('pending','paid','overdue') DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                UNIQUE KEY uniq_user_month (user_id, month),
-                CONSTRAINT fk_bills_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            ) ENGINE=InnoDB
-            """
-        )
-        # Seed weekly fees if empty
-        cur.execute("SELECT COUNT(*) FROM weekly_fees")
-        if (cur.fetchone() or [0])[0] == 0:
-            fee_values = [
-                ("Sunday", 15.00, 45.00, 40.00),
-                ("Monday", 20.00, 45.00, 40.00),
-                ("Tuesday", 25.00, 45.00, 40.00),
-                ("Wednesday", 20.00, 50.00, 40.00),
-                ("Thursday", 20.00, 45.00, 45.00),
-                ("Friday", 20.00, 50.00, 40.00),
-                ("Saturday", 25.00, 45.00, 40.00),
-            ]
-            cur.executemany(
-                "INSERT INTO weekly_fees (weekday, breakfast_fee, lunch_fee, dinner_fee) VALUES (%s,%s,%s,%s)",
-                fee_values,
-            )
-        
-        # Seed admin if no admin exists
-        cur.execute("SELECT id FROM users WHERE role='admin' LIMIT 1")
-        has_admin = cur.fetchone()
-        if not has_admin:
-            admin_email = "admin@mess.com"
-            admin_name = "Admin"
-            admin_password_hash = generate_password_hash("admin123")
+
+class _PoolEntry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = self.last_used = time.monotonic()
+
+
+class PooledConnection:
+    """Borrowed pool connection; close() hands it back instead of disconnecting."""
+
+    def __init__(self, pool, entry, request_scoped=False):
+        self._pool = pool
+        self._entry = entry
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        entry = self.__dict__.get("_entry")
+        if entry is None:
+            raise pymysql.err.InterfaceError("Connection already returned to the pool")
+        return getattr(entry.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self.__getattr__("cursor")(*args, **kwargs), replica=self._pool.replica)
+
+    def close(self):
+        # Request-scoped connections are returned by the app context teardown
+        if not self._request_scoped:
+            self.release()
+
+    def release(self):
+        entry, self._entry = self._entry, None
+        if entry is not None:
+            self._pool.release(entry)
+
+    def discard(self):
+        """Close the underlying connection instead of reusing it (e.g. after an abandoned unbuffered read)"""
+        entry = self._entry
+        if entry is not None:
             try:
-                cur.execute(
-                    "INSERT INTO users (name, email, password_hash, role) VALUES (%s, %s, %s, 'admin')",
-                    (admin_name, admin_email, admin_password_hash),
-                )
+                entry.raw.close()
             except Exception:
                 pass
-        cur.close()
-        conn.close()
-        print("Database initialization completed successfully!")
-    except pymysql.MySQLError as err:
-        # Simple stdout log; keep minimal
-        print(f"Database init error: {err}")
+        self.release()
 
 
-init_db()
+class ConnectionPool:
+    """Bounded, thread-safe pool of pymysql (or pymysql-compatible SQLite) connections.
 
+    Idle connections are pinged before reuse when they have been idle longer
+    than ping_interval and are replaced once they are older than recycle
+    seconds. After a fork (gunicorn workers) the child starts with an empty
+    pool rather than sharing the parent's sockets. replica marks a pool of
+    read replica connections, whose cursors may see lagging data.
+    """
 
-def force_update_db():
-    """Force update database schema for existing installations"""
-    try:
-        conn = get_connection()
-        conn.autocommit(True)
-        cur = conn.cursor()
-        
-        print("Checking and updating database schema...")
-        
-        # Update users table - add columns one by one with proper syntax
-        try:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'role'")
-            if not cur.fetchone():
-                cur.execute("ALTER TABLE users ADD COLUMN role ENUM('admin','member') NOT NULL DEFAULT 'member' AFTER password_hash")
-                print("✓ Added role column")
-            else:
-                print("✓ Role column already exists")
-        except Exception as e:
-            print(f"✗ Role column error: {e}")
-            
-        try:
-            cur.execute("SHOW FULL COLUMNS FROM users LIKE 'mess_start_date'")
-            column_info = cur.fetchone()
-            if not column_info:
-                cur.execute("ALTER TABLE users ADD COLUMN mess_start_date DATE DEFAULT NULL AFTER role")
-                print("✓ Added mess_start_date column")
-            else:
-                column_type = (column_info[1] or "").lower()
-                extra = (column_info[6] or "").lower()
-                if column_type != "date" or "on update" in extra:
-                    cur.execute("ALTER TABLE users MODIFY mess_start_date DATE DEFAULT NULL")
-                    print("✓ Normalized mess_start_date column to DATE NULL default")
-                else:
-                    print("✓ Mess start date column already normalized")
-        except Exception as e:
-            print(f"✗ Mess start date column error: {e}")
-            
-        try:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'is_active'")
-            if not cur.fetchone():
-                cur.execute("ALTER TABLE users ADD COLUMN is_active BOOLEAN DEFAULT TRUE AFTER mess_start_date")
-                print("✓ Added is_active column")
-            else:
-                print("✓ Is active column already exists")
-        except Exception as e:
-            print(f"✗ Is active column error: {e}")
-        
-        # Update payments table
-        try:
-            cur.execute("SHOW COLUMNS FROM payments LIKE 'status'")
-            if not cur.fetchone():
-                cur.execute("ALTER TABLE payments ADD COLUMN status ENUM('pending','approved','rejected') NOT NULL DEFAULT 'pending' AFTER reference")
-                print("✓ Added status column to payments")
-            else:
-                print("✓ Payments status column already exists")
-        except Exception as e:
-            print(f"✗ Payments status column error: {e}")
-            
+    def __init__(self, config, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                 recycle=DB_POOL_RECYCLE, ping_interval=DB_POOL_PING_INTERVAL, connect=None, replica=False):
+        self.config = config
+        self.connect = connect or connect_database
+        self.replica = replica
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = deque()
+        self._in_use = 0
+        self._counters = {
+            "connects": 0,
+            "checkouts": 0,
+            "recycled": 0,
+            "failed_pings": 0,
+            "timeouts": 0,
+        }
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # Inherited sockets belong to the parent; drop them without closing
+            self._reset()
+
+    def connection(self, request_scoped=False):
+        self._check_pid()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._counters["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available within {self.timeout}s (pool size {self.size})")
         try:
-            cur.execute("SHOW COLUMNS FROM payments LIKE 'approved_by'")
-            if not cur.fetchone():
-                cur.execute("ALTER TABLE payments ADD COLUMN approved_by INT NULL AFTER status")
-                print("✓ Added approved_by column to payments")
-            else:
-                print("✓ Payments approved_by column already exists")
-        except Exception as e:
-            print(f"✗ Payments approved_by column error: {e}")
-            
+            entry = self._take_idle() or self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+            self._counters["checkouts"] += 1
+        return PooledConnection(self, entry, request_scoped)
+
+    def _take_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                entry = self._idle.pop()
+            now = time.monotonic()
+            if now - entry.created_at > self.recycle:
+                self._discard(entry, "recycled")
+                continue
+            if now - entry.last_used > self.ping_interval:
+                try:
+                    entry.raw.ping(reconnect=False)
+                except Exception:
+                    self._discard(entry, "failed_pings")
+                    continue
+            return entry
+
+    def _connect(self):
+        entry = _PoolEntry(self.connect(**self.config))
+        with self._lock:
+            self._counters["connects"] += 1
+        return entry
+
+    def _discard(self, entry, reason=None):
         try:
-            cur.execute("SHOW COLUMNS FROM payments LIKE 'approved_at'")
-            if not cur.fetchone():
-                cur.execute("ALTER TABLE payments ADD COLUMN approved_at TIMESTAMP NULL AFTER approved_by")
-                print("✓ Added approved_at column to payments")
-            else:
-                print("✓ Payments approved_at column already exists")
-        except Exception as e:
-            print(f"✗ Payments approved_at column error: {e}")
-        
-        # Create monthly_bills table if not exists
+            entry.raw.close()
+        except Exception:
+            pass
+        if reason:
+            with self._lock:
+                self._counters[reason] += 1
+
+    def release(self, entry):
+        if self._pid != os.getpid():
+            return
+        raw = entry.raw
         try:
-            cur.execute("SHOW TABLES LIKE 'monthly_bills'")
-            if not cur.fetchone():
-                cur.execute(
-                    """
-                    CREATE TABLE monthly_bills (
-                        id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id INT NOT NULL,
-                        month VARCHAR(7) NOT NULL,
-                        total_meals INT DEFAULT 0,
-                        cancelled_meals INT DEFAULT 0,
-                        billable_meals INT DEFAULT 0,
-                        meal_rate DECIMAL(10,2) DEFAULT 0,
-                        total_amount DECIMAL(10,2) DEFAULT 0,
-                        paid_amount DECIMAL(10,2) DEFAULT 0,
-                        due_amount DECIMAL(10,2) DEFAULT 0,
-                        status ENUM('pending','paid','overdue') DEFAULT 'pending',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        UNIQUE KEY uniq_user_month (user_id, month),
-                        CONSTRAINT fk_bills_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                    ) ENGINE=InnoDB
-                    """
-                )
-                print("✓ Created monthly_bills table")
+            if raw.open and time.monotonic() - entry.created_at <= self.recycle:
+                # Never hand the next borrower an open transaction or a changed autocommit mode
+                if raw.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+                    raw.rollback()
+                if raw.get_autocommit() != bool(self.config.get("autocommit", False)):
+                    raw.autocommit(self.config.get("autocommit", False))
+                entry.last_used = time.monotonic()
+                with self._lock:
+                    self._idle.append(entry)
             else:
-                print("✓ Monthly bills table already exists")
-        except Exception as e:
-            print(f"✗ Monthly bills table error: {e}")
-        
-        # Update existing users to have default values - only if columns exist
-        try:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'role'")
-            if cur.fetchone():
-                cur.execute("UPDATE users SET role='member' WHERE role IS NULL")
-                print("✓ Updated existing users with default role")
-        except Exception as e:
-            print(f"✗ Role update error: {e}")
-            
-        try:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-            if cur.fetchone():
-                cur.execute("UPDATE users SET mess_start_date=CURDATE() WHERE mess_start_date IS NULL")
-                print("✓ Updated existing users with default mess start date")
-        except Exception as e:
-            print(f"✗ Mess start date update error: {e}")
-            
-        try:
-            cur.execute("SHOW COLUMNS FROM users LIKE 'is_active'")
-            if cur.fetchone():
-                cur.execute("UPDATE users SET is_active=TRUE WHERE is_active IS NULL")
-                print("✓ Updated existing users with default active status")
-        except Exception as e:
-            print(f"✗ Active status update error: {e}")
-        
-        cur.close()
-        conn.close()
-        print("Database schema update completed!")
-        
-    except Exception as e:
-        print(f"Database update error: {e}")
+                self._discard(entry, "recycled" if raw.open else None)
+        except Exception:
+            self._discard(entry)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
 
+    def close_idle(self):
+        """Close every idle connection (the pool stays usable and reconnects on demand)"""
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return
+                entry = self._idle.pop()
+            self._discard(entry)
 
-# Force update database schema
-force_update_db()
+    def stats(self):
+        self._check_pid()
+        with self._lock:
+            return {
+                "pid": self._pid,
+                "size": self.size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                **self._counters,
+            }
 
 
-# --------- Debug/Admin Routes ---------
-@app.route("/update_db")
-def update_db():
-    """Manual database update route for debugging"""
-    if not require_login() or not require_admin():
-        return redirect(url_for("login"))
-    
-    try:
-        force_update_db()
-        flash("Database updated successfully", "success")
-    except Exception as e:
-        flash(f"Database update failed: {e}", "error")
-    
-    return redirect(url_for("dashboard"))
+# --------- Query Accounting ---------
+READ_STATEMENTS = ("SELECT", "SHOW", "WITH", "EXPLAIN")
 
 
-@app.route("/register", methods=["GET", "POST"])
-def register():
-    # Public self-registration disabled; only admin can create accounts in Members page
-    flash("Registration is managed by admin. Please contact your admin.", "error")
-    return redirect(url_for("login"))
+class InstrumentedCursor:
+    """Cursor wrapper that adds query count, rows returned and DB time to the current request.
 
-@app.route("/login", methods=["GET", "POST"])
-def login():
-    form = LoginForm()
-    if form.validate_on_submit():
-        email = form.email.data.strip().lower()
-        password = form.password.data
+    from_replica is True for cursors on a read replica connection; process-wide
+    caches read through them but never store what they return.
+    """
+
+    def __init__(self, cursor, replica=False):
+        self._cursor = cursor
+        self.from_replica = replica
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+    def _timed(self, method, *args):
+        started = time.perf_counter()
         try:
-            conn = get_connection()
-            cur = conn.cursor(DictCursor)
-            cur.execute(
-                "SELECT id, name, password_hash, role FROM users WHERE email=%s",
-                (email,),
-            )
-            user = cur.fetchone()
-            if not user or not check_password_hash(user["password_hash"], password):
-                flash("Invalid email or password", "error")
-            else:
-                session["user_id"] = user["id"]
-                session["user_name"] = user["name"]
-                session["user_role"] = user["role"]
-                flash("Logged in successfully", "success")
-                cur.close()
-                conn.close()
-                return redirect(url_for("dashboard"))
-            cur.close()
-            conn.close()
-        except pymysql.MySQLError as err:
-            flash(f"Database error: {err}", "error")
+            return method(*args)
+        finally:
+            stats = g.get("_db_stats") if has_app_context() else None
+            if stats is not None:
+                stats["queries"] += 1
+                stats["db_seconds"] += time.perf_counter() - started
+                # Unbuffered cursors don't know their row count up front
+                if (self._cursor.description and not isinstance(self._cursor, SSCursor)
+                        and self._cursor.rowcount and self._cursor.rowcount > 0):
+                    stats["rows"] += self._cursor.rowcount
 
-    return render_template("login.html", form=form)
+    def _note_write(self, query):
+        stats = g.get("_db_stats") if has_app_context() else None
+        if stats is not None and not query.lstrip()[:7].upper().startswith(READ_STATEMENTS):
+            stats["writes"] += 1
 
-@app.route("/")
-def home():
-    user_name = session.get("user_name")
-    if user_name:
-        return redirect(url_for("dashboard"))
-    return redirect(url_for("login"))
+    def execute(self, query, args=None):
+        self._note_write(query)
+        return self._timed(self._cursor.execute, query, args)
 
-@app.route("/dashboard")
-def dashboard():
-    if not session.get("user_id"):
-        flash("Please log in to access the dashboard", "error")
-        return redirect(url_for("login"))
-    return render_template(
-        "dashboard.html",
-        title="Dashboard",
-        user_name=session.get("user_name"),
-        user_role=session.get("user_role"),
-    )
+    def executemany(self, query, args):
+        self._note_write(query)
+        return self._timed(self._cursor.executemany, query, args)
 
 
-@app.route("/logout")
-def logout():
-    session.clear()
-    flash("Logged out", "success")
-    return redirect(url_for("login"))
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style"""
 
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.total = 0
+        self.sum = 0.0
 
-# --------- Helpers ---------
-def require_login():
-    if not session.get("user_id"):
-        flash("Please log in", "error")
-        return False
-    return True
+    def observe(self, value):
+        self.total += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
 
 
-def require_admin():
-    if session.get("user_role") != "admin":
-        flash("Admin access required", "error")
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+
+class RequestMetrics:
+    """Per-endpoint request and database histograms for this worker process.
+
+    Each gunicorn worker keeps its own numbers; scrape every worker (or run a
+    single worker behind /metrics) to see the whole picture.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.histograms = {}
+
+    def record(self, endpoint, method, status, seconds, db_stats):
+        with self._lock:
+            key = (endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            for name, buckets, value in (
+                ("request_duration_seconds", LATENCY_BUCKETS, seconds),
+                ("db_duration_seconds", LATENCY_BUCKETS, db_stats["db_seconds"]),
+                ("db_queries", QUERY_BUCKETS, db_stats["queries"]),
+                ("db_rows", ROW_BUCKETS, db_stats["rows"]),
+            ):
+                hist = self.histograms.get((name, endpoint, method))
+                if hist is None:
+                    hist = self.histograms[(name, endpoint, method)] = Histogram(buckets)
+                hist.observe(value)
+
+    def render(self, pool_stats=None, read_pool_stats=None):
+        """Prometheus text exposition format"""
+        help_text = {
+            "request_duration_seconds": "Total request time per endpoint",
+            "db_duration_seconds": "Database time spent per request",
+            "db_queries": "Queries issued per request",
+            "db_rows": "Rows returned per request",
+        }
+        lines = [
+            "# HELP mess_http_requests_total Requests handled per endpoint",
+            "# TYPE mess_http_requests_total counter",
+        ]
+        with self._lock:
+            for (endpoint, method, status), count in sorted(self.requests.items()):
+                lines.append(f'mess_http_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+            for name in help_text:
+                lines.append(f"# HELP mess_{name} {help_text[name]}")
+                lines.append(f"# TYPE mess_{name} histogram")
+                for (hist_name, endpoint, method), hist in sorted(self.histograms.items()):
+                    if hist_name != name:
+                        continue
+                    labels = f'endpoint="{endpoint}",method="{method}"'
+                    for bound, count in zip(hist.buckets, hist.counts):
+                        lines.append(f'mess_{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'mess_{name}_bucket{{{labels},le="+Inf"}} {hist.total}')
+                    lines.append(f"mess_{name}_sum{{{labels}}} {hist.sum:.6f}")
+                    lines.append(f"mess_{name}_count{{{labels}}} {hist.total}")
+        for prefix, stats in (("db_pool", pool_stats), ("db_read_pool", read_pool_stats)):
+            for key, value in (stats or {}).items():
+                if key in ("size", "in_use", "idle"):
+                    lines.append(f"# TYPE mess_{prefix}_{key} gauge")
+                    lines.append(f"mess_{prefix}_{key} {value}")
+                elif key != "pid":
+                    lines.append(f"# TYPE mess_{prefix}_{key}_total counter")
+                    lines.append(f"mess_{prefix}_{key}_total {value}")
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+@app.before_request
+def start_request_accounting():
+    g._request_started = time.perf_counter()
+    g._db_stats = {"queries": 0, "rows": 0, "db_seconds": 0.0, "writes": 0}
+
+
+@app.after_request
+def record_request_accounting(response):
+    started = g.get("_request_started")
+    if started is not None:
+        request_metrics.record(
+            request.endpoint or "unknown",
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            g._db_stats,
+        )
+    return response
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = DB_CONFIG.copy()
+                config["database"] = DEFAULT_DB_NAME
+                _pool = ConnectionPool(config)
+    return _pool
+
+
+_read_pool = None
+
+
+def get_read_pool():
+    global _read_pool
+    if _read_pool is None:
+        with _pool_lock:
+            if _read_pool is None:
+                _read_pool = ConnectionPool(READ_DB_CONFIG, size=READ_DB_POOL_SIZE, replica=True)
+    return _read_pool
+
+
+def _reads_pinned_to_primary():
+    """Read-your-writes: this request, or this session within READ_YOUR_WRITES_SECONDS, has written"""
+    if not has_app_context():
         return False
-    return True
+    if g.get("_db_stats", {}).get("writes"):
+        return True
+    if not has_request_context():
+        return False
+    wrote_at = session.get("_db_write_at")
+    return wrote_at is not None and time.time() - wrote_at < READ_YOUR_WRITES_SECONDS
 
 
-# --------- Members (Admin) ---------
-@app.route("/members", methods=["GET", "POST"])
-def members():
-    if not require_login() or not require_admin():
-        return redirect(url_for("login"))
+def get_connection(database=None, use_default=True, dedicated=False, readonly=False):
+    """Return a connection to the mess database.
 
-    conn = get_connection()
-    cur = conn.cursor(DictCursor)
+    Connections to the default database are borrowed from the process-wide
+    pool. Inside an app context the same connection serves the whole request
+    and goes back to the pool on teardown, so close() on it is a no-op;
+    dedicated=True borrows a separate one that the caller must close (used
+    for streaming responses that outlive the request). Connections to any
+    other database (or none) are opened directly. With the SQLite backend
+    there is only the one database file, so everything goes through the pool.
 
-    # Create user or update role
-    if request.method == "POST":
-        form_type = request.form.get("form_type")
-        if form_type == "create":
-            name = (request.form.get("name") or "").strip()
-            email = (request.form.get("email") or "").strip().lower()
-            password = request.form.get("password") or ""
-            mess_start_date = request.form.get("mess_start_date")
-            if not mess_start_date:
-                from datetime import date as _date
-                mess_start_date = _date.today().strftime("%Y-%m-%d")
-            if not name or not email or not password:
-                flash("Name, email and password are required", "error")
-            else:
-                try:
-                    cur.execute("SELECT id FROM users WHERE email=%s", (email,))
-                    if cur.fetchone():
-                        flash("Email already exists", "error")
-                    else:
-                        # Check if mess_start_date column exists
-                        cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-                        if cur.fetchone():
-                            cur.execute(
-                                "INSERT INTO users (name, email, password_hash, role, mess_start_date) VALUES (%s, %s, %s, 'member', %s)",
-                                (name, email, generate_password_hash(password), mess_start_date),
-                            )
-                        else:
-                            # Fallback to basic insert if column doesn't exist
-                            cur.execute(
+    readonly=True serves the connection from the READ_DATABASE_URL replica
+    when one is configured, unless the session has just written (see
+    _reads_pinned_to_primary). Never write through a readonly connection.
+    """
+    if readonly and READ_DB_CONFIG and database is None and use_default and not _reads_pinned_to_primary():
+        if dedicated or not has_app_context():
+            return get_read_pool().connection()
+        conn = g.get("_db_read_conn")
+        if conn is None:
+            conn = g._db_read_conn = get_read_pool().connection(request_scoped=True)
+        return conn
+
+    target = database or (DEFAULT_DB_NAME if use_default else None)
+    if DB_BACKEND == "sqlite":
+        target = DEFAULT_DB_NAME
+    if target and target == DEFAULT_DB_NAME:
+        if dedicated or not has_app_context():
+            return get_pool().connection()
+        conn = g.get("_db_conn")
+        if conn is None:
+            conn = g._db_conn = get_pool().connection(request_scoped=True)
+        return conn
+
+    config = DB_CONFIG.copy()
+    if target:
+        config["database"] = target
+    else:
+        config.pop("database", None)
+    return connect_database(**config)
+
+
+@app.after_request
+def remember_write(response):
+    # Stamp the session only when there is a replica to be stale, to keep cookies unchanged otherwise
+    if READ_DB_CONFIG and READ_YOUR_WRITES_SECONDS > 0 and g.get("_db_stats", {}).get("writes"):
+        session["_db_write_at"] = time.time()
+    return response
+
+
+@app.teardown_appcontext
+def release_connection(exc):
+    for key in ("_db_conn", "_db_read_conn"):
+        conn = g.pop(key, None)
+        if conn is not None:
+            conn.release()
+
+
+# --------- Schema Capabilities ---------
+class SchemaCapabilities:
+    """Process-wide registry of the tables and columns present in the database.
+
+    Routes ask has_column() instead of running SHOW COLUMNS per request. The
+    column list is read once from information_schema and kept until
+    invalidate() is called after a schema change.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._columns = None
+
+    def _load(self):
+        conn = get_connection()
+        cur = conn.cursor()
+        if DB_BACKEND == "sqlite":
+            cur.execute(
+                "SELECT m.name, p.name FROM sqlite_master m JOIN pragma_table_info(m.name) p WHERE m.type='table'"
+            )
+        else:
+            cur.execute(
+                "SELECT TABLE_NAME, COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA=%s",
+                (DEFAULT_DB_NAME,),
+            )
+        columns = {}
+        for table, column in cur.fetchall():
+            columns.setdefault(table.lower(), set()).add(column.lower())
+        cur.close()
+        conn.close()
+        return columns
+
+    def columns(self, table):
+        columns = self._columns
+        if columns is None:
+            with self._lock:
+                if self._columns is None:
+                    self._columns = self._load()
+                columns = self._columns
+        return columns.get(table, frozenset())
+
+    def has_column(self, table, column):
+        return column in self.columns(table)
+
+    def invalidate(self):
+        self._columns = None
+
+
+schema_caps = SchemaCapabilities()
+
+
+# --------- Password Hashing ---------
+# werkzeug method string, e.g. "scrypt", "scrypt:16384:8:1" or "pbkdf2:sha256:600000".
+# Lower work factors make logins cheaper and offline cracking cheaper too;
+# see `python benchmark.py hashing` for the cost of each setting.
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt")
+
+
+@lru_cache(maxsize=None)
+def _hash_parameters(method):
+    """Parameter prefix werkzeug stores for method, with its defaults filled in"""
+    return generate_password_hash("", method=method).split("$", 1)[0]
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def password_needs_rehash(stored_hash):
+    """True when stored_hash was made with a different method or work factor than configured"""
+    return stored_hash.split("$", 1)[0] != _hash_parameters(PASSWORD_HASH_METHOD)
+
+
+# Fail at startup, not at the first login, on a malformed PASSWORD_HASH_METHOD
+_hash_parameters(PASSWORD_HASH_METHOD)
+
+
+# --------- Schema Migrations ---------
+# Ordered, idempotent steps recorded in schema_version. Run them once per deploy with
+# `flask --app app migrate`; worker startup only compares the recorded version.
+SCHEMA_LOCK_NAME = "mess_schema_migrate"
+SCHEMA_LOCK_TIMEOUT = int(os.getenv("SCHEMA_LOCK_TIMEOUT", "60"))
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "").lower() in ("1", "true", "yes")
+
+
+def _ensure_index(cur, table, index_name, columns):
+    """Create an index unless one with that name already exists (MySQL has no CREATE INDEX IF NOT EXISTS)"""
+    if DB_BACKEND == "sqlite":
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+        return
+    cur.execute(f"SHOW INDEX FROM {table} WHERE Key_name=%s", (index_name,))
+    if not cur.fetchone():
+        cur.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+        print(f"Added index {index_name} on {table}({columns})")
+
+
+def _ensure_column(cur, table, column, definition):
+    """Add a column unless it already exists"""
+    if DB_BACKEND == "sqlite":
+        cur.execute(f"SELECT name FROM pragma_table_info('{table}') WHERE name=%s", (column,))
+    else:
+        cur.execute(f"SHOW COLUMNS FROM {table} LIKE %s", (column,))
+    if not cur.fetchone():
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        print(f"Added {column} column to {table}")
+
+
+def _migrate_core_tables(cur):
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            email VARCHAR(255) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            role ENUM('admin','member') NOT NULL DEFAULT 'member',
+            mess_start_date DATE DEFAULT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meals (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            date DATE NOT NULL,
+            breakfast TINYINT(1) DEFAULT 0,
+            lunch TINYINT(1) DEFAULT 0,
+            dinner TINYINT(1) DEFAULT 0,
+            UNIQUE KEY uniq_user_date (user_id, date),
+            CONSTRAINT fk_meals_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS expenses (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            date DATE NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            category VARCHAR(100),
+            notes VARCHAR(255),
+            created_by INT,
+            CONSTRAINT fk_expenses_user FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS payments (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            date DATE NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            method VARCHAR(50),
+            reference VARCHAR(100),
+            status ENUM('pending','approved','rejected') NOT NULL DEFAULT 'pending',
+            approved_by INT NULL,
+            approved_at TIMESTAMP NULL,
+            CONSTRAINT fk_payments_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            CONSTRAINT fk_payments_approver FOREIGN KEY (approved_by) REFERENCES users(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS menu (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            date DATE NOT NULL UNIQUE,
+            breakfast_menu VARCHAR(255),
+            lunch_menu VARCHAR(255),
+            dinner_menu VARCHAR(255)
+        ) ENGINE=InnoDB
+        """
+    )
+    # Weekly fixed fees for meals
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS weekly_fees (
+            weekday ENUM('Sunday','Monday','Tuesday','Wednesday','Thursday','Friday','Saturday') PRIMARY KEY,
+            breakfast_fee DECIMAL(10,2) DEFAULT 0,
+            lunch_fee DECIMAL(10,2) DEFAULT 0,
+            dinner_fee DECIMAL(10,2) DEFAULT 0
+        ) ENGINE=InnoDB
+        """
+    )
+    # Monthly billing table
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS monthly_bills (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            month VARCHAR(7) NOT NULL,
+            total_meals INT DEFAULT 0,
+            cancelled_meals INT DEFAULT 0,
+            billable_meals INT DEFAULT 0,
+            meal_rate DECIMAL(10,2) DEFAULT 0,
+            total_amount DECIMAL(10,2) DEFAULT 0,
+            paid_amount DECIMAL(10,2) DEFAULT 0,
+            due_amount DECIMAL(10,2) DEFAULT 0,
+            status ENUM('pending','paid','overdue') DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uniq_user_month (user_id, month),
+            CONSTRAINT fk_bills_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def _migrate_legacy_columns(cur):
+    # Installations created before these columns existed
+    _ensure_column(cur, "users", "role", "ENUM('admin','member') NOT NULL DEFAULT 'member' AFTER password_hash")
+    _ensure_column(cur, "users", "mess_start_date", "DATE DEFAULT NULL AFTER role")
+    _ensure_column(cur, "users", "is_active", "BOOLEAN DEFAULT TRUE AFTER mess_start_date")
+    _ensure_column(cur, "payments", "status", "ENUM('pending','approved','rejected') NOT NULL DEFAULT 'pending' AFTER reference")
+    _ensure_column(cur, "payments", "approved_by", "INT NULL AFTER status")
+    _ensure_column(cur, "payments", "approved_at", "TIMESTAMP NULL AFTER approved_by")
+
+    if DB_BACKEND == "sqlite":
+        # Fresh SQLite databases start with the current column definitions
+        return
+    cur.execute("SHOW FULL COLUMNS FROM users LIKE 'mess_start_date'")
+    column_info = cur.fetchone()
+    column_type = (column_info[1] or "").lower()
+    extra = (column_info[6] or "").lower()
+    if column_type != "date" or "on update" in extra:
+        cur.execute("ALTER TABLE users MODIFY mess_start_date DATE DEFAULT NULL")
+        print("Normalized mess_start_date column to DATE NULL default")
+
+    # Update existing users to have default values
+    cur.execute("UPDATE users SET role='member' WHERE role IS NULL")
+    cur.execute("UPDATE users SET mess_start_date=CURDATE() WHERE mess_start_date IS NULL")
+    cur.execute("UPDATE users SET is_active=TRUE WHERE is_active IS NULL")
+
+
+def _migrate_month_indexes(cur):
+    # Indexes backing the month range filters (date >= first_day AND date < next_month).
+    # menu.date is already UNIQUE, which doubles as its index.
+    _ensure_index(cur, "meals", "idx_meals_date", "date")
+    _ensure_index(cur, "payments", "idx_payments_user_status_date", "user_id, status, date")
+    _ensure_index(cur, "payments", "idx_payments_date", "date")
+    _ensure_index(cur, "expenses", "idx_expenses_date", "date")
+
+
+def _migrate_seed_data(cur):
+    # Seed weekly fees if empty
+    cur.execute("SELECT COUNT(*) FROM weekly_fees")
+    if (cur.fetchone() or [0])[0] == 0:
+        fee_values = [
+            ("Sunday", 15.00, 45.00, 40.00),
+            ("Monday", 20.00, 45.00, 40.00),
+            ("Tuesday", 25.00, 45.00, 40.00),
+            ("Wednesday", 20.00, 50.00, 40.00),
+            ("Thursday", 20.00, 45.00, 45.00),
+            ("Friday", 20.00, 50.00, 40.00),
+            ("Saturday", 25.00, 45.00, 40.00),
+        ]
+        cur.executemany(
+            "INSERT INTO weekly_fees (weekday, breakfast_fee, lunch_fee, dinner_fee) VALUES (%s,%s,%s,%s)",
+            fee_values,
+        )
+
+    # Seed admin if no admin exists
+    cur.execute("SELECT id FROM users WHERE role='admin' LIMIT 1")
+    if not cur.fetchone():
+        cur.execute(
+            "INSERT IGNORE INTO users (name, email, password_hash, role) VALUES (%s, %s, %s, 'admin')",
+            ("Admin", "admin@mess.com", hash_password("admin123")),
+        )
+
+
+def _migrate_stale_bill_months(cur):
+    # monthly_bills is a materialized table; writes flag the months it must recompute
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS stale_bill_months (
+            month VARCHAR(7) PRIMARY KEY,
+            version INT NOT NULL DEFAULT 1,
+            marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """
+    )
+    _ensure_column(cur, "monthly_bills", "refreshed_at", "TIMESTAMP NULL DEFAULT CURRENT_TIMESTAMP AFTER created_at")
+
+
+def _migrate_menu_snacks(cur):
+    _ensure_column(cur, "menu", "snacks_menu", "VARCHAR(255) AFTER lunch_menu")
+
+
+def _migrate_listing_indexes(cur):
+    # Covering index for the keyset-paginated meals listing (date DESC, user_id DESC,
+    # read as one backward scan); it also serves every query idx_meals_date did. payments(date) already carries
+    # the primary key, so it covers the (date, id) seek for payments.
+    _ensure_index(cur, "meals", "idx_meals_date_user", "date, user_id, breakfast, lunch, dinner")
+    if DB_BACKEND == "sqlite":
+        cur.execute("DROP INDEX IF EXISTS idx_meals_date")
+        return
+    cur.execute("SHOW INDEX FROM meals WHERE Key_name='idx_meals_date'")
+    if cur.fetchone():
+        cur.execute("DROP INDEX idx_meals_date ON meals")
+
+
+def _migrate_jobs(cur):
+    # Background jobs; active_key is set only while a job is queued or running,
+    # so the unique index allows one active job per (kind, month)
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            kind VARCHAR(50) NOT NULL,
+            month VARCHAR(7),
+            active_key VARCHAR(100) NULL,
+            status ENUM('queued','running','done','failed') NOT NULL DEFAULT 'queued',
+            total INT NOT NULL DEFAULT 0,
+            processed INT NOT NULL DEFAULT 0,
+            cursor_id INT NOT NULL DEFAULT 0,
+            stale_version INT NULL,
+            attempts INT NOT NULL DEFAULT 0,
+            max_attempts INT NOT NULL DEFAULT 3,
+            last_error TEXT,
+            locked_by VARCHAR(100),
+            run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            heartbeat_at TIMESTAMP NULL,
+            created_by INT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP NULL,
+            finished_at TIMESTAMP NULL,
+            UNIQUE KEY uniq_jobs_active (active_key),
+            INDEX idx_jobs_status_run_after (status, run_after),
+            INDEX idx_jobs_kind_month (kind, month),
+            CONSTRAINT fk_jobs_creator FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def _migrate_member_ledger(cur):
+    # Append-only ledger: positive amounts are charges (closed bills), negative
+    # are credits (approved payments); balance is the member's running total
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS member_ledger (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            entry_date DATE NOT NULL,
+            month VARCHAR(7) NOT NULL,
+            kind ENUM('bill','payment','adjustment') NOT NULL,
+            ref_id INT NOT NULL DEFAULT 0,
+            amount DECIMAL(10,2) NOT NULL,
+            balance DECIMAL(12,2) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_ledger_user_kind_month (user_id, kind, month),
+            CONSTRAINT fk_ledger_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """
+    )
+    # Current balance per member, plus where the last closed statement left off
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS member_balances (
+            user_id INT PRIMARY KEY,
+            balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+            closed_balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+            closed_entry_id INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            CONSTRAINT fk_balances_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS member_statements (
+            user_id INT NOT NULL,
+            month VARCHAR(7) NOT NULL,
+            opening_balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+            charges DECIMAL(12,2) NOT NULL DEFAULT 0,
+            credits DECIMAL(12,2) NOT NULL DEFAULT 0,
+            closing_balance DECIMAL(12,2) NOT NULL DEFAULT 0,
+            last_entry_id INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month),
+            CONSTRAINT fk_statements_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS ledger_periods (
+            month VARCHAR(7) PRIMARY KEY,
+            closed_by INT NULL,
+            closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            CONSTRAINT fk_periods_user FOREIGN KEY (closed_by) REFERENCES users(id) ON DELETE SET NULL
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def _migrate_daily_headcount(cur):
+    # Meals expected per day: eligible members minus their cancellations
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS daily_headcount (
+            date DATE PRIMARY KEY,
+            members INT NOT NULL DEFAULT 0,
+            breakfast INT NOT NULL DEFAULT 0,
+            lunch INT NOT NULL DEFAULT 0,
+            dinner INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def _migrate_data_versions(cur):
+    # One counter per entity and month ('' for entities not split by month), bumped by
+    # every write; read routes build their ETag / Last-Modified from these
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            entity VARCHAR(32) NOT NULL,
+            month VARCHAR(7) NOT NULL DEFAULT '',
+            version INT NOT NULL DEFAULT 1,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (entity, month)
+        ) ENGINE=InnoDB
+        """
+    )
+
+
+def _migrate_weekly_menu(cur):
+    # The fixed weekly menu and meal timings, formerly hard-coded in menu()
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS weekly_menu (
+            weekday ENUM('Sunday','Monday','Tuesday','Wednesday','Thursday','Friday','Saturday') PRIMARY KEY,
+            breakfast_menu VARCHAR(255),
+            lunch_menu VARCHAR(255),
+            snacks_menu VARCHAR(255),
+            dinner_menu VARCHAR(255)
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS meal_timings (
+            name VARCHAR(32) PRIMARY KEY,
+            label VARCHAR(64) NOT NULL,
+            timing VARCHAR(64),
+            sort_order INT NOT NULL DEFAULT 0
+        ) ENGINE=InnoDB
+        """
+    )
+    cur.execute("SELECT COUNT(*) FROM weekly_menu")
+    if (cur.fetchone() or [0])[0] == 0:
+        cur.executemany(
+            "INSERT INTO weekly_menu (weekday, breakfast_menu, lunch_menu, snacks_menu, dinner_menu) VALUES (%s,%s,%s,%s,%s)",
+            [
+                ("Sunday", "Puri, Upma, Alu-curry",
+                 "Rice, Roti, Dal, Fish Fry / Kabuli Paneer, Mustard Gravy, Dahi Salad",
+                 "Coffee & Biscuits", "Rice, Roti, Dal, Egg Tadka / Veg Tadka, Vegetable Fry"),
+                ("Monday", "Vegetable chow mien",
+                 "Rice, Roti, Dal, Sambar, Veg Curry, Vegetable Chips",
+                 "Tea & Biscuits", "Rice, Roti, Dal, Manchurian Chilli, Kheer"),
+                ("Tuesday", "Bara (4 pc), Upma, Alu-Matar-Curry",
+                 "Rice, Roti, Dal, Rasam, Chingudi Ghanta / Veg Ghanta, Guji Chana Bhaja",
+                 "Tea & Biscuits", "Rice, Jeera Rice, Roti, Dal, Cauliflower / Parwal Alu Curry, Soyabean Chilli"),
+                ("Wednesday", "Aloo Chop / Gulgula, Aloo Matar Curry",
+                 "Rice, Roti, Dal, Chicken Curry / Mushroom Alu Masala, Dahi Raita",
+                 "Coffee & Biscuits", "Lemon Rice, Rice, Roti, Dalma, Mix veg Fry, Achar"),
+                ("Thursday", "Idli, Sambar, Chutney",
+                 "Rice, Roti, Dal, Rasam, Egg Masala / Veg Masala, Alu Choka",
+                 "Tea & Biscuits", "Roti, Dal Fry, Veg Biriyani, Paneer & Green Motor Curry, Sweet Pickle"),
+                ("Friday", "Poha / Halwa, Alu-Matar-Curry",
+                 "Rice, Roti, Dal, Chicken Kasa / Paneer & Green Peas Curry, Pampad",
+                 "Tea & Biscuits", "Roti, Fried Rice, Dal, Chhole Masala, Sweet"),
+                ("Saturday", "Pesarattu / Chakuli, Alu-Curry, Chutney",
+                 "Rice, Roti, Dal, Sambar, Egg Curry / Veg Curry, Dahi Bundi",
+                 "Tea & Biscuits", "Roti, Rice, Dal, Mushroom Alu Masala, Jeera Aloo"),
+            ],
+        )
+    cur.execute("SELECT COUNT(*) FROM meal_timings")
+    if (cur.fetchone() or [0])[0] == 0:
+        cur.executemany(
+            "INSERT INTO meal_timings (name, label, timing, sort_order) VALUES (%s,%s,%s,%s)",
+            [
+                ("breakfast", "Breakfast", "6:30 AM to 8:30 AM", 1),
+                ("lunch", "Lunch", "12:30 PM to 2:30 PM", 2),
+                ("tea", "Tea", "6:00 PM to 7:00 PM", 3),
+                ("dinner", "Dinner", "8:00 PM to 9:45 PM", 4),
+                ("sunday_breakfast", "Sunday & Holiday - Breakfast", "8:00 AM to 9:30 AM", 5),
+                ("sunday_lunch", "Sunday & Holiday - Lunch", "12:30 PM to 2:30 PM", 6),
+            ],
+        )
+
+
+def _migrate_bill_brought_forward(cur):
+    _ensure_column(cur, "monthly_bills", "brought_forward", "DECIMAL(10,2) DEFAULT 0 AFTER paid_amount")
+    # Bills after the first closed month were saved without their brought-forward balance
+    cur.execute(
+        """
+        INSERT IGNORE INTO stale_bill_months (month)
+        SELECT DISTINCT month FROM monthly_bills WHERE month > (SELECT MIN(month) FROM ledger_periods)
+        """
+    )
+
+
+MIGRATIONS = [
+    (1, "core tables", _migrate_core_tables),
+    (2, "legacy users/payments columns", _migrate_legacy_columns),
+    (3, "month filter indexes", _migrate_month_indexes),
+    (4, "seed weekly fees and admin", _migrate_seed_data),
+    (5, "stale bill month flags", _migrate_stale_bill_months),
+    (6, "menu snacks column", _migrate_menu_snacks),
+    (7, "meals listing covering index", _migrate_listing_indexes),
+    (8, "background jobs", _migrate_jobs),
+    (9, "member ledger and statements", _migrate_member_ledger),
+    (10, "daily headcount", _migrate_daily_headcount),
+    (11, "data version stamps", _migrate_data_versions),
+    (12, "weekly menu and meal timings tables", _migrate_weekly_menu),
+    (13, "balance brought forward on bills", _migrate_bill_brought_forward),
+]
+LATEST_SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def create_database():
+    """Create the mess database if it does not exist yet"""
+    if DB_BACKEND == "sqlite":
+        # connecting creates the file
+        return
+    conn = get_connection(use_default=False)
+    conn.autocommit(True)
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            f"CREATE DATABASE IF NOT EXISTS {DEFAULT_DB_NAME} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci"
+        )
+    except Exception as create_err:
+        print(f"Database creation skipped/failed: {create_err}")
+    cur.close()
+    conn.close()
+
+
+def get_schema_version(cur):
+    """Highest applied migration, or 0 when schema_version does not exist yet"""
+    try:
+        cur.execute("SELECT IFNULL(MAX(version), 0) FROM schema_version")
+    except pymysql.err.ProgrammingError:
+        return 0
+    return int(cur.fetchone()[0])
+
+
+def run_migrations():
+    """Apply pending migrations in order and return the versions applied.
+
+    A MySQL named lock makes concurrent callers wait for each other, so only
+    one process migrates and the rest find nothing left to do. (SQLite's
+    GET_LOCK is per process; its single-writer lock covers the rest.)
+    """
+    create_database()
+    conn = get_connection()
+    conn.autocommit(True)
+    cur = conn.cursor()
+    applied = []
+    try:
+        cur.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_LOCK_NAME, SCHEMA_LOCK_TIMEOUT))
+        if cur.fetchone()[0] != 1:
+            raise RuntimeError(f"Timed out waiting for the schema migration lock after {SCHEMA_LOCK_TIMEOUT}s")
+        try:
+            cur.execute(
+                """
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255),
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB
+                """
+            )
+            current = get_schema_version(cur)
+            for version, description, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                print(f"Applying migration {version}: {description}")
+                step(cur)
+                cur.execute(
+                    "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                    (version, description),
+                )
+                applied.append(version)
+        finally:
+            cur.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK_NAME,))
+            cur.fetchone()
+    finally:
+        cur.close()
+        conn.close()
+        schema_caps.invalidate()
+    return applied
+
+
+def check_schema_version():
+    """Startup check: one query comparing the recorded schema version with the code's"""
+    try:
+        conn = get_connection()
+        cur = conn.cursor()
+        current = get_schema_version(cur)
+        cur.close()
+        conn.close()
+    except pymysql.MySQLError as err:
+        print(f"Schema version check failed: {err}")
+        return None
+    if current < LATEST_SCHEMA_VERSION:
+        if AUTO_MIGRATE:
+            run_migrations()
+            return LATEST_SCHEMA_VERSION
+        print(
+            f"Database schema is at version {current}, code expects {LATEST_SCHEMA_VERSION}. "
+            "Run `flask --app app migrate`."
+        )
+    return current
+
+
+@app.cli.command("migrate")
+def migrate_command():
+    """Apply pending schema migrations."""
+    applied = run_migrations()
+    if applied:
+        print(f"Applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print(f"Schema already at version {LATEST_SCHEMA_VERSION}")
+
+
+# --------- Debug/Admin Routes ---------
+@app.route("/update_db")
+def update_db():
+    """Manual database update route for debugging"""
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+    
+    try:
+        applied = run_migrations()
+        flash(f"Database updated successfully ({len(applied)} migrations applied)", "success")
+    except Exception as e:
+        flash(f"Database update failed: {e}", "error")
+    
+    return redirect(url_for("dashboard"))
+
+
+@app.route("/pool_stats")
+def pool_stats():
+    """Connection pool counters for this worker process"""
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+    stats = get_pool().stats()
+    if READ_DB_CONFIG:
+        stats["replica"] = get_read_pool().stats()
+    return jsonify(stats)
+
+
+# Scrapers authenticate with "Authorization: Bearer <METRICS_TOKEN>"; unset, only admins can read
+# /metrics. The client address proves nothing: behind a local nginx every request is from 127.0.0.1.
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+
+def _metrics_token_ok():
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    return bool(METRICS_TOKEN) and scheme.lower() == "bearer" and secrets.compare_digest(token.strip(), METRICS_TOKEN)
+
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics for scrapers holding METRICS_TOKEN, or admins"""
+    if not _metrics_token_ok() and session.get("user_role") != "admin":
+        return "Forbidden\n", 403, {"Content-Type": "text/plain"}
+    pool_stats = get_pool().stats() if _pool is not None else None
+    read_pool_stats = get_read_pool().stats() if _read_pool is not None else None
+    return request_metrics.render(pool_stats, read_pool_stats), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+
+@app.route("/register", methods=["GET", "POST"])
+def register():
+    # Public self-registration disabled; only admin can create accounts in Members page
+    flash("Registration is managed by admin. Please contact your admin.", "error")
+    return redirect(url_for("login"))
+
+@app.route("/login", methods=["GET", "POST"])
+def login():
+    form = LoginForm()
+    if form.validate_on_submit():
+        email = form.email.data.strip().lower()
+        password = form.password.data
+        try:
+            conn = get_connection()
+            cur = conn.cursor(DictCursor)
+            cur.execute(
+                "SELECT id, name, password_hash, role FROM users WHERE email=%s",
+                (email,),
+            )
+            user = cur.fetchone()
+            if not user or not check_password_hash(user["password_hash"], password):
+                flash("Invalid email or password", "error")
+            else:
+                if password_needs_rehash(user["password_hash"]):
+                    # Upgrade (or downgrade) to the configured method while we have the plaintext
+                    try:
+                        cur.execute(
+                            "UPDATE users SET password_hash=%s WHERE id=%s AND password_hash=%s",
+                            (hash_password(password), user["id"], user["password_hash"]),
+                        )
+                        conn.commit()
+                    except pymysql.MySQLError as err:
+                        conn.rollback()
+                        print(f"Password rehash failed for user {user['id']}: {err}")
+                session["user_id"] = user["id"]
+                session["user_name"] = user["name"]
+                session["user_role"] = user["role"]
+                flash("Logged in successfully", "success")
+                cur.close()
+                conn.close()
+                return redirect(url_for("dashboard"))
+            cur.close()
+            conn.close()
+        except pymysql.MySQLError as err:
+            flash(f"Database error: {err}", "error")
+
+    return render_template("login.html", form=form)
+
+@app.route("/")
+def home():
+    user_name = session.get("user_name")
+    if user_name:
+        return redirect(url_for("dashboard"))
+    return redirect(url_for("login"))
+
+@app.route("/dashboard")
+def dashboard():
+    if not session.get("user_id"):
+        flash("Please log in to access the dashboard", "error")
+        return redirect(url_for("login"))
+    return render_template(
+        "dashboard.html",
+        title="Dashboard",
+        user_name=session.get("user_name"),
+        user_role=session.get("user_role"),
+    )
+
+
+@app.route("/logout")
+def logout():
+    session.clear()
+    flash("Logged out", "success")
+    return redirect(url_for("login"))
+
+
+# --------- Helpers ---------
+def resolve_month(month=None):
+    """Return month as 'YYYY-MM', falling back to the current month when missing or malformed."""
+    if month:
+        try:
+            return datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+        except ValueError:
+            pass
+    return datetime.today().strftime("%Y-%m")
+
+
+def month_range(month):
+    """Half-open [first_day, next_month) date range for a 'YYYY-MM' month.
+
+    Filtering with `date >= first_day AND date < next_month` lets MySQL use
+    an index on the date column, unlike DATE_FORMAT(date, '%Y-%m') = month.
+    """
+    first_day = datetime.strptime(month, "%Y-%m").date()
+    next_month = (first_day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return first_day, next_month
+
+
+LISTING_PAGE_SIZE = int(os.getenv("LISTING_PAGE_SIZE", "100"))
+LISTING_MAX_PAGE_SIZE = 500
+PAYMENT_STATUSES = ("pending", "approved", "rejected")
+
+
+def page_size_arg():
+    """Requested per_page, clamped to 1..LISTING_MAX_PAGE_SIZE"""
+    per_page = request.args.get("per_page", type=int) or LISTING_PAGE_SIZE
+    return max(1, min(per_page, LISTING_MAX_PAGE_SIZE))
+
+
+def keyset_args():
+    """(after_date, after_id) seek position of the previous page, or (None, None) for the first page"""
+    after_id = request.args.get("after_id", type=int)
+    try:
+        after_date = datetime.strptime(request.args.get("after_date") or "", "%Y-%m-%d").date()
+    except ValueError:
+        return None, None
+    return (after_date, after_id) if after_id is not None else (None, None)
+
+
+def keyset_page(rows, per_page, id_column):
+    """Trim the extra look-ahead row and return (rows, next_page_args or None)"""
+    if len(rows) <= per_page:
+        return rows, None
+    rows = rows[:per_page]
+    last = rows[-1]
+    return rows, {"after_date": last["date"].strftime("%Y-%m-%d"), "after_id": last[id_column]}
+
+
+def json_id_list(value):
+    """A JSON array of ids as a list of ints; ValueError for anything else, notably a bare
+    string, which would otherwise be iterated one digit at a time"""
+    if not isinstance(value, list):
+        raise ValueError("ids must be a list")
+    ids = []
+    for item in value:
+        if isinstance(item, bool) or not isinstance(item, (int, str)):
+            raise ValueError("ids must be integers")
+        ids.append(int(item))
+    return ids
+
+
+def require_login():
+    if not session.get("user_id"):
+        flash("Please log in", "error")
+        return False
+    return True
+
+
+def require_admin():
+    if session.get("user_role") != "admin":
+        flash("Admin access required", "error")
+        return False
+    return True
+
+
+# --------- Data Versions / Conditional GET ---------
+def bump_data_version(cur, entity, *months):
+    """Record a write to entity for each month (no months: the whole entity); call inside
+    the writing transaction so the new version is visible exactly when the data is"""
+    for month in set(months or ("",)):
+        cur.execute(
+            """
+            INSERT INTO data_versions (entity, month) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE version=version+1, updated_at=CURRENT_TIMESTAMP
+            """,
+            (entity, month or ""),
+        )
+
+
+def ledger_version_entity(user_id):
+    """data_versions entity for one member's ledger entries"""
+    return f"ledger:{user_id}"
+
+
+def bump_ledger_versions(cur, user_ids):
+    """Record new ledger entries for each member, with one batched upsert"""
+    if user_ids:
+        cur.executemany(
+            """
+            INSERT INTO data_versions (entity, month) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE version=version+1, updated_at=CURRENT_TIMESTAMP
+            """,
+            [(ledger_version_entity(uid), "") for uid in sorted(set(user_ids))],
+        )
+
+
+def _code_stamp():
+    """Newest mtime of this module and the templates, so a deploy invalidates every ETag"""
+    paths = [__file__] + [
+        os.path.join(root, name)
+        for root, _, names in os.walk(os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+        for name in names
+    ]
+    return max(int(os.path.getmtime(path)) for path in paths)
+
+
+CODE_STAMP = _code_stamp()
+
+
+class Freshness:
+    """Validators for a page built from the given data versions"""
+
+    def __init__(self, etag, last_modified, versions=None):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.versions = versions or {}
+
+    def matches(self):
+        if request.if_none_match:
+            return request.if_none_match.contains(self.etag)
+        since = request.if_modified_since
+        return since is not None and since.replace(tzinfo=None) >= self.last_modified
+
+    def not_modified(self):
+        return self.apply(Response(status=304))
+
+    def apply(self, response):
+        response.set_etag(self.etag)
+        response.last_modified = self.last_modified
+        # Always revalidate: the page is per user and changes whenever the data does
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+
+def data_freshness(cur, keys):
+    """Freshness of a GET page for the current user from (entity, month) version keys.
+
+    Returns None when the response must not be conditional: non-GET requests
+    and requests with flash messages waiting to be shown.
+    """
+    if request.method != "GET" or session.get("_flashes"):
+        return None
+    keys = sorted(set(keys))
+    cur.execute(
+        "SELECT entity, month, version, updated_at FROM data_versions WHERE "
+        + " OR ".join(["(entity=%s AND month=%s)"] * len(keys)),
+        [value for key in keys for value in key],
+    )
+    found = {(row["entity"], row["month"]): row for row in cur.fetchall()}
+    today = datetime.today()
+    # Pages show "today"-relative forms, so a new day is a new version too
+    last_modified = max(
+        [datetime.fromtimestamp(CODE_STAMP), today.replace(hour=0, minute=0, second=0, microsecond=0)]
+        + [row["updated_at"] for row in found.values() if row["updated_at"]]
+    ).replace(microsecond=0)
+    parts = [
+        str(CODE_STAMP), today.strftime("%Y-%m-%d"), request.full_path,
+        str(session.get("user_id")), str(session.get("user_role")),
+    ]
+    versions = {key: found[key]["version"] if key in found else 0 for key in keys}
+    parts += [f"{entity}:{month}:{versions[(entity, month)]}" for entity, month in keys]
+    return Freshness(hashlib.sha1("|".join(parts).encode()).hexdigest(), last_modified, versions)
+
+
+def conditional_response(freshness, body):
+    """Response for a rendered page, carrying its validators when it has them"""
+    response = make_response(body)
+    return freshness.apply(response) if freshness else response
+
+
+# --------- Members (Admin) ---------
+@app.route("/members", methods=["GET", "POST"])
+def members():
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    import_report = None
+
+    # Create user or update role
+    if request.method == "POST":
+        form_type = request.form.get("form_type")
+        if form_type == "create":
+            name = (request.form.get("name") or "").strip()
+            email = (request.form.get("email") or "").strip().lower()
+            password = request.form.get("password") or ""
+            mess_start_date = request.form.get("mess_start_date")
+            if not mess_start_date:
+                from datetime import date as _date
+                mess_start_date = _date.today().strftime("%Y-%m-%d")
+            if not name or not email or not password:
+                flash("Name, email and password are required", "error")
+            else:
+                try:
+                    cur.execute("SELECT id FROM users WHERE email=%s", (email,))
+                    if cur.fetchone():
+                        flash("Email already exists", "error")
+                    else:
+                        # Check if mess_start_date column exists
+                        if schema_caps.has_column("users", "mess_start_date"):
+                            cur.execute(
+                                "INSERT INTO users (name, email, password_hash, role, mess_start_date) VALUES (%s, %s, %s, 'member', %s)",
+                                (name, email, hash_password(password), mess_start_date),
+                            )
+                        else:
+                            # Fallback to basic insert if column doesn't exist
+                            cur.execute(
                                 "INSERT INTO users (name, email, password_hash, role) VALUES (%s, %s, %s, 'member')",
-                                (name, email, generate_password_hash(password)),
+                                (name, email, hash_password(password)),
                             )
+                        mark_bills_stale(cur, *months_spanning(_as_date(mess_start_date), date_type.today()))
+                        refresh_headcount_window(cur, mess_start_date)
+                        bump_data_version(cur, "members")
                         conn.commit()
                         flash("Member created successfully", "success")
                 except Exception as err:
@@ -539,677 +1526,2361 @@ def members():
             role = request.form.get("role")
             if user_id and role in ("admin", "member"):
                 cur.execute("UPDATE users SET role=%s WHERE id=%s", (role, user_id))
+                mark_bills_stale(cur, resolve_month())
+                refresh_headcount_window(cur)
+                bump_data_version(cur, "members")
+                conn.commit()
+                flash("Member updated", "success")
+        elif form_type == "remove":
+            user_id = request.form.get("user_id")
+            if user_id:
+                try:
+                    # Check if is_active column exists
+                    if schema_caps.has_column("users", "is_active"):
+                        # Soft delete - mark as inactive
+                        cur.execute("UPDATE users SET is_active=FALSE WHERE id=%s AND role='member'", (user_id,))
+                    else:
+                        # Hard delete if column doesn't exist
+                        cur.execute("DELETE FROM users WHERE id=%s AND role='member'", (user_id,))
+                    
+                    if cur.rowcount > 0:
+                        refresh_headcount_window(cur)
+                        bump_data_version(cur, "members")
+                        conn.commit()
+                        flash("Member removed successfully", "success")
+                    else:
+                        flash("Cannot remove admin users", "error")
+                except Exception as err:
+                    flash(f"Error removing member: {err}", "error")
+        elif form_type == "import":
+            upload = request.files.get("members_file")
+            if not upload or not upload.filename:
+                flash("Choose a CSV file to import", "error")
+            else:
+                try:
+                    # parse_member_csv reads the whole file up front, so a bad byte anywhere surfaces here
+                    rows, rejected = parse_member_csv(io.TextIOWrapper(upload.stream, encoding="utf-8-sig"))
+                    import_report = sorted(rejected + import_members(cur, rows), key=lambda entry: entry["line"])
+                    conn.commit()
+                    flash(f"Member import finished: {import_summary(import_report)}", "success")
+                except (UnicodeDecodeError, csv.Error) as err:
+                    flash(f"Could not read the CSV file; save it as UTF-8 CSV and try again ({err})", "error")
+                except Exception as err:
+                    conn.rollback()
+                    flash(f"Error importing members, nothing was saved: {err}", "error")
+        elif form_type == "update_mess_date":
+            user_id = request.form.get("user_id")
+            mess_start_date = request.form.get("mess_start_date")
+            if user_id and mess_start_date:
+                try:
+                    # Check if mess_start_date column exists
+                    if schema_caps.has_column("users", "mess_start_date"):
+                        cur.execute("SELECT mess_start_date FROM users WHERE id=%s", (user_id,))
+                        previous = cur.fetchone()
+                        cur.execute("UPDATE users SET mess_start_date=%s WHERE id=%s", (mess_start_date, user_id))
+                        new_start = datetime.strptime(mess_start_date, "%Y-%m-%d").date()
+                        old_start = _as_date(previous["mess_start_date"]) if previous and previous["mess_start_date"] else None
+                        # Bills change for every month between the old and the new start date
+                        mark_bills_stale(cur, *months_spanning(new_start, old_start or date_type.today()))
+                        refresh_headcount_window(cur, min(new_start, old_start or new_start))
+                        bump_data_version(cur, "members")
+                        conn.commit()
+                        flash("Mess start date updated", "success")
+                    else:
+                        flash("Mess start date column not available", "error")
+                except Exception as err:
+                    flash(f"Error updating mess start date: {err}", "error")
+
+    # Get users with safe column selection
+    try:
+        # Build safe SELECT query
+        select_columns = ["id", "name", "email", "role", "created_at"]
+        if schema_caps.has_column("users", "mess_start_date"):
+            select_columns.append("mess_start_date")
+        if schema_caps.has_column("users", "is_active"):
+            select_columns.append("is_active")
+            
+        select_query = f"SELECT {', '.join(select_columns)} FROM users ORDER BY created_at DESC"
+        cur.execute(select_query)
+        users = cur.fetchall()
+        
+    except Exception as e:
+        flash(f"Error fetching users: {e}", "error")
+        users = []
+    
+    cur.close()
+    conn.close()
+    
+    from datetime import date
+    today = date.today().strftime("%Y-%m-%d")
+    
+    return render_template("members.html", users=users, user_name=session.get("user_name"), user_role=session.get("user_role"), today=today, import_report=import_report)
+
+
+# --------- Member Import ---------
+# Start-of-semester onboarding: one CSV, one transaction. Hashing dominates the
+# cost (see `python benchmark.py hashing`), so it is spread over several workers.
+MEMBER_IMPORT_HASH_WORKERS = int(os.getenv("MEMBER_IMPORT_HASH_WORKERS", "0")) or os.cpu_count() or 1
+MEMBER_IMPORT_PARALLEL_MIN = 8  # below this a worker pool costs more to start than it saves
+MEMBER_REPORT_COLUMNS = ("line", "name", "email", "status", "user_id", "invite_token", "detail")
+EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+def _import_result(line, name, email, status, detail="", user_id=None, invite_token=None):
+    return {"line": line, "name": name, "email": email, "status": status,
+            "user_id": user_id, "invite_token": invite_token, "detail": detail}
+
+
+def parse_member_csv(stream):
+    """Read a member CSV with name and email columns and optional mess_start_date
+    (or start_date, YYYY-MM-DD) and password (or invite_token) columns.
+
+    Returns (rows, rejected): rows are ready for import_members(), rejected
+    holds a report entry for each unusable line. Rows without a password get a
+    generated invite token as their initial password.
+    """
+    reader = csv.DictReader(stream)
+    fields = {(name or "").strip().lower(): name for name in (reader.fieldnames or [])}
+    missing = [column for column in ("name", "email") if column not in fields]
+    if missing:
+        return [], [_import_result(1, "", "", "error", f"missing column(s): {', '.join(missing)}")]
+    start_column = fields.get("mess_start_date") or fields.get("start_date")
+    password_column = fields.get("password") or fields.get("invite_token")
+    today = datetime.today().date()
+    rows, rejected, seen = [], [], set()
+    for line_no, record in enumerate(reader, start=2):
+        name = (record.get(fields["name"]) or "").strip()
+        email = (record.get(fields["email"]) or "").strip().lower()
+        if not name and not email:
+            continue
+        raw_start = ((record.get(start_column) or "") if start_column else "").strip()
+        password = ((record.get(password_column) or "") if password_column else "").strip()
+        if not name or not EMAIL_PATTERN.match(email):
+            rejected.append(_import_result(line_no, name, email, "error", "name and a valid email are required"))
+            continue
+        if email in seen:
+            rejected.append(_import_result(line_no, name, email, "skipped", "duplicate email in file"))
+            continue
+        try:
+            start = datetime.strptime(raw_start, "%Y-%m-%d").date() if raw_start else today
+        except ValueError:
+            rejected.append(_import_result(line_no, name, email, "error", f"invalid start date '{raw_start}'"))
+            continue
+        seen.add(email)
+        rows.append({
+            "line": line_no,
+            "name": name,
+            "email": email,
+            "mess_start_date": start,
+            "password": password or None,
+        })
+    return rows, rejected
+
+
+def hash_passwords(passwords, processes=False):
+    """Hash with PASSWORD_HASH_METHOD, in parallel for large batches.
+
+    hashlib releases the GIL inside scrypt and pbkdf2, so threads run the
+    hashes in parallel. That is the only safe choice inside a web worker,
+    where forking a process pool would copy its live threads and held
+    locks. processes=True (the CLI) uses a process pool instead.
+    """
+    hasher = partial(generate_password_hash, method=PASSWORD_HASH_METHOD)
+    workers = min(MEMBER_IMPORT_HASH_WORKERS, len(passwords))
+    if len(passwords) < MEMBER_IMPORT_PARALLEL_MIN or workers < 2:
+        return [hasher(password) for password in passwords]
+    if not processes:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hash") as pool:
+            return list(pool.map(hasher, passwords))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(hasher, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def import_members(cur, rows, hash_processes=False):
+    """Create members from parse_member_csv() rows; the caller commits.
+
+    Emails that are already registered are found with one IN query and
+    skipped, the rest are hashed in parallel (see hash_passwords) and
+    inserted with a single executemany(). Returns one report entry per row.
+    """
+    if not rows:
+        return []
+    placeholders = ", ".join(["%s"] * len(rows))
+    cur.execute(f"SELECT email FROM users WHERE email IN ({placeholders})", [row["email"] for row in rows])
+    existing = {user["email"].lower() for user in cur.fetchall()}
+    new_rows = [row for row in rows if row["email"] not in existing]
+
+    tokens = {row["email"]: secrets.token_urlsafe(9) for row in new_rows if not row["password"]}
+    hashes = hash_passwords([row["password"] or tokens[row["email"]] for row in new_rows], hash_processes)
+    user_ids = {}
+    if new_rows:
+        if schema_caps.has_column("users", "mess_start_date"):
+            cur.executemany(
+                "INSERT INTO users (name, email, password_hash, role, mess_start_date) VALUES (%s, %s, %s, 'member', %s)",
+                [(row["name"], row["email"], password_hash, row["mess_start_date"])
+                 for row, password_hash in zip(new_rows, hashes)],
+            )
+        else:
+            cur.executemany(
+                "INSERT INTO users (name, email, password_hash, role) VALUES (%s, %s, %s, 'member')",
+                [(row["name"], row["email"], password_hash) for row, password_hash in zip(new_rows, hashes)],
+            )
+        placeholders = ", ".join(["%s"] * len(new_rows))
+        cur.execute(f"SELECT id, email FROM users WHERE email IN ({placeholders})", [row["email"] for row in new_rows])
+        user_ids = {user["email"].lower(): user["id"] for user in cur.fetchall()}
+        earliest = min(row["mess_start_date"] for row in new_rows)
+        mark_bills_stale(cur, *months_spanning(earliest, date_type.today()))
+        refresh_headcount_window(cur, earliest)
+        bump_data_version(cur, "members")
+
+    return [
+        _import_result(row["line"], row["name"], row["email"], "skipped", "email already registered")
+        if row["email"] in existing else
+        _import_result(row["line"], row["name"], row["email"], "created",
+                       user_id=user_ids.get(row["email"]), invite_token=tokens.get(row["email"]))
+        for row in rows
+    ]
+
+
+def import_summary(report):
+    counts = {"created": 0, "skipped": 0, "error": 0}
+    for entry in report:
+        counts[entry["status"]] += 1
+    return f"{counts['created']} created, {counts['skipped']} skipped, {counts['error']} rejected"
+
+
+@app.cli.command("import-members")
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--report", "report_file", type=click.File("w"), help="Write the per-row report as CSV here.")
+def import_members_command(csv_file, report_file):
+    """Create members from a CSV of name, email, mess_start_date and password / invite_token."""
+    rows, rejected = parse_member_csv(csv_file)
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    try:
+        report = sorted(rejected + import_members(cur, rows, hash_processes=True), key=lambda entry: entry["line"])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+    if report_file:
+        writer = csv.DictWriter(report_file, fieldnames=MEMBER_REPORT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(report)
+    else:
+        for entry in report:
+            detail = entry["detail"] or (f"invite token {entry['invite_token']}" if entry["invite_token"] else "")
+            print(f"line {entry['line']:>4}  {entry['status']:<8} {entry['email']}  {detail}".rstrip())
+    print(f"Imported members: {import_summary(report)}")
+
+
+# --------- Meals ---------
+MEAL_TYPES = ("breakfast", "lunch", "dinner")
+
+
+@app.route("/meals", methods=["GET", "POST"])
+def meals():
+    if not require_login():
+        return redirect(url_for("login"))
+
+    conn = get_connection(readonly=request.method == "GET")
+    cur = conn.cursor(DictCursor)
+
+    if request.method == "POST":
+        # Admin is view-only for meals; members can only cancel for tomorrow
+        if session.get("user_role") == "admin":
+            flash("Admins cannot add or modify meals. View-only.", "error")
+        else:
+            from datetime import date as _d, timedelta
+            tomorrow = (_d.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+            user_id = session.get("user_id")
+            date = request.form.get("date")
+            if date != tomorrow:
+                flash("You can only cancel for tomorrow.", "error")
+            else:
+                # Default: all meals are included (1), user can cancel (0)
+                b = 0 if request.form.get("breakfast") == "on" else 1
+                l = 0 if request.form.get("lunch") == "on" else 1
+                d = 0 if request.form.get("dinner") == "on" else 1
+                try:
+                    cur.execute("SELECT breakfast, lunch, dinner FROM meals WHERE user_id=%s AND date=%s", (user_id, date))
+                    previous = cur.fetchone()
+                    cur.execute(
+                        """
+                        INSERT INTO meals (user_id, date, breakfast, lunch, dinner)
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON DUPLICATE KEY UPDATE breakfast=VALUES(breakfast), lunch=VALUES(lunch), dinner=VALUES(dinner)
+                        """,
+                        (user_id, date, b, l, d),
+                    )
+                    adjust_headcount(
+                        cur, user_id, date,
+                        [previous[meal] for meal in MEAL_TYPES] if previous else [1, 1, 1],
+                        [b, l, d],
+                    )
+                    mark_bills_stale(cur, date[:7])
+                    bump_data_version(cur, "meals", date[:7])
+                    conn.commit()
+                    meal_rates.invalidate(date[:7])
+                    flash("Tomorrow's meal cancellations updated", "success")
+                except Exception as err:
+                    flash(f"Error saving meal cancellations: {err}", "error")
+
+    # List meals for month, one keyset page at a time (newest date first, then highest member id)
+    month = request.args.get("month")
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
+
+    freshness = data_freshness(cur, [("meals", month), ("members", "")])
+    if freshness and freshness.matches():
+        cur.close()
+        conn.close()
+        return freshness.not_modified()
+    per_page = page_size_arg()
+    after_date, after_id = keyset_args()
+    meal_filter = request.args.get("meal") if request.args.get("meal") in MEAL_TYPES else None
+
+    where = ["m.date >= %s", "m.date < %s"]
+    params = [first_day, next_month]
+    if meal_filter:
+        # Meal type filter shows the days that meal was cancelled
+        where.append(f"m.{meal_filter}=0")
+    if after_date:
+        where.append("(m.date < %s OR (m.date = %s AND m.user_id < %s))")
+        params += [after_date, after_date, after_id]
+
+    # Admin sees all; member sees own
+    filter_user = None
+    if session.get("user_role") == "admin":
+        filter_user = request.args.get("user_id", type=int)
+        if filter_user:
+            where.append("m.user_id=%s")
+            params.append(filter_user)
+        cur.execute(
+            f"""
+            SELECT m.*, u.name as user_name
+            FROM meals m
+            JOIN users u ON u.id = m.user_id
+            WHERE {' AND '.join(where)}
+            ORDER BY m.date DESC, m.user_id DESC
+            LIMIT %s
+            """,
+            params + [per_page + 1],
+        )
+        meals_rows = cur.fetchall()
+        cur.execute("SELECT id, name FROM users ORDER BY name")
+        all_users = cur.fetchall()
+    else:
+        where.append("m.user_id=%s")
+        params.append(session.get("user_id"))
+        cur.execute(
+            f"""
+            SELECT m.*, %s as user_name
+            FROM meals m
+            WHERE {' AND '.join(where)}
+            ORDER BY m.date DESC, m.user_id DESC
+            LIMIT %s
+            """,
+            [session.get("user_name")] + params + [per_page + 1],
+        )
+        meals_rows = cur.fetchall()
+        all_users = None
+
+    meals_rows, next_page = keyset_page(meals_rows, per_page, "user_id")
+    # Tomorrow string for template
+    from datetime import date as _d, timedelta
+    tomorrow = (_d.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+    cur.close()
+    conn.close()
+    return conditional_response(freshness, render_template(
+        "meals.html",
+        meals=meals_rows,
+        month=month,
+        all_users=all_users,
+        next_page=next_page,
+        per_page=per_page,
+        meal_filter=meal_filter,
+        filter_user=filter_user,
+        user_name=session.get("user_name"),
+        user_role=session.get("user_role"),
+        tomorrow=tomorrow,
+    ))
+
+
+BULK_CANCEL_MAX_DAYS = int(os.getenv("BULK_CANCEL_MAX_DAYS", "62"))
+
+
+def cancel_meals_bulk(cur, user_ids, start, end, meal_types):
+    """Cancel meal_types for every user and day in [start, end] with one batched upsert.
+
+    Existing cancellations are kept: a meal only moves from taken (1) to
+    cancelled (0), never back. Returns the number of (user, day) rows written;
+    the caller commits.
+    """
+    flags = tuple(0 if meal in meal_types else 1 for meal in MEAL_TYPES)
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    rows = [(user_id, day) + flags for user_id in user_ids for day in days]
+    if rows:
+        cur.executemany(
+            """
+            INSERT INTO meals (user_id, date, breakfast, lunch, dinner)
+            VALUES (%s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE breakfast=LEAST(breakfast, VALUES(breakfast)),
+                lunch=LEAST(lunch, VALUES(lunch)), dinner=LEAST(dinner, VALUES(dinner))
+            """,
+            rows,
+        )
+    return len(rows)
+
+
+@app.route("/meals/bulk_cancel", methods=["POST"])
+def bulk_cancel_meals():
+    """Cancel meals over a date range, for yourself or (admin) for many members at once.
+
+    Accepts form fields or a JSON body with start_date, end_date, meals (any of
+    breakfast/lunch/dinner) and, for admins, an optional user_ids list; without
+    it the closure applies to every active member.
+    """
+    if not require_login():
+        return redirect(url_for("login"))
+
+    payload = request.get_json(silent=True) if request.is_json else None
+    if request.is_json and not isinstance(payload, dict):
+        return jsonify(ok=False, message="Send a JSON object"), 400
+
+    def respond(message, category, status=200, **extra):
+        if payload is not None:
+            return jsonify(ok=category == "success", message=message, **extra), status
+        flash(message, category)
+        return redirect(url_for("meals"))
+
+    if payload is not None:
+        start_value = payload.get("start_date")
+        end_value = payload.get("end_date") or start_value
+        requested_meals = payload.get("meals") or []
+        if not isinstance(requested_meals, list):
+            return respond("meals must be a list of breakfast, lunch or dinner", "error", 400)
+        meal_types = [m for m in MEAL_TYPES if m in requested_meals]
+        try:
+            requested_ids = json_id_list(payload.get("user_ids") or [])
+        except ValueError:
+            return respond("user_ids must be a list of member ids", "error", 400)
+    else:
+        start_value = request.form.get("start_date")
+        end_value = request.form.get("end_date") or start_value
+        meal_types = [m for m in MEAL_TYPES if request.form.get(m) == "on"]
+        requested_ids = request.form.getlist("user_ids")
+
+    from datetime import date as _d
+    try:
+        start = datetime.strptime(start_value or "", "%Y-%m-%d").date()
+        end = datetime.strptime(end_value or "", "%Y-%m-%d").date()
+    except (ValueError, TypeError):
+        return respond("Start and end dates must be YYYY-MM-DD", "error", 400)
+    tomorrow = _d.today() + timedelta(days=1)
+    if not meal_types:
+        return respond("Select at least one meal to cancel", "error", 400)
+    if start < tomorrow:
+        return respond("Cancellations can only start from tomorrow.", "error", 400)
+    if end < start:
+        return respond("End date is before start date", "error", 400)
+    if (end - start).days + 1 > BULK_CANCEL_MAX_DAYS:
+        return respond(f"Cancellations are limited to {BULK_CANCEL_MAX_DAYS} days at a time", "error", 400)
+
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    try:
+        if session.get("user_role") != "admin":
+            user_ids = [session.get("user_id")]
+        elif requested_ids:
+            # Only active members can have meals closed for them, whatever ids were sent
+            ids = [int(uid) for uid in requested_ids]
+            cur.execute(
+                f"SELECT id FROM users u WHERE u.id IN ({', '.join(['%s'] * len(ids))}) AND {_eligible_members_sql()}",
+                ids,
+            )
+            user_ids = [row["id"] for row in cur.fetchall()]
+        else:
+            cur.execute(f"SELECT id FROM users u WHERE {_eligible_members_sql()}")
+            user_ids = [row["id"] for row in cur.fetchall()]
+
+        written = cancel_meals_bulk(cur, user_ids, start, end, meal_types)
+        rebuild_headcount(cur, start, end)
+        months = {(start + timedelta(days=i)).strftime("%Y-%m") for i in range((end - start).days + 1)}
+        mark_bills_stale(cur, *months)
+        bump_data_version(cur, "meals", *months)
+        conn.commit()
+    except (ValueError, pymysql.MySQLError) as err:
+        conn.rollback()
+        return respond(f"Error saving meal cancellations: {err}", "error", 400)
+    finally:
+        cur.close()
+        conn.close()
+
+    for month in months:
+        meal_rates.invalidate(month)
+    days = (end - start).days + 1
+    return respond(
+        f"Cancelled {', '.join(meal_types)} for {len(user_ids)} member(s) over {days} day(s)",
+        "success",
+        rows=written,
+        members=len(user_ids),
+        days=days,
+    )
+
+
+# --------- Kitchen Headcount ---------
+HEADCOUNT_HORIZON = int(os.getenv("HEADCOUNT_HORIZON", "62"))
+
+
+def _as_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+
+
+def _eligible_members_sql(alias="u"):
+    """WHERE fragment for members who eat by default (dates are checked separately)"""
+    condition = f"{alias}.role = 'member'"
+    if schema_caps.has_column("users", "is_active"):
+        condition += f" AND {alias}.is_active = TRUE"
+    return condition
+
+
+def compute_headcount(cur, start, end):
+    """(date, members, breakfast, lunch, dinner) for every day in [start, end] from two grouped queries.
+
+    A member counts from their mess start date for every meal they have not
+    cancelled.
+    """
+    start, end = _as_date(start), _as_date(end)
+    if end < start:
+        return []
+    has_start = schema_caps.has_column("users", "mess_start_date")
+    start_column = "mess_start_date" if has_start else "NULL"
+    cur.execute(
+        f"SELECT {start_column} as joined, COUNT(*) as members FROM users u WHERE {_eligible_members_sql()} GROUP BY joined"
+    )
+    joined = [(row["joined"], int(row["members"])) for row in cur.fetchall()]
+
+    start_filter = " AND (u.mess_start_date IS NULL OR u.mess_start_date <= m.date)" if has_start else ""
+    cur.execute(
+        f"""
+        SELECT m.date,
+               SUM(1 - m.breakfast) as breakfast, SUM(1 - m.lunch) as lunch, SUM(1 - m.dinner) as dinner
+        FROM meals m
+        JOIN users u ON u.id = m.user_id
+        WHERE m.date >= %s AND m.date <= %s AND {_eligible_members_sql()}{start_filter}
+        GROUP BY m.date
+        """,
+        (start, end),
+    )
+    cancelled = {row["date"]: row for row in cur.fetchall()}
+
+    rows = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        members = sum(count for joined_on, count in joined if joined_on is None or joined_on <= day)
+        off = cancelled.get(day) or {}
+        rows.append((day, members) + tuple(members - int(off.get(meal) or 0) for meal in MEAL_TYPES))
+    return rows
+
+
+def rebuild_headcount(cur, start, end):
+    """Recompute and store daily_headcount for every day in [start, end]; the caller commits"""
+    rows = compute_headcount(cur, start, end)
+    if not rows:
+        return 0
+    cur.executemany(
+        """
+        INSERT INTO daily_headcount (date, members, breakfast, lunch, dinner)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE members=VALUES(members), breakfast=VALUES(breakfast),
+            lunch=VALUES(lunch), dinner=VALUES(dinner)
+        """,
+        rows,
+    )
+    return len(rows)
+
+
+def refresh_headcount_window(cur, since=None):
+    """Rebuild headcounts from since (default today) through the planning horizon after a
+    membership change, and daily from the job worker as the horizon moves on.
+
+    History older than the horizon is left alone. Rows past the horizon are
+    dropped: nothing keeps them current, so reads compute those days instead.
+    """
+    today = datetime.today().date()
+    since = max(min(_as_date(since) or today, today), today - timedelta(days=HEADCOUNT_HORIZON))
+    horizon_end = today + timedelta(days=HEADCOUNT_HORIZON)
+    cur.execute("DELETE FROM daily_headcount WHERE date > %s", (horizon_end,))
+    return rebuild_headcount(cur, since, horizon_end)
+
+
+def adjust_headcount(cur, user_id, day, old_flags, new_flags):
+    """Apply one member's meal change on day to daily_headcount as a delta"""
+    deltas = [int(new) - int(old) for old, new in zip(old_flags, new_flags)]
+    if not any(deltas):
+        return
+    start_column = ", mess_start_date" if schema_caps.has_column("users", "mess_start_date") else ""
+    cur.execute(f"SELECT id{start_column} FROM users u WHERE u.id=%s AND {_eligible_members_sql()}", (user_id,))
+    member = cur.fetchone()
+    if not member or (member.get("mess_start_date") and member["mess_start_date"] > _as_date(day)):
+        return
+    cur.execute(
+        "UPDATE daily_headcount SET breakfast=breakfast+%s, lunch=lunch+%s, dinner=dinner+%s WHERE date=%s",
+        (*deltas, day),
+    )
+    if cur.rowcount == 0:
+        rebuild_headcount(cur, day, day)
+
+
+def read_headcount(cur, start, days):
+    """Headcount rows for days starting at start, without writing.
+
+    Days with no stored row (outside the maintained window) are computed on
+    the fly.
+    """
+    end = start + timedelta(days=days - 1)
+    cur.execute("SELECT * FROM daily_headcount WHERE date >= %s AND date <= %s ORDER BY date", (start, end))
+    by_date = {_as_date(row["date"]): row for row in cur.fetchall()}
+    if len(by_date) < days:
+        for day, members, *meals in compute_headcount(cur, start, end):
+            by_date.setdefault(day, {"date": day, "members": members, **dict(zip(MEAL_TYPES, meals))})
+    return [by_date[day] for day in sorted(by_date)]
+
+
+@app.route("/headcount")
+def headcount():
+    """Expected breakfasts, lunches and dinners per day (default: tomorrow and the following week)"""
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+
+    try:
+        start = datetime.strptime(request.args.get("date") or "", "%Y-%m-%d").date()
+    except ValueError:
+        start = datetime.today().date() + timedelta(days=1)
+    days = max(1, min(request.args.get("days", type=int) or 7, HEADCOUNT_HORIZON))
+
+    conn = get_connection(readonly=True)
+    cur = conn.cursor(DictCursor)
+    rows = read_headcount(cur, start, days)
+    cur.close()
+    conn.close()
+
+    if request.args.get("format") == "json":
+        return jsonify([
+            {"date": row["date"].isoformat(), "members": row["members"],
+             **{meal: row[meal] for meal in MEAL_TYPES}}
+            for row in rows
+        ])
+    return render_template(
+        "headcount.html",
+        rows=rows,
+        start=start.strftime("%Y-%m-%d"),
+        days=days,
+        user_name=session.get("user_name"),
+        user_role=session.get("user_role"),
+    )
+
+
+@app.cli.command("rebuild-headcount")
+@click.option("--start", help="First day YYYY-MM-DD (default: today minus the horizon).")
+@click.option("--end", help="Last day YYYY-MM-DD (default: today plus the horizon).")
+def rebuild_headcount_command(start, end):
+    """Recompute daily_headcount from meals and members."""
+    today = datetime.today().date()
+    start = _as_date(start) if start else today - timedelta(days=HEADCOUNT_HORIZON)
+    end = _as_date(end) if end else today + timedelta(days=HEADCOUNT_HORIZON)
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    count = rebuild_headcount(cur, start, end)
+    conn.commit()
+    cur.close()
+    conn.close()
+    print(f"Rebuilt headcount for {count} days")
+
+
+# --------- Expenses (Admin) ---------
+@app.route("/expenses", methods=["GET", "POST"])
+def expenses():
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+
+    if request.method == "POST":
+        date = request.form.get("date")
+        amount = request.form.get("amount")
+        category = request.form.get("category")
+        notes = request.form.get("notes")
+        try:
+            cur.execute(
+                "INSERT INTO expenses (date, amount, category, notes, created_by) VALUES (%s, %s, %s, %s, %s)",
+                (date, amount, category, notes, session.get("user_id")),
+            )
+            mark_bills_stale(cur, resolve_month((date or "")[:7]))
+            bump_data_version(cur, "expenses", resolve_month((date or "")[:7]))
+            conn.commit()
+            meal_rates.invalidate((date or "")[:7])
+            flash("Expense added", "success")
+        except Exception as err:
+            flash(f"Error adding expense: {err}", "error")
+
+    month = request.args.get("month")
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
+
+    cur.execute(
+        "SELECT * FROM expenses WHERE date >= %s AND date < %s ORDER BY date DESC",
+        (first_day, next_month),
+    )
+    rows = cur.fetchall()
+    cur.execute(
+        "SELECT IFNULL(SUM(amount),0) as total FROM expenses WHERE date >= %s AND date < %s",
+        (first_day, next_month),
+    )
+    total = cur.fetchone()["total"]
+    cur.close()
+    conn.close()
+    return render_template("expenses.html", expenses=rows, month=month, total=total, user_name=session.get("user_name"), user_role=session.get("user_role"))
+
+
+# --------- Payments ---------
+@app.route("/payments", methods=["GET", "POST"])
+def payments():
+    if not require_login():
+        return redirect(url_for("login"))
+
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+
+    if request.method == "POST":
+        form_type = request.form.get("form_type")
+        if form_type == "create":
+            # Members submit payments; status is pending by default
+            user_id = session.get("user_id")
+            date = request.form.get("date")
+            amount = request.form.get("amount")
+            method = request.form.get("method")
+            reference = request.form.get("reference")
+            try:
+                cur.execute(
+                    "INSERT INTO payments (user_id, date, amount, method, reference, status) VALUES (%s, %s, %s, %s, %s, 'pending')",
+                    (user_id, date, amount, method, reference),
+                )
+                bump_data_version(cur, "payments", resolve_month((date or "")[:7]))
                 conn.commit()
-                flash("Member updated", "success")
-        elif form_type == "remove":
-            user_id = request.form.get("user_id")
-            if user_id:
-                try:
-                    # Check if is_active column exists
-                    cur.execute("SHOW COLUMNS FROM users LIKE 'is_active'")
-                    if cur.fetchone():
-                        # Soft delete - mark as inactive
-                        cur.execute("UPDATE users SET is_active=FALSE WHERE id=%s AND role='member'", (user_id,))
-                    else:
-                        # Hard delete if column doesn't exist
-                        cur.execute("DELETE FROM users WHERE id=%s AND role='member'", (user_id,))
-                    
-                    if cur.rowcount > 0:
-                        conn.commit()
-                        flash("Member removed successfully", "success")
-                    else:
-                        flash("Cannot remove admin users", "error")
-                except Exception as err:
-                    flash(f"Error removing member: {err}", "error")
-        elif form_type == "update_mess_date":
-            user_id = request.form.get("user_id")
-            mess_start_date = request.form.get("mess_start_date")
-            if user_id and mess_start_date:
+                flash("Payment submitted successfully. Waiting for admin approval.", "success")
+            except Exception as err:
+                flash(f"Error submitting payment: {err}", "error")
+        elif form_type == "approve" and session.get("user_role") == "admin":
+            payment_id = request.form.get("payment_id")
+            action = request.form.get("action")  # approve or reject
+            if payment_id and action in ("approve", "reject"):
                 try:
-                    # Check if mess_start_date column exists
-                    cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-                    if cur.fetchone():
-                        cur.execute("UPDATE users SET mess_start_date=%s WHERE id=%s", (mess_start_date, user_id))
-                        conn.commit()
-                        flash("Mess start date updated", "success")
-                    else:
-                        flash("Mess start date column not available", "error")
+                    status = "approved" if action == "approve" else "rejected"
+                    cur.execute(
+                        "UPDATE payments SET status=%s, approved_by=%s, approved_at=CURRENT_TIMESTAMP WHERE id=%s",
+                        (status, session.get("user_id"), payment_id)
+                    )
+                    cur.execute("SELECT date FROM payments WHERE id=%s", (payment_id,))
+                    paid_row = cur.fetchone()
+                    if paid_row:
+                        mark_bills_stale(cur, paid_row["date"].strftime("%Y-%m"))
+                        bump_data_version(cur, "payments", paid_row["date"].strftime("%Y-%m"))
+                    post_payments_to_ledger(cur, [payment_id])
+                    conn.commit()
+                    flash(f"Payment {action}d successfully", "success")
                 except Exception as err:
-                    flash(f"Error updating mess start date: {err}", "error")
+                    flash(f"Error updating payment: {err}", "error")
+
+    month = request.args.get("month")
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
+
+    per_page = page_size_arg()
+    after_date, after_id = keyset_args()
+    status_filter = request.args.get("status") if request.args.get("status") in PAYMENT_STATUSES else None
+
+    where = ["p.date >= %s", "p.date < %s"]
+    params = [first_day, next_month]
+    if status_filter:
+        where.append("p.status=%s")
+        params.append(status_filter)
+    if after_date:
+        where.append("(p.date < %s OR (p.date = %s AND p.id < %s))")
+        params += [after_date, after_date, after_id]
+
+    filter_user = None
+    if session.get("user_role") == "admin":
+        filter_user = request.args.get("user_id", type=int)
+        if filter_user:
+            where.append("p.user_id=%s")
+            params.append(filter_user)
+        cur.execute(
+            f"""
+            SELECT p.*, u.name as user_name
+            FROM payments p
+            JOIN users u ON u.id = p.user_id
+            WHERE {' AND '.join(where)}
+            ORDER BY p.date DESC, p.id DESC
+            LIMIT %s
+            """,
+            params + [per_page + 1],
+        )
+        payments_rows = cur.fetchall()
+        cur.execute("SELECT id, name FROM users ORDER BY name")
+        all_users = cur.fetchall()
+    else:
+        where.append("p.user_id=%s")
+        params.append(session.get("user_id"))
+        cur.execute(
+            f"""
+            SELECT p.*, %s as user_name
+            FROM payments p
+            WHERE {' AND '.join(where)}
+            ORDER BY p.date DESC, p.id DESC
+            LIMIT %s
+            """,
+            [session.get("user_name")] + params + [per_page + 1],
+        )
+        payments_rows = cur.fetchall()
+        all_users = None
+
+    payments_rows, next_page = keyset_page(payments_rows, per_page, "id")
+
+    cur.close()
+    conn.close()
+    return render_template(
+        "payments.html",
+        payments=payments_rows,
+        month=month,
+        all_users=all_users,
+        next_page=next_page,
+        per_page=per_page,
+        status_filter=status_filter,
+        filter_user=filter_user,
+        user_name=session.get("user_name"),
+        user_role=session.get("user_role"),
+    )
+
+
+PAYMENT_DECISIONS = {"approve": "approved", "reject": "rejected"}
+
+
+def decide_payments(cur, status, decided_by, payment_ids=None, month=None, max_amount=None, method=None, user_id=None):
+    """Set status on every pending payment matching payment_ids and the filters with one UPDATE.
+
+    The matching rows are locked first, so a payment approved concurrently
+    on its own is neither decided twice nor posted twice. Months that gain
+    approved payments get their bills recomputed here rather than by the
+    background refresher. The caller commits. Returns a summary dict.
+    """
+    summary = {"decision": status, "updated": 0, "amount": 0.0, "months": [], "ledger_entries": 0, "bills_refreshed": 0}
+    if payment_ids is not None and not payment_ids:
+        return summary
+    where, params = ["status='pending'"], []
+    if payment_ids is not None:
+        where.append(f"id IN ({', '.join(['%s'] * len(payment_ids))})")
+        params += payment_ids
+    if month:
+        first_day, next_month = month_range(month)
+        where += ["date >= %s", "date < %s"]
+        params += [first_day, next_month]
+    if max_amount is not None:
+        where.append("amount <= %s")
+        params.append(max_amount)
+    if method:
+        where.append("LOWER(method) = %s")
+        params.append(method.strip().lower())
+    if user_id:
+        where.append("user_id = %s")
+        params.append(user_id)
+    cur.execute(f"SELECT id, date, amount FROM payments WHERE {' AND '.join(where)} FOR UPDATE", params)
+    rows = cur.fetchall()
+    if not rows:
+        return summary
+    ids = [row["id"] for row in rows]
+    cur.execute(
+        f"UPDATE payments SET status=%s, approved_by=%s, approved_at=CURRENT_TIMESTAMP WHERE id IN ({', '.join(['%s'] * len(ids))})",
+        [status, decided_by] + ids,
+    )
+    months = sorted({row["date"].strftime("%Y-%m") for row in rows})
+    bump_data_version(cur, "payments", *months)
+    summary["ledger_entries"] = post_payments_to_ledger(cur, ids)
+    if status == "approved":
+        # Rejecting a pending payment changes no bill
+        for affected in months:
+            summary["bills_refreshed"] += refresh_month_bills(cur, affected)
+    summary.update(updated=len(ids), amount=float(sum(row["amount"] for row in rows)), months=months)
+    return summary
+
+
+@app.route("/payments/batch", methods=["POST"])
+def batch_payments():
+    """Approve or reject many pending payments at once (admin).
+
+    Accepts form fields or a JSON body with action (approve/reject) and either
+    payment_ids, or filters: month, max_amount, method and user_id. Only
+    pending payments are ever changed.
+    """
+    if not require_login():
+        return redirect(url_for("login"))
+
+    payload = request.get_json(silent=True) if request.is_json else None
+    if request.is_json and not isinstance(payload, dict):
+        return jsonify(ok=False, message="Send a JSON object"), 400
+    source = payload if payload is not None else request.form
+    month = source.get("month") or None
+    redirect_month = resolve_month(month if isinstance(month, str) else None)
+
+    def respond(message, category, status=200, **extra):
+        if payload is not None:
+            return jsonify(ok=category == "success", message=message, **extra), status
+        flash(message, category)
+        return redirect(url_for("payments", month=redirect_month, status="pending"))
+
+    if session.get("user_role") != "admin":
+        return respond("Only admins can approve payments", "error", 403)
+    action = source.get("action")
+    status = PAYMENT_DECISIONS.get(action) if isinstance(action, str) else None
+    if not status:
+        return respond("Choose approve or reject", "error", 400)
+    try:
+        if payload is not None:
+            requested_ids = payload.get("payment_ids")
+            payment_ids = json_id_list(requested_ids) if requested_ids is not None else None
+        elif source.get("scope") != "filter":
+            payment_ids = [int(pid) for pid in request.form.getlist("payment_ids")]
+        else:
+            payment_ids = None
+        max_amount = Decimal(str(source.get("max_amount"))) if source.get("max_amount") not in (None, "") else None
+        user_id = int(source.get("user_id")) if source.get("user_id") else None
+        if month:
+            month = datetime.strptime(month, "%Y-%m").strftime("%Y-%m")
+    except (ValueError, TypeError, ArithmeticError):
+        return respond("Payment ids, amount, member and month must be valid", "error", 400)
+    method = source.get("method")
+    method = method.strip() or None if isinstance(method, str) else None
+    if payment_ids is None and not (month or max_amount is not None or method or user_id):
+        return respond("Select payments or give at least one filter", "error", 400)
+    if payment_ids == []:
+        return respond("No payments selected", "error", 400)
+
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    try:
+        summary = decide_payments(cur, status, session.get("user_id"), payment_ids, month, max_amount, method, user_id)
+        conn.commit()
+    except pymysql.MySQLError as err:
+        conn.rollback()
+        return respond(f"Error updating payments: {err}", "error", 400)
+    finally:
+        cur.close()
+        conn.close()
+
+    if not summary["updated"]:
+        return respond("No pending payments matched", "success", **summary)
+    return respond(
+        f"{status.title()} {summary['updated']} payment(s) totalling ₹{summary['amount']:.2f}"
+        + (f"; refreshed {summary['bills_refreshed']} bill(s) for {', '.join(summary['months'])}" if summary["bills_refreshed"] else ""),
+        "success",
+        **summary,
+    )
+
+# --------- Meal Rate Cache ---------
+MEAL_RATE_CACHE_SIZE = int(os.getenv("MEAL_RATE_CACHE_SIZE", "24"))
+MEAL_RATE_CACHE_TTL = int(os.getenv("MEAL_RATE_CACHE_TTL", "60"))
+
+
+class MealRateCache:
+    """Bounded LRU cache of each month's expense total, meal total and meal rate.
+
+    Writes to expenses or meals call invalidate() for the month they touch.
+    Each gunicorn worker has its own cache, so entries also expire after
+    ttl seconds to bound how stale another worker's rate can be. Totals are
+    computed outside the lock; a per-month generation counter, bumped by
+    invalidate(), keeps a computation that raced an invalidation from being
+    stored. Totals read through a replica cursor are returned, never stored.
+
+    Callers that hand out validators built from data_versions pass the
+    month's meals and expenses versions; an entry is then only used if it
+    was computed at exactly those versions, so a page can never carry a new
+    ETag over another worker's old rate.
+    """
+
+    def __init__(self, maxsize=MEAL_RATE_CACHE_SIZE, ttl=MEAL_RATE_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._epoch = 0
+
+    def get(self, cur, month, version=None):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(month)
+            if entry is not None and (entry[2] == version if version is not None else now - entry[0] <= self.ttl):
+                self._entries.move_to_end(month)
+                return entry[1]
+            generation = (self._epoch, self._generations.get(month, 0))
+        totals = self._compute(cur, month)
+        if getattr(cur, "from_replica", False):
+            # A lagging replica's totals would be served to sessions that must read their own writes
+            return totals
+        with self._lock:
+            if generation == (self._epoch, self._generations.get(month, 0)):
+                self._entries[month] = (now, totals, version)
+                self._entries.move_to_end(month)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return totals
+
+    @staticmethod
+    def _compute(cur, month):
+        first_day, next_month = month_range(month)
+        cur.execute(
+            "SELECT IFNULL(SUM(amount),0) as total_expenses FROM expenses WHERE date >= %s AND date < %s",
+            (first_day, next_month),
+        )
+        total_expenses = float(cur.fetchone()["total_expenses"] or 0)
+        cur.execute(
+            "SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals FROM meals WHERE date >= %s AND date < %s",
+            (first_day, next_month),
+        )
+        total_meals = int(cur.fetchone()["total_meals"] or 0)
+        return {
+            "total_expenses": total_expenses,
+            "total_meals": total_meals,
+            "meal_rate": (total_expenses / total_meals) if total_meals > 0 else 0.0,
+        }
+
+    def invalidate(self, month):
+        with self._lock:
+            self._entries.pop(month, None)
+            self._generations[month] = self._generations.get(month, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+
+meal_rates = MealRateCache()
+
+
+# --------- Monthly Billing ---------
+def compute_monthly_bills(cur, month, user_ids=None, rate_version=None):
+    """Compute monthly bills with a fixed number of grouped queries.
+
+    The month's meal rate is computed once; per-member meal, cancellation
+    and approved payment totals come from GROUP BY queries. Without user_ids
+    every member is billed, otherwise only the given users (any role).
+    rate_version is passed on to meal_rates.get(). The amount due includes
+    the balance brought forward from closed months. Returns one dict per
+    user, shaped like a monthly_bills row plus name and mess_start_date.
+    """
+    first_day, next_month = month_range(month)
+    month_end = next_month - timedelta(days=1)
+    meal_rate = meal_rates.get(cur, month, rate_version)["meal_rate"]
+
+    start_column = ", mess_start_date" if schema_caps.has_column("users", "mess_start_date") else ""
+    if user_ids is None:
+        user_filter, user_params = "", ()
+        cur.execute(f"SELECT id, name{start_column} FROM users WHERE role = 'member'")
+    else:
+        user_ids = [int(uid) for uid in user_ids]
+        if not user_ids:
+            return []
+        user_filter = f" AND user_id IN ({', '.join(['%s'] * len(user_ids))})"
+        user_params = tuple(user_ids)
+        cur.execute(
+            f"SELECT id, name{start_column} FROM users WHERE id IN ({', '.join(['%s'] * len(user_ids))})",
+            user_params,
+        )
+    users = cur.fetchall()
+
+    cur.execute(
+        f"""
+        SELECT user_id,
+            IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals,
+            IFNULL(SUM(CASE WHEN breakfast=0 THEN 1 ELSE 0 END + 
+                       CASE WHEN lunch=0 THEN 1 ELSE 0 END + 
+                       CASE WHEN dinner=0 THEN 1 ELSE 0 END), 0) as cancelled_meals
+        FROM meals
+        WHERE date >= %s AND date < %s{user_filter}
+        GROUP BY user_id
+        """,
+        (first_day, next_month) + user_params,
+    )
+    meal_counts = {row["user_id"]: row for row in cur.fetchall()}
+
+    cur.execute(
+        f"""
+        SELECT user_id, IFNULL(SUM(amount),0) as payments_sum
+        FROM payments
+        WHERE status='approved' AND date >= %s AND date < %s{user_filter}
+        GROUP BY user_id
+        """,
+        (first_day, next_month) + user_params,
+    )
+    paid = {row["user_id"]: float(row["payments_sum"] or 0) for row in cur.fetchall()}
+
+    # Charges less credits of the closed months before this one; open months are billed on their own
+    brought = {}
+    last_closed = last_closed_month(cur)
+    if last_closed:
+        cur.execute(
+            f"""
+            SELECT user_id, IFNULL(SUM(amount),0) as brought_forward
+            FROM member_ledger
+            WHERE month < %s AND month <= %s{user_filter}
+            GROUP BY user_id
+            """,
+            (month, last_closed) + user_params,
+        )
+        brought = {row["user_id"]: float(row["brought_forward"] or 0) for row in cur.fetchall()}
+
+    bills = []
+    for user in users:
+        counts = meal_counts.get(user["id"]) or {}
+        total_user_meals = int(counts.get("total_meals") or 0)
+        cancelled_meals = int(counts.get("cancelled_meals") or 0)
+        mess_start_date = user.get("mess_start_date") or first_day
+
+        # If no meals recorded, every day from the mess start date is billable
+        if total_user_meals == 0 and cancelled_meals == 0:
+            actual_start = max(first_day, mess_start_date)
+            days_in_month = max((month_end - actual_start).days + 1, 0)
+            billable_meals = days_in_month * 3  # 3 meals per day
+        else:
+            billable_meals = total_user_meals + cancelled_meals
+
+        bill_amount = billable_meals * meal_rate
+        payments_sum = paid.get(user["id"], 0.0)
+        brought_forward = brought.get(user["id"], 0.0)
+        due_amount = bill_amount + brought_forward - payments_sum
+        bills.append({
+            "user_id": user["id"],
+            "name": user["name"],
+            "mess_start_date": mess_start_date,
+            "month": month,
+            "total_meals": total_user_meals,
+            "cancelled_meals": cancelled_meals,
+            "billable_meals": billable_meals,
+            "meal_rate": meal_rate,
+            "total_amount": bill_amount,
+            "paid_amount": payments_sum,
+            "brought_forward": brought_forward,
+            "due_amount": due_amount,
+            "status": "paid" if due_amount <= 0 else "pending",
+        })
+    return bills
+
+
+def save_monthly_bills(cur, bills):
+    """Upsert computed bills into monthly_bills.
+
+    pymysql's executemany() folds INSERT ... VALUES into multi-row statements,
+    so this is a single round trip for any realistic member count.
+    """
+    if not bills:
+        return
+    cur.executemany(
+        """
+        INSERT INTO monthly_bills (user_id, month, total_meals, cancelled_meals, billable_meals, 
+                                 meal_rate, total_amount, paid_amount, brought_forward, due_amount, status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE 
+            total_meals=VALUES(total_meals), cancelled_meals=VALUES(cancelled_meals),
+            billable_meals=VALUES(billable_meals), meal_rate=VALUES(meal_rate),
+            total_amount=VALUES(total_amount), paid_amount=VALUES(paid_amount),
+            brought_forward=VALUES(brought_forward), due_amount=VALUES(due_amount),
+            status=VALUES(status), refreshed_at=CURRENT_TIMESTAMP
+        """,
+        [
+            (b["user_id"], b["month"], b["total_meals"], b["cancelled_meals"], b["billable_meals"],
+             b["meal_rate"], b["total_amount"], b["paid_amount"], b["brought_forward"], b["due_amount"], b["status"])
+            for b in bills
+        ],
+    )
 
-    # Get users with safe column selection
+
+def mark_bills_stale(cur, *months):
+    """Flag months whose materialized monthly_bills rows no longer match their inputs.
+
+    Call inside the transaction that changes meals, expenses, approved
+    payments or membership. Flagging is idempotent: a month that is already
+    flagged is left as it is, so concurrent writes to one month don't queue
+    on its row. Whoever recomputes the month clears the flag before reading
+    (see generate_bills_job), and any write after that flags it again.
+    """
+    if months:
+        cur.executemany("INSERT IGNORE INTO stale_bill_months (month) VALUES (%s)", [(m,) for m in sorted(set(months))])
+
+
+def mark_later_bills_stale(cur, month):
+    """Flag every billed month after month; their due amounts carry its balance forward"""
+    cur.execute("SELECT DISTINCT month FROM monthly_bills WHERE month > %s", (month,))
+    mark_bills_stale(cur, *[row["month"] for row in cur.fetchall()])
+
+
+def months_spanning(first, last):
+    """Every 'YYYY-MM' month from the one containing first through the one containing last"""
+    first, last = min(first, last), max(first, last)
+    month, months = first.replace(day=1), []
+    while month <= last:
+        months.append(month.strftime("%Y-%m"))
+        month = (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return months
+
+
+def refresh_month_bills(cur, month):
+    """Clear month's stale flag, then recompute and upsert every member's bill in one go.
+
+    Runs entirely in the caller's transaction, so writes flagging the month
+    wait until the caller commits; keep it for one-off refreshes and let the
+    chunked generate_bills job do routine ones. The caller commits.
+    """
+    cur.execute("DELETE FROM stale_bill_months WHERE month=%s", (month,))
+    # Another worker may have written to this month; don't trust the cached rate
+    meal_rates.invalidate(month)
+    bills = compute_monthly_bills(cur, month)
+    save_monthly_bills(cur, bills)
+    return len(bills)
+
+
+def refresh_stale_bills(limit=12):
+    """Queue a generate_bills job for every month flagged stale or older than MONTHLY_BILL_MAX_AGE.
+
+    Returns the months queued. The jobs table allows one active job per
+    month, so however many workers notice the same month, it is recomputed
+    once, in chunks.
+    """
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    queued = []
     try:
-        # Check which columns exist
-        cur.execute("SHOW COLUMNS FROM users")
-        columns_result = cur.fetchall()
-        columns = [col['Field'] for col in columns_result]
-        
-        # Build safe SELECT query
-        select_columns = ["id", "name", "email", "role", "created_at"]
-        if "mess_start_date" in columns:
-            select_columns.append("mess_start_date")
-        if "is_active" in columns:
-            select_columns.append("is_active")
-            
-        select_query = f"SELECT {', '.join(select_columns)} FROM users ORDER BY created_at DESC"
-        cur.execute(select_query)
-        users = cur.fetchall()
-        
-    except Exception as e:
-        flash(f"Error fetching users: {e}", "error")
-        users = []
-    
+        # read_monthly_bill stops serving a month's rows once any is too old; regenerating brings them back
+        cur.execute(
+            """
+            SELECT month FROM stale_bill_months
+            UNION
+            SELECT month FROM monthly_bills GROUP BY month HAVING MIN(refreshed_at) < NOW() - INTERVAL %s SECOND
+            ORDER BY month LIMIT %s
+            """,
+            (MONTHLY_BILL_MAX_AGE, limit),
+        )
+        for row in cur.fetchall():
+            _, created = enqueue_job(cur, "generate_bills", row["month"])
+            if created:
+                queued.append(row["month"])
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+    return queued
+
+
+BILL_REFRESH_INTERVAL = int(os.getenv("BILL_REFRESH_INTERVAL", "30"))
+MONTHLY_BILL_MAX_AGE = int(os.getenv("MONTHLY_BILL_MAX_AGE", "3600"))
+
+
+class BillRefresher:
+    """Daemon thread that periodically queues bill generation for stale and expired months.
+
+    Every worker may run one; the job worker does the recomputing, and a
+    month that already has a queued or running job is not queued again.
+    """
+
+    def __init__(self, interval=BILL_REFRESH_INTERVAL):
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="bill-refresher", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                refresh_stale_bills()
+            except Exception as e:
+                print(f"Bill refresh error: {e}")
+
+
+bill_refresher = BillRefresher()
+
+
+@app.before_request
+def start_bill_refresher():
+    bill_refresher.ensure_started()
+
+
+@app.cli.command("refresh-bills")
+@click.option("--month", help="Recompute this YYYY-MM month now instead of queueing the months flagged stale.")
+def refresh_bills_command(month):
+    """Recompute one month's monthly_bills rows, or queue bill generation for stale months."""
+    if month:
+        conn = get_connection()
+        cur = conn.cursor(DictCursor)
+        count = refresh_month_bills(cur, resolve_month(month))
+        conn.commit()
+        cur.close()
+        conn.close()
+        print(f"Refreshed {count} bills for {month}")
+    else:
+        queued = refresh_stale_bills(limit=1000)
+        print(f"Queued bill generation for: {', '.join(queued) or 'none'} (run `flask run-jobs` if no worker is running)")
+
+
+def read_monthly_bill(cur, user_id, month):
+    """Materialized bill for one user, or None when missing, flagged stale, being regenerated or too old.
+
+    Returns False when the user does not exist.
+    """
+    start_column = ", u.mess_start_date" if schema_caps.has_column("users", "mess_start_date") else ""
+    # A running generate_bills job has already cleared the month's flag but may not have reached this member
+    cur.execute(
+        f"""
+        SELECT mb.*, u.name{start_column},
+               (s.month IS NOT NULL OR j.id IS NOT NULL) as is_stale,
+               (mb.refreshed_at < NOW() - INTERVAL %s SECOND) as is_old
+        FROM users u
+        LEFT JOIN monthly_bills mb ON mb.user_id = u.id AND mb.month = %s
+        LEFT JOIN stale_bill_months s ON s.month = %s
+        LEFT JOIN jobs j ON j.active_key = %s
+        WHERE u.id = %s
+        """,
+        (MONTHLY_BILL_MAX_AGE, month, month, f"generate_bills:{month}", user_id),
+    )
+    row = cur.fetchone()
+    if not row:
+        return False
+    if row["id"] is None or row["is_stale"] or row["is_old"]:
+        return None
+    first_day, _ = month_range(month)
+    return {
+        "user_id": row["user_id"],
+        "name": row["name"],
+        "mess_start_date": row.get("mess_start_date") or first_day,
+        "month": month,
+        "total_meals": int(row["total_meals"] or 0),
+        "cancelled_meals": int(row["cancelled_meals"] or 0),
+        "billable_meals": int(row["billable_meals"] or 0),
+        "meal_rate": float(row["meal_rate"] or 0),
+        "total_amount": float(row["total_amount"] or 0),
+        "paid_amount": float(row["paid_amount"] or 0),
+        "brought_forward": float(row["brought_forward"] or 0),
+        "due_amount": float(row["due_amount"] or 0),
+        "status": row["status"],
+    }
+
+
+@app.route("/monthly_bill")
+def monthly_bill():
+    if not require_login():
+        return redirect(url_for("login"))
+
+    month = request.args.get("month")
+    user_id = request.args.get("user_id") or session.get("user_id")
+
+    # Members can only see their own bill
+    if session.get("user_role") != "admin" and str(user_id) != str(session.get("user_id")):
+        flash("Not allowed", "error")
+        return redirect(url_for("dashboard"))
+
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
+
+    conn = get_connection(readonly=True)
+    cur = conn.cursor(DictCursor)
+
+    # "ledger" changes when a month closes for everyone, ledger:<id> with this member's entries
+    freshness = data_freshness(cur, [
+        ("meals", month), ("payments", month), ("expenses", month), ("members", ""), ("ledger", ""),
+        (ledger_version_entity(user_id), ""),
+    ])
+    if freshness and freshness.matches():
+        cur.close()
+        conn.close()
+        return freshness.not_modified()
+
+    # Read the materialized bill; calculate on the fly (without writing) if it is missing or stale
+    try:
+        bill_row = read_monthly_bill(cur, int(user_id), month)
+    except ValueError:
+        bill_row = False
+    if bill_row is None:
+        # Under an ETag, the rate must be the one for the versions the ETag names
+        rate_version = (freshness.versions[("meals", month)], freshness.versions[("expenses", month)]) if freshness else None
+        bills = compute_monthly_bills(cur, month, [user_id], rate_version)
+        bill_row = bills[0] if bills else False
+    if not bill_row:
+        flash("User not found", "error")
+        return redirect(url_for("dashboard"))
+    ledger = read_member_balance(cur, bill_row["user_id"], month)
+
+    # Itemized payments
+    cur.execute(
+        "SELECT date, amount, method, reference, status FROM payments WHERE user_id=%s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, first_day, next_month),
+    )
+    payments_rows = cur.fetchall()
+
+    # Itemized meals by day
+    cur.execute(
+        "SELECT date, breakfast, lunch, dinner FROM meals WHERE user_id=%s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, first_day, next_month),
+    )
+    meals_rows = cur.fetchall()
+
     cur.close()
     conn.close()
-    
-    from datetime import date
-    today = date.today().strftime("%Y-%m-%d")
-    
-    return render_template("members.html", users=users, user_name=session.get("user_name"), user_role=session.get("user_role"), today=today)
 
+    return conditional_response(freshness, render_template(
+        "monthly_bill.html",
+        month=month,
+        user_name=bill_row["name"],
+        mess_start_date=bill_row["mess_start_date"],
+        total_meals=bill_row["total_meals"],
+        cancelled_meals=bill_row["cancelled_meals"],
+        billable_meals=bill_row["billable_meals"],
+        payments_sum=bill_row["paid_amount"],
+        meal_rate=bill_row["meal_rate"],
+        bill_amount=bill_row["total_amount"],
+        bill_brought_forward=bill_row["brought_forward"],
+        due_amount=bill_row["due_amount"],
+        brought_forward=ledger["brought_forward"],
+        statement=ledger["statement"],
+        ledger_balance=ledger["balance"],
+        payments_rows=payments_rows,
+        meals_rows=meals_rows,
+        user_role=session.get("user_role"),
+    ))
 
-# --------- Meals ---------
-@app.route("/meals", methods=["GET", "POST"])
-def meals():
+# --------- Bill (per user, printable) ---------
+@app.route("/bill")
+def bill():
     if not require_login():
         return redirect(url_for("login"))
 
-    conn = get_connection()
+    month = request.args.get("month")
+    user_id = request.args.get("user_id") or session.get("user_id")
+
+    # Members can only see their own bill
+    if session.get("user_role") != "admin" and str(user_id) != str(session.get("user_id")):
+        flash("Not allowed", "error")
+        return redirect(url_for("reports"))
+
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
+
+    conn = get_connection(readonly=True)
     cur = conn.cursor(DictCursor)
 
-    if request.method == "POST":
-        # Admin is view-only for meals; members can only cancel for tomorrow
-        if session.get("user_role") == "admin":
-            flash("Admins cannot add or modify meals. View-only.", "error")
-        else:
-            from datetime import date as _d, timedelta
-            tomorrow = (_d.today() + timedelta(days=1)).strftime("%Y-%m-%d")
-            user_id = session.get("user_id")
-            date = request.form.get("date")
-            if date != tomorrow:
-                flash("You can only cancel for tomorrow.", "error")
-            else:
-                # Default: all meals are included (1), user can cancel (0)
-                b = 0 if request.form.get("breakfast") == "on" else 1
-                l = 0 if request.form.get("lunch") == "on" else 1
-                d = 0 if request.form.get("dinner") == "on" else 1
-                try:
-                    cur.execute(
-                        """
-                        INSERT INTO meals (user_id, date, breakfast, lunch, dinner)
-                        VALUES (%s, %s, %s, %s, %s)
-                        ON DUPLICATE KEY UPDATE breakfast=VALUES(breakfast), lunch=VALUES(lunch), dinner=VALUES(dinner)
-                        """,
-                        (user_id, date, b, l, d),
-                    )
-                    conn.commit()
-                    flash("Tomorrow's meal cancellations updated", "success")
-                except Exception as err:
-                    flash(f"Error saving meal cancellations: {err}", "error")
+    cur.execute("SELECT name FROM users WHERE id=%s", (user_id,))
+    user_row = cur.fetchone()
+    user_name = user_row["name"] if user_row else "Member"
 
-    # List meals for month
-    month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
+    meal_rate = meal_rates.get(cur, month)["meal_rate"]
 
-        month = _d.today().strftime("%Y-%m")
+    cur.execute(
+        """
+        SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as meals_count
+        FROM meals
+        WHERE user_id=%s AND date >= %s AND date < %s
+        """,
+        (user_id, first_day, next_month),
+    )
+    meals_count = int(cur.fetchone()["meals_count"] or 0)
 
-    # Admin sees all; member sees own
-    if session.get("user_role") == "admin":
-        cur.execute(
-            """
-            SELECT m.*, u.name as user_name
-            FROM meals m
-            JOIN users u ON u.id = m.user_id
-            WHERE DATE_FORMAT(m.date, '%%Y-%%m')=%s
-            ORDER BY m.date DESC, u.name ASC
-            """,
-            (month,),
-        )
-        all_users = None
-        cur.execute("SELECT id, name FROM users ORDER BY name")
-        all_users = cur.fetchall()
-    else:
-        cur.execute(
-            """
-            SELECT m.*, %s as user_name
-            FROM meals m
-            WHERE m.user_id=%s AND DATE_FORMAT(m.date, '%%Y-%%m')=%s
-            ORDER BY m.date DESC
-            """,
-            (session.get("user_name"), session.get("user_id"), month),
-        )
-        all_users = None
+    cur.execute(
+        "SELECT IFNULL(SUM(amount),0) as payments_sum FROM payments WHERE user_id=%s AND status='approved' AND date >= %s AND date < %s",
+        (user_id, first_day, next_month),
+    )
+    payments_sum = float(cur.fetchone()["payments_sum"] or 0)
+
+    # Itemized payments
+    cur.execute(
+        "SELECT date, amount, method, reference, status FROM payments WHERE user_id=%s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, first_day, next_month),
+    )
+    payments_rows = cur.fetchall()
 
+    # Itemized meals by day
+    cur.execute(
+        "SELECT date, breakfast, lunch, dinner FROM meals WHERE user_id=%s AND date >= %s AND date < %s ORDER BY date",
+        (user_id, first_day, next_month),
+    )
     meals_rows = cur.fetchall()
-    # Tomorrow string for template
-    from datetime import date as _d, timedelta
-    tomorrow = (_d.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+
     cur.close()
     conn.close()
+
+    cost = meals_count * meal_rate
+    due = cost - payments_sum
+
     return render_template(
-        "meals.html",
-        meals=meals_rows,
+        "bill.html",
         month=month,
-        all_users=all_users,
-        user_name=session.get("user_name"),
-        user_role=session.get("user_role"),
-        tomorrow=tomorrow,
+        user_name=user_name,
+        meals_count=meals_count,
+        payments_sum=payments_sum,
+        meal_rate=meal_rate,
+        cost=cost,
+        due=due,
+        payments_rows=payments_rows,
+        meals_rows=meals_rows,
     )
 
+# --------- Menu Management (Admin) ---------
+MENU_CSV_COLUMNS = ("breakfast", "lunch", "snacks", "dinner")
 
-# --------- Expenses (Admin) ---------
-@app.route("/expenses", methods=["GET", "POST"])
-def expenses():
-    if not require_login() or not require_admin():
-        return redirect(url_for("login"))
 
-    conn = get_connection()
-    cur = conn.cursor(DictCursor)
+def save_menus(cur, rows):
+    """Upsert (date, breakfast, lunch, snacks, dinner) rows as one multi-row statement; caller commits"""
+    cur.executemany(
+        """
+        INSERT INTO menu (date, breakfast_menu, lunch_menu, snacks_menu, dinner_menu)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE breakfast_menu=VALUES(breakfast_menu), lunch_menu=VALUES(lunch_menu),
+            snacks_menu=VALUES(snacks_menu), dinner_menu=VALUES(dinner_menu)
+        """,
+        rows,
+    )
+    bump_data_version(cur, "menu", *{str(row[0])[:7] for row in rows})
 
-    if request.method == "POST":
-        date = request.form.get("date")
-        amount = request.form.get("amount")
-        category = request.form.get("category")
-        notes = request.form.get("notes")
+
+def parse_menu_csv(stream):
+    """Read a menu CSV with a date column (YYYY-MM-DD) and breakfast/lunch/snacks/dinner columns.
+
+    Column names may also carry the _menu suffix. Returns (rows, errors);
+    a later row for the same date replaces an earlier one.
+    """
+    reader = csv.DictReader(stream)
+    fields = {(name or "").strip().lower(): name for name in (reader.fieldnames or [])}
+    if "date" not in fields:
+        return [], ["missing 'date' column"]
+    columns = [fields.get(meal) or fields.get(f"{meal}_menu") for meal in MENU_CSV_COLUMNS]
+    by_date, errors = {}, []
+    for line_no, record in enumerate(reader, start=2):
+        raw_date = (record.get(fields["date"]) or "").strip()
+        if not raw_date:
+            continue
         try:
-            cur.execute(
-                "INSERT INTO expenses (date, amount, category, notes, created_by) VALUES (%s, %s, %s, %s, %s)",
-                (date, amount, category, notes, session.get("user_id")),
-            )
-            conn.commit()
-            flash("Expense added", "success")
-        except Exception as err:
-            flash(f"Error adding expense: {err}", "error")
+            day = datetime.strptime(raw_date, "%Y-%m-%d").date()
+        except ValueError:
+            errors.append(f"line {line_no}: invalid date '{raw_date}'")
+            continue
+        by_date[day] = (day,) + tuple(((record.get(col) or "").strip() or None) if col else None for col in columns)
+    return list(by_date.values()), errors
+
+
+WEEKDAYS = ("Sunday", "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday")
+WEEKLY_MENU_COLUMNS = ("breakfast_menu", "lunch_menu", "snacks_menu", "dinner_menu")
+
+
+class WeeklyMenuCache:
+    """The weekly menu merged with fees and the meal timings, built once per version.
+
+    The version is the shared ('weekly_menu', '') data_versions counter, so an
+    edit saved through any worker is picked up by all of them on their next
+    request at the cost of one primary-key lookup.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
 
-    month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
+    def get(self, cur):
+        cur.execute("SELECT version FROM data_versions WHERE entity='weekly_menu' AND month=''")
+        row = cur.fetchone()
+        version = row["version"] if row else 0
+        with self._lock:
+            if self._value is not None and self._version == version:
+                return self._value
+        value = self._build(cur)
+        if getattr(cur, "from_replica", False):
+            return value
+        with self._lock:
+            self._version, self._value = version, value
+        return value
 
-        month = _d.today().strftime("%Y-%m")
+    @staticmethod
+    def _build(cur):
+        cur.execute("SELECT * FROM weekly_menu")
+        weekly_menu = {row["weekday"]: {col: row[col] for col in WEEKLY_MENU_COLUMNS} for row in cur.fetchall()}
+        cur.execute("SELECT * FROM weekly_fees")
+        for fee in cur.fetchall():
+            if fee["weekday"] in weekly_menu:
+                for meal in MEAL_TYPES:
+                    weekly_menu[fee["weekday"]][f"{meal}_price"] = f"₹{fee[f'{meal}_fee']:.2f}"
+        cur.execute("SELECT name, label, timing FROM meal_timings ORDER BY sort_order, name")
+        timing_rows = cur.fetchall()
+        return {
+            "weekly_menu": weekly_menu,
+            "timings": {row["name"]: row["timing"] for row in timing_rows},
+            "timing_rows": timing_rows,
+        }
 
-    cur.execute(
-        "SELECT * FROM expenses WHERE DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date DESC",
-        (month,),
+    def invalidate(self):
+        with self._lock:
+            self._version = self._value = None
+
+
+weekly_menus = WeeklyMenuCache()
+
+
+def save_weekly_template(cur, form):
+    """Store the weekly menu and timings posted from the admin form; caller commits"""
+    cur.executemany(
+        """
+        INSERT INTO weekly_menu (weekday, breakfast_menu, lunch_menu, snacks_menu, dinner_menu)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE breakfast_menu=VALUES(breakfast_menu), lunch_menu=VALUES(lunch_menu),
+            snacks_menu=VALUES(snacks_menu), dinner_menu=VALUES(dinner_menu)
+        """,
+        [
+            (day,) + tuple((form.get(f"{day}_{col}") or "").strip() or None for col in WEEKLY_MENU_COLUMNS)
+            for day in WEEKDAYS
+        ],
     )
-    rows = cur.fetchall()
-    cur.execute(
-        "SELECT IFNULL(SUM(amount),0) as total FROM expenses WHERE DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (month,),
+    cur.execute("SELECT name FROM meal_timings")
+    names = [row["name"] for row in cur.fetchall()]
+    cur.executemany(
+        "UPDATE meal_timings SET timing=%s WHERE name=%s",
+        [((form.get(f"timing_{name}") or "").strip() or None, name) for name in names],
     )
-    total = cur.fetchone()["total"]
-    cur.close()
-    conn.close()
-    return render_template("expenses.html", expenses=rows, month=month, total=total, user_name=session.get("user_name"), user_role=session.get("user_role"))
+    bump_data_version(cur, "weekly_menu")
 
 
-# --------- Payments ---------
-@app.route("/payments", methods=["GET", "POST"])
-def payments():
+@app.route("/menu", methods=["GET", "POST"])
+def menu():
+    # Menu should be visible to all logged-in users
     if not require_login():
         return redirect(url_for("login"))
 
-    conn = get_connection()
+    conn = get_connection(readonly=request.method == "GET")
     cur = conn.cursor(DictCursor)
 
-    if request.method == "POST":
+    if request.method == "POST" and session.get("user_role") != "admin":
+        flash("Only admins can change the menu", "error")
+    elif request.method == "POST":
         form_type = request.form.get("form_type")
-        if form_type == "create":
-            # Members submit payments; status is pending by default
-            user_id = session.get("user_id")
-            date = request.form.get("date")
-            amount = request.form.get("amount")
-            method = request.form.get("method")
-            reference = request.form.get("reference")
+        if form_type == "weekly":
+            week_start = request.form.get("week_start")
+            bm = request.form.get("breakfast_menu")
+            lm = request.form.get("lunch_menu")
+            sm = request.form.get("snacks_menu")
+            dm = request.form.get("dinner_menu")
             try:
-                cur.execute(
-                    "INSERT INTO payments (user_id, date, amount, method, reference, status) VALUES (%s, %s, %s, %s, %s, 'pending')",
-                    (user_id, date, amount, method, reference),
-                )
+                start_dt = datetime.strptime(week_start, "%Y-%m-%d").date()
+                save_menus(cur, [(start_dt + timedelta(days=i), bm, lm, sm, dm) for i in range(7)])
                 conn.commit()
-                flash("Payment submitted successfully. Waiting for admin approval.", "success")
+                flash("Weekly menu saved", "success")
             except Exception as err:
-                flash(f"Error submitting payment: {err}", "error")
-        elif form_type == "approve" and session.get("user_role") == "admin":
-            payment_id = request.form.get("payment_id")
-            action = request.form.get("action")  # approve or reject
-            if payment_id and action in ("approve", "reject"):
+                conn.rollback()
+                flash(f"Error saving weekly menu: {err}", "error")
+        elif form_type == "template":
+            try:
+                save_weekly_template(cur, request.form)
+                conn.commit()
+                weekly_menus.invalidate()
+                flash("Weekly menu and timings saved", "success")
+            except Exception as err:
+                conn.rollback()
+                flash(f"Error saving weekly menu: {err}", "error")
+        elif form_type == "import":
+            upload = request.files.get("menu_file")
+            if not upload or not upload.filename:
+                flash("Choose a CSV file to import", "error")
+            else:
                 try:
-                    status = "approved" if action == "approve" else "rejected"
-                    cur.execute(
-                        "UPDATE payments SET status=%s, approved_by=%s, approved_at=CURRENT_TIMESTAMP WHERE id=%s",
-                        (status, session.get("user_id"), payment_id)
-                    )
-                    conn.commit()
-                    flash(f"Payment {action}d successfully", "success")
-                except Exception as err:
-                    flash(f"Error updating payment: {err}", "error")
+                    rows, errors = parse_menu_csv(io.TextIOWrapper(upload.stream, encoding="utf-8-sig"))
+                except (UnicodeDecodeError, csv.Error) as err:
+                    rows, errors = [], [f"could not read the CSV file; save it as UTF-8 CSV and try again ({err})"]
+                if errors:
+                    flash("Menu import rejected: " + "; ".join(errors[:10]), "error")
+                elif not rows:
+                    flash("The uploaded file has no menu rows", "error")
+                else:
+                    try:
+                        save_menus(cur, rows)
+                        conn.commit()
+                        flash(f"Imported menus for {len(rows)} days", "success")
+                    except Exception as err:
+                        conn.rollback()
+                        flash(f"Error importing menus: {err}", "error")
+        else:
+            date = request.form.get("date")
+            bm = request.form.get("breakfast_menu")
+            lm = request.form.get("lunch_menu")
+            sm = request.form.get("snacks_menu")
+            dm = request.form.get("dinner_menu")
+            save_menus(cur, [(date, bm, lm, sm, dm)])
+            conn.commit()
+            flash("Menu saved", "success")
 
     month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
-        month = _d.today().strftime("%Y-%m")
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
 
-    if session.get("user_role") == "admin":
-        cur.execute(
-            """
-            SELECT p.*, u.name as user_name
-            FROM payments p
-            JOIN users u ON u.id = p.user_id
-            WHERE DATE_FORMAT(p.date, '%%Y-%%m')=%s
-            ORDER BY p.date DESC
-            """,
-            (month,),
-        )
-        payments_rows = cur.fetchall()
-        all_users = None
-    else:
-        cur.execute(
-            """
-            SELECT p.*, %s as user_name
-            FROM payments p
-            WHERE p.user_id=%s AND DATE_FORMAT(p.date, '%%Y-%%m')=%s
-            ORDER BY p.date DESC
-            """,
-            (session.get("user_name"), session.get("user_id"), month),
-        )
-        payments_rows = cur.fetchall()
-        all_users = None
+    freshness = data_freshness(cur, [("menu", month), ("weekly_menu", "")])
+    if freshness and freshness.matches():
+        cur.close()
+        conn.close()
+        return freshness.not_modified()
 
+    cur.execute(
+        "SELECT * FROM menu WHERE date >= %s AND date < %s ORDER BY date DESC",
+        (first_day, next_month),
+    )
+    rows = cur.fetchall()
+    
+    template = weekly_menus.get(cur)
+    
+    # Get today's date for default values
+    from datetime import date
+    today = date.today().strftime("%Y-%m-%d")
+    
     cur.close()
     conn.close()
-    return render_template(
-        "payments.html",
-        payments=payments_rows,
-        month=month,
-        all_users=all_users,
-        user_name=session.get("user_name"),
-        user_role=session.get("user_role"),
-    )
+    return conditional_response(freshness, render_template("menu.html", month=month, menu_rows=rows, weekly_menu=template["weekly_menu"], timings=template["timings"], timing_rows=template["timing_rows"], today=today, user_name=session.get("user_name"), user_role=session.get("user_role")))
 
 
-# --------- Monthly Billing ---------
-@app.route("/monthly_bill")
-def monthly_bill():
-    if not require_login():
-        return redirect(url_for("login"))
+# --------- Member Ledger ---------
+def _money(value):
+    return Decimal(str(value or 0)).quantize(Decimal("0.01"))
 
-    month = request.args.get("month")
-    user_id = request.args.get("user_id") or session.get("user_id")
 
-    # Members can only see their own bill
-    if session.get("user_role") != "admin" and str(user_id) != str(session.get("user_id")):
-        flash("Not allowed", "error")
-        return redirect(url_for("dashboard"))
+def post_ledger_entries(cur, kind, entries):
+    """Bring the ledger in line with the given charges or credits, updating running balances.
 
-    if not month:
-        from datetime import date as _d
-        month = _d.today().strftime("%Y-%m")
+    entries are (user_id, month, ref_id, entry_date, amount) tuples, where
+    amount is what the ledger should hold in total for that user, kind,
+    month and ref_id (charges positive, credits negative). Only the
+    difference from what is already posted is appended, so re-posting is
+    idempotent and a reversal is a target of 0. Locks the members' balance
+    rows and bumps their ledger data versions; entries for closed months
+    also flag the bills that carry them forward. Needs a DictCursor and the
+    caller commits. Returns entries written.
+    """
+    if not entries:
+        return 0
+    user_ids = sorted({int(e[0]) for e in entries})
+    months = sorted({e[1] for e in entries})
+    user_marks = ", ".join(["%s"] * len(user_ids))
+    cur.executemany("INSERT IGNORE INTO member_balances (user_id) VALUES (%s)", [(uid,) for uid in user_ids])
+    cur.execute(
+        f"SELECT user_id, balance FROM member_balances WHERE user_id IN ({user_marks}) ORDER BY user_id FOR UPDATE",
+        user_ids,
+    )
+    balances = {row["user_id"]: _money(row["balance"]) for row in cur.fetchall()}
+    cur.execute(
+        f"""
+        SELECT user_id, month, ref_id, SUM(amount) as posted
+        FROM member_ledger
+        WHERE kind = %s AND user_id IN ({user_marks}) AND month IN ({', '.join(['%s'] * len(months))})
+        GROUP BY user_id, month, ref_id
+        """,
+        [kind] + user_ids + months,
+    )
+    posted = {(row["user_id"], row["month"], row["ref_id"]): _money(row["posted"]) for row in cur.fetchall()}
 
-    conn = get_connection()
-    cur = conn.cursor(DictCursor)
+    rows, touched = [], set()
+    for user_id, month, ref_id, entry_date, amount in entries:
+        user_id, ref_id = int(user_id), int(ref_id or 0)
+        delta = _money(amount) - posted.get((user_id, month, ref_id), Decimal("0.00"))
+        if not delta:
+            continue
+        posted[(user_id, month, ref_id)] = _money(amount)
+        balances[user_id] += delta
+        touched.add(user_id)
+        rows.append((user_id, entry_date, month, kind, ref_id, delta, balances[user_id]))
+    if not rows:
+        return 0
+    cur.executemany(
+        """
+        INSERT INTO member_ledger (user_id, entry_date, month, kind, ref_id, amount, balance)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """,
+        rows,
+    )
+    cur.executemany(
+        "INSERT INTO member_balances (user_id, balance) VALUES (%s, %s) ON DUPLICATE KEY UPDATE balance=VALUES(balance)",
+        [(uid, balances[uid]) for uid in sorted(touched)],
+    )
+    bump_ledger_versions(cur, touched)
+    last_closed = last_closed_month(cur)
+    if last_closed and months[0] <= last_closed:
+        mark_later_bills_stale(cur, months[0])
+    return len(rows)
 
-    # Get user details including mess start date
-    cur.execute("SELECT name FROM users WHERE id=%s", (user_id,))
-    user_row = cur.fetchone()
-    if not user_row:
-        flash("User not found", "error")
-        return redirect(url_for("dashboard"))
-    
-    user_name = user_row["name"]
-    
-    # Check if mess_start_date column exists
-    cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-    if cur.fetchone():
-        cur.execute("SELECT mess_start_date FROM users WHERE id=%s", (user_id,))
-        mess_start_date = cur.fetchone()["mess_start_date"] or month_start
-    else:
-        mess_start_date = month_start  # Default to month start if column doesn't exist
 
-    # Calculate month start and end dates
-    from datetime import datetime, timedelta
-    month_start = datetime.strptime(month, "%Y-%m").date()
-    month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-    
-    # Adjust start date if mess started mid-month
-    actual_start = max(month_start, mess_start_date)
-    
-    # Get total expenses for the month
+def post_payments_to_ledger(cur, payment_ids):
+    """Credit approved payments (and reverse ones no longer approved) on the ledger"""
+    payment_ids = [int(pid) for pid in payment_ids]
+    if not payment_ids:
+        return 0
     cur.execute(
-        "SELECT IFNULL(SUM(amount),0) as total_expenses FROM expenses WHERE DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (month,),
+        f"SELECT id, user_id, date, amount, status FROM payments WHERE id IN ({', '.join(['%s'] * len(payment_ids))})",
+        payment_ids,
     )
-    total_expenses = float(cur.fetchone()["total_expenses"] or 0)
+    return post_ledger_entries(cur, "payment", [
+        (row["user_id"], row["date"].strftime("%Y-%m"), row["id"], row["date"],
+         -_money(row["amount"]) if row["status"] == "approved" else 0)
+        for row in cur.fetchall()
+    ])
+
+
+def last_closed_month(cur):
+    cur.execute("SELECT MAX(month) as month FROM ledger_periods")
+    row = cur.fetchone()
+    return row["month"] if row else None
+
 
-    # Get total meals for the month (excluding cancelled meals)
+def write_statements(cur, month, user_ids):
+    """Write month's statement for each of user_ids with a balance row, covering everything
+    posted since their previous close; returns the number written.
+
+    Only these members' balance rows are locked. post_ledger_entries takes
+    the same locks before appending, so no entry for them can commit below
+    the ids a statement covers; the sums are locking reads so they see
+    every committed entry.
+    """
+    user_ids = sorted({int(uid) for uid in user_ids})
+    if not user_ids:
+        return 0
+    user_marks = ", ".join(["%s"] * len(user_ids))
     cur.execute(
-        """
-        SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals 
-        FROM meals 
-        WHERE DATE_FORMAT(date, '%%Y-%%m')=%s
+        f"""
+        SELECT user_id, balance, closed_balance, closed_entry_id
+        FROM member_balances WHERE user_id IN ({user_marks}) ORDER BY user_id FOR UPDATE
         """,
-        (month,),
+        user_ids,
     )
-    total_meals = int(cur.fetchone()["total_meals"] or 0)
-    
-    # Calculate meal rate
-    meal_rate = (total_expenses / total_meals) if total_meals > 0 else 0.0
-
-    # Get user's meals for the month (including cancelled meals)
+    statements = cur.fetchall()
+    if not statements:
+        return 0
     cur.execute(
+        f"""
+        SELECT l.user_id,
+               IFNULL(SUM(CASE WHEN l.amount > 0 THEN l.amount ELSE 0 END), 0) as charges,
+               IFNULL(SUM(CASE WHEN l.amount < 0 THEN -l.amount ELSE 0 END), 0) as credits,
+               MAX(l.id) as last_entry_id
+        FROM member_balances b
+        JOIN member_ledger l ON l.user_id = b.user_id AND l.id > b.closed_entry_id
+        WHERE b.user_id IN ({user_marks})
+        GROUP BY l.user_id
+        FOR UPDATE
+        """,
+        user_ids,
+    )
+    posted = {row["user_id"]: row for row in cur.fetchall()}
+    for s in statements:
+        totals = posted.get(s["user_id"]) or {}
+        s["charges"] = totals.get("charges") or 0
+        s["credits"] = totals.get("credits") or 0
+        s["last_entry_id"] = totals.get("last_entry_id") or s["closed_entry_id"]
+    cur.executemany(
         """
-        SELECT 
-            IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals,
-            IFNULL(SUM(CASE WHEN breakfast=0 THEN 1 ELSE 0 END + 
-                       CASE WHEN lunch=0 THEN 1 ELSE 0 END + 
-                       CASE WHEN dinner=0 THEN 1 ELSE 0 END), 0) as cancelled_meals
-        FROM meals
-        WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s
+        INSERT INTO member_statements (user_id, month, opening_balance, charges, credits, closing_balance, last_entry_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
         """,
-        (user_id, month),
+        [(s["user_id"], month, s["closed_balance"], s["charges"], s["credits"], s["balance"], s["last_entry_id"])
+         for s in statements],
     )
-    user_meals = cur.fetchone()
-    total_user_meals = int(user_meals["total_meals"] or 0)
-    cancelled_meals = int(user_meals["cancelled_meals"] or 0)
-    
-    # Calculate billable meals - if no meals recorded, assume all days in month are billable
-    if total_user_meals == 0 and cancelled_meals == 0:
-        # Calculate days from mess start date to end of month
-        days_in_month = (month_end - actual_start).days + 1
-        billable_meals = days_in_month * 3  # 3 meals per day
-    else:
-        billable_meals = total_user_meals + cancelled_meals
+    cur.executemany(
+        """
+        INSERT INTO member_balances (user_id, closed_balance, closed_entry_id) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE closed_balance=VALUES(closed_balance), closed_entry_id=VALUES(closed_entry_id)
+        """,
+        [(s["user_id"], s["balance"], s["last_entry_id"]) for s in statements],
+    )
+    return len(statements)
 
-    # Calculate bill amount
-    bill_amount = billable_meals * meal_rate
 
-    # Get approved payments for the month
+def charge_month_bills(cur, month, user_ids):
+    """Post the given members' saved bills for month to the ledger and write their statements"""
+    user_ids = [int(uid) for uid in user_ids]
+    if not user_ids:
+        return 0
+    _, next_month = month_range(month)
     cur.execute(
-        "SELECT IFNULL(SUM(amount),0) as payments_sum FROM payments WHERE user_id=%s AND status='approved' AND DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (user_id, month),
+        f"SELECT user_id, total_amount FROM monthly_bills WHERE month=%s AND user_id IN ({', '.join(['%s'] * len(user_ids))})",
+        [month] + user_ids,
     )
-    payments_sum = float(cur.fetchone()["payments_sum"] or 0)
+    post_ledger_entries(cur, "bill", [
+        (row["user_id"], month, 0, next_month - timedelta(days=1), row["total_amount"]) for row in cur.fetchall()
+    ])
+    return write_statements(cur, month, user_ids)
+
 
-    # Calculate due amount
-    due_amount = bill_amount - payments_sum
+def check_month_closable(cur, month):
+    last = last_closed_month(cur)
+    if last and month <= last:
+        raise ValueError(f"{month} is not after the last closed month ({last})")
 
-    # Update or create monthly bill record
+
+def unbilled_balance_ids(cur):
+    """Ledger accounts that are not billed members (admins, former members)"""
     cur.execute(
-        """
-        INSERT INTO monthly_bills (user_id, month, total_meals, cancelled_meals, billable_meals, 
-                                 meal_rate, total_amount, paid_amount, due_amount, status)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON DUPLICATE KEY UPDATE 
-            total_meals=VALUES(total_meals), cancelled_meals=VALUES(cancelled_meals),
-            billable_meals=VALUES(billable_meals), meal_rate=VALUES(meal_rate),
-            total_amount=VALUES(total_amount), paid_amount=VALUES(paid_amount),
-            due_amount=VALUES(due_amount), status=VALUES(status)
-        """,
-        (user_id, month, total_user_meals, cancelled_meals, billable_meals, 
-         meal_rate, bill_amount, payments_sum, due_amount, 
-         "paid" if due_amount <= 0 else "pending")
+        "SELECT b.user_id FROM member_balances b LEFT JOIN users u ON u.id = b.user_id WHERE u.id IS NULL OR u.role <> 'member'"
     )
-    conn.commit()
+    return [row["user_id"] for row in cur.fetchall()]
 
-    # Itemized payments
+
+def finish_close(cur, month, closed_by=None):
+    """Record month as closed once every statement is written; the caller commits"""
+    cur.execute("INSERT INTO ledger_periods (month, closed_by) VALUES (%s, %s)", (month, closed_by))
+    bump_data_version(cur, "ledger")
+    mark_later_bills_stale(cur, month)
+
+
+def close_month(cur, month, closed_by=None):
+    """Charge month's final bills to the ledger and write every member's statement in one transaction.
+
+    Months close in order. A statement covers everything posted since the
+    member's previous close, so payments approved late land on the next
+    statement instead of rewriting a closed one. Used by the CLI; the
+    close_month job does the same in chunks. Needs a DictCursor; the
+    caller commits. Returns the number of statements written.
+    """
+    check_month_closable(cur, month)
+    refresh_month_bills(cur, month)
+    cur.execute("SELECT id FROM users WHERE role='member'")
+    count = charge_month_bills(cur, month, [row["id"] for row in cur.fetchall()])
+    count += write_statements(cur, month, unbilled_balance_ids(cur))
+    finish_close(cur, month, closed_by)
+    return count
+
+
+def read_member_balance(cur, user_id, month):
+    """Balance brought forward into month (last statement before it), the month's own
+    statement if it is closed, and the member's current ledger balance"""
     cur.execute(
-        "SELECT date, amount, method, reference, status FROM payments WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date",
+        "SELECT closing_balance FROM member_statements WHERE user_id=%s AND month < %s ORDER BY month DESC LIMIT 1",
         (user_id, month),
     )
-    payments_rows = cur.fetchall()
+    previous = cur.fetchone()
+    cur.execute("SELECT * FROM member_statements WHERE user_id=%s AND month=%s", (user_id, month))
+    statement = cur.fetchone()
+    cur.execute("SELECT balance FROM member_balances WHERE user_id=%s", (user_id,))
+    current = cur.fetchone()
+    return {
+        "brought_forward": float(previous["closing_balance"]) if previous else 0.0,
+        "statement": statement,
+        "balance": float(current["balance"]) if current else 0.0,
+    }
+
+
+@app.cli.command("close-month")
+@click.option("--month", required=True, help="YYYY-MM month to close.")
+def close_month_command(month):
+    """Post a month's bills to the member ledger and write statements."""
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    count = close_month(cur, resolve_month(month))
+    conn.commit()
+    cur.close()
+    conn.close()
+    print(f"Closed {month}: {count} statements")
+
+
+@app.cli.command("backfill-ledger")
+@click.option("--through", required=True, help="Close every month up to this YYYY-MM.")
+def backfill_ledger_command(through):
+    """Build ledger history for existing data: post approved payments and close months in order."""
+    through = resolve_month(through)
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    cur.execute("SELECT LEAST(IFNULL((SELECT MIN(date) FROM meals), CURDATE()), IFNULL((SELECT MIN(date) FROM payments), CURDATE())) as first_day")
+    month = _as_date(cur.fetchone()["first_day"]).strftime("%Y-%m")
+    last = last_closed_month(cur)
+    while month <= through:
+        first_day, next_month = month_range(month)
+        if not last or month > last:
+            cur.execute(
+                "SELECT id FROM payments WHERE status='approved' AND date >= %s AND date < %s",
+                (first_day, next_month),
+            )
+            post_payments_to_ledger(cur, [row["id"] for row in cur.fetchall()])
+            count = close_month(cur, month)
+            conn.commit()
+            print(f"Closed {month}: {count} statements")
+        month = next_month.strftime("%Y-%m")
+    # Approved payments dated after the backfilled months still belong on the ledger
+    cur.execute("SELECT id FROM payments WHERE status='approved' AND date >= %s", (month_range(through)[1],))
+    post_payments_to_ledger(cur, [row["id"] for row in cur.fetchall()])
+    conn.commit()
+    cur.close()
+    conn.close()
+
+
+# --------- Background Jobs ---------
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", "30"))
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER", "300"))
+BILL_JOB_CHUNK_SIZE = int(os.getenv("BILL_JOB_CHUNK_SIZE", "200"))
+
+
+def enqueue_job(cur, kind, month=None, created_by=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Queue a job unless the same kind/month is already queued or running.
+
+    Returns (job_id, created). Needs a DictCursor; the caller commits.
+    """
+    active_key = f"{kind}:{month or ''}"
+    try:
+        cur.execute(
+            "INSERT INTO jobs (kind, month, active_key, max_attempts, created_by) VALUES (%s, %s, %s, %s, %s)",
+            (kind, month, active_key, max_attempts, created_by),
+        )
+        return cur.lastrowid, True
+    except pymysql.err.IntegrityError:
+        cur.execute("SELECT id FROM jobs WHERE active_key=%s", (active_key,))
+        row = cur.fetchone()
+        return (row["id"] if row else None), False
+
+
+def claim_job(conn):
+    """Atomically take the oldest runnable job for this process; returns its row or None"""
+    cur = conn.cursor(DictCursor)
+    try:
+        # Jobs whose worker stopped heartbeating (crash, restart, deploy) go back in the queue
+        cur.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                active_key = CASE WHEN attempts >= max_attempts THEN NULL ELSE active_key END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN NOW() ELSE NULL END,
+                last_error = 'worker stopped responding', locked_by = NULL
+            WHERE status = 'running' AND heartbeat_at < NOW() - INTERVAL %s SECOND
+            """,
+            (JOB_STALE_AFTER,),
+        )
+        cur.execute("SELECT id FROM jobs WHERE status='queued' AND run_after <= NOW() ORDER BY id LIMIT 5")
+        worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        for row in cur.fetchall():
+            cur.execute(
+                """
+                UPDATE jobs SET status='running', locked_by=%s, attempts=attempts+1,
+                    heartbeat_at=NOW(), started_at=IFNULL(started_at, NOW())
+                WHERE id=%s AND status='queued'
+                """,
+                (worker_id, row["id"]),
+            )
+            if cur.rowcount == 1:
+                cur.execute("SELECT * FROM jobs WHERE id=%s", (row["id"],))
+                job = cur.fetchone()
+                conn.commit()
+                return job
+        conn.commit()
+        return None
+    finally:
+        cur.close()
+
+
+def run_job(job):
+    """Run a claimed job, then mark it done, or re-queue it with backoff until max_attempts"""
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    try:
+        handler = JOB_HANDLERS.get(job["kind"])
+        if handler is None:
+            raise ValueError(f"unknown job kind '{job['kind']}'")
+        handler(conn, cur, job)
+        cur.execute(
+            "UPDATE jobs SET status='done', active_key=NULL, locked_by=NULL, last_error=NULL, finished_at=NOW() WHERE id=%s",
+            (job["id"],),
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Job {job['id']} ({job['kind']} {job['month'] or ''}) failed: {e}")
+        cur.execute(
+            """
+            UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                active_key = CASE WHEN attempts >= max_attempts THEN NULL ELSE active_key END,
+                finished_at = CASE WHEN attempts >= max_attempts THEN NOW() ELSE NULL END,
+                run_after = NOW() + INTERVAL (attempts * %s) SECOND,
+                last_error = %s, locked_by = NULL
+            WHERE id=%s
+            """,
+            (JOB_RETRY_DELAY, str(e)[:1000], job["id"]),
+        )
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
+
+
+def run_next_job():
+    """Claim and run one job; returns its id, or None when nothing is runnable"""
+    conn = get_connection()
+    try:
+        job = claim_job(conn)
+    finally:
+        conn.close()
+    if not job:
+        return None
+    run_job(job)
+    return job["id"]
+
+
+def run_member_chunks(conn, cur, job, process):
+    """Call process(user_ids) for the members after the job's cursor, BILL_JOB_CHUNK_SIZE at a time.
+
+    Each chunk commits with the job's progress (processed count and the
+    last user id), so a retry resumes where the failed attempt stopped.
+    """
+    cursor_id, processed = job["cursor_id"], job["processed"]
+    cur.execute("SELECT COUNT(*) as total FROM users WHERE role='member'")
+    total = int(cur.fetchone()["total"] or 0)
+    cur.execute("UPDATE jobs SET total=%s, heartbeat_at=NOW() WHERE id=%s", (total, job["id"]))
+    conn.commit()
+    while True:
+        cur.execute(
+            "SELECT id FROM users WHERE role='member' AND id > %s ORDER BY id LIMIT %s",
+            (cursor_id, BILL_JOB_CHUNK_SIZE),
+        )
+        user_ids = [row["id"] for row in cur.fetchall()]
+        if not user_ids:
+            break
+        process(user_ids)
+        cursor_id, processed = user_ids[-1], processed + len(user_ids)
+        cur.execute(
+            "UPDATE jobs SET processed=%s, cursor_id=%s, heartbeat_at=NOW() WHERE id=%s",
+            (processed, cursor_id, job["id"]),
+        )
+        conn.commit()
+
+
+def generate_bills_job(conn, cur, job):
+    """Recompute every member's bill for job['month'], committing after each chunk"""
+    month = job["month"]
+    if job["cursor_id"] == 0:
+        # Claim the month before reading it: every write from here on flags it again for another run
+        cur.execute("DELETE FROM stale_bill_months WHERE month=%s", (month,))
+    meal_rates.invalidate(month)
 
-    # Itemized meals by day
-    cur.execute(
-        "SELECT date, breakfast, lunch, dinner FROM meals WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date",
-        (user_id, month),
-    )
-    meals_rows = cur.fetchall()
+    try:
+        run_member_chunks(conn, cur, job, lambda user_ids: save_monthly_bills(cur, compute_monthly_bills(cur, month, user_ids)))
+    except Exception:
+        # Earlier chunks may predate writes a resumed attempt won't see; leave the month flagged
+        conn.rollback()
+        mark_bills_stale(cur, month)
+        conn.commit()
+        raise
 
-    cur.close()
-    conn.close()
 
-    return render_template(
-        "monthly_bill.html",
-        month=month,
-        user_name=user_name,
-        mess_start_date=mess_start_date,
-        total_meals=total_user_meals,
-        cancelled_meals=cancelled_meals,
-        billable_meals=billable_meals,
-        payments_sum=payments_sum,
-        meal_rate=meal_rate,
-        bill_amount=bill_amount,
-        due_amount=due_amount,
-        payments_rows=payments_rows,
-        meals_rows=meals_rows,
-        user_role=session.get("user_role"),
-    )
+def close_month_job(conn, cur, job):
+    """Close job['month'] in chunks: each commits a chunk of members' final bills, ledger
+    charges and statements; the month is recorded as closed after the last one"""
+    month = job["month"]
+    check_month_closable(cur, month)
+    if job["cursor_id"] == 0:
+        cur.execute("DELETE FROM stale_bill_months WHERE month=%s", (month,))
+    meal_rates.invalidate(month)
 
-# --------- Bill (per user, printable) ---------
-@app.route("/bill")
-def bill():
-    if not require_login():
-        return redirect(url_for("login"))
+    def close_chunk(user_ids):
+        save_monthly_bills(cur, compute_monthly_bills(cur, month, user_ids))
+        charge_month_bills(cur, month, user_ids)
 
-    month = request.args.get("month")
-    user_id = request.args.get("user_id") or session.get("user_id")
+    try:
+        run_member_chunks(conn, cur, job, close_chunk)
+    except Exception:
+        # As in generate_bills_job: committed chunks may miss writes made since
+        conn.rollback()
+        mark_bills_stale(cur, month)
+        conn.commit()
+        raise
+    write_statements(cur, month, unbilled_balance_ids(cur))
+    finish_close(cur, month, job["created_by"])
+
+
+def refresh_headcount_job(conn, cur, job):
+    refresh_headcount_window(cur)
 
-    # Members can only see their own bill
-    if session.get("user_role") != "admin" and str(user_id) != str(session.get("user_id")):
-        flash("Not allowed", "error")
-        return redirect(url_for("reports"))
 
-    if not month:
-        from datetime import date as _d
+JOB_HANDLERS = {
+    "generate_bills": generate_bills_job,
+    "close_month": close_month_job,
+    "refresh_headcount": refresh_headcount_job,
+}
+JOB_LABELS = {
+    "generate_bills": "Generating bills",
+    "close_month": "Closing month",
+    "refresh_headcount": "Refreshing headcounts",
+}
 
-        month = _d.today().strftime("%Y-%m")
 
+def queue_daily_jobs():
+    """Queue today's headcount refresh, which extends the window as the horizon moves, unless it already was"""
     conn = get_connection()
     cur = conn.cursor(DictCursor)
+    try:
+        cur.execute("SELECT 1 FROM jobs WHERE kind='refresh_headcount' AND created_at >= CURDATE() LIMIT 1")
+        if cur.fetchone() is None:
+            enqueue_job(cur, "refresh_headcount")
+        conn.commit()
+    finally:
+        cur.close()
+        conn.close()
 
-    cur.execute("SELECT name FROM users WHERE id=%s", (user_id,))
-    user_row = cur.fetchone()
-    user_name = user_row["name"] if user_row else "Member"
 
-    cur.execute(
-        "SELECT IFNULL(SUM(amount),0) as total_expenses FROM expenses WHERE DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (month,),
-    )
-    total_expenses = float(cur.fetchone()["total_expenses"] or 0)
+class JobWorker:
+    """Daemon thread that runs queued jobs in this process.
 
-    cur.execute(
-        "SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals FROM meals WHERE DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (month,),
-    )
-    total_meals = int(cur.fetchone()["total_meals"] or 0)
-    meal_rate = (total_expenses / total_meals) if total_meals > 0 else 0.0
+    Claims are conditional UPDATEs, so any number of workers (threads in
+    several gunicorn processes, or `flask run-jobs`) can share the table.
+    Once a day each worker also queues the daily jobs (queue_daily_jobs).
+    """
 
-    cur.execute(
-        """
-        SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as meals_count
-        FROM meals
-        WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s
-        """,
-        (user_id, month),
-    )
-    meals_count = int(cur.fetchone()["meals_count"] or 0)
+    def __init__(self, interval=JOB_POLL_INTERVAL):
+        self.interval = interval
+        self._pid = None
+        self._lock = threading.Lock()
+        self._daily_queued_on = None
 
-    cur.execute(
-        "SELECT IFNULL(SUM(amount),0) as payments_sum FROM payments WHERE user_id=%s AND status='approved' AND DATE_FORMAT(date, '%%Y-%%m')=%s",
-        (user_id, month),
-    )
-    payments_sum = float(cur.fetchone()["payments_sum"] or 0)
+    def ensure_started(self):
+        if self.interval <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="job-worker", daemon=True).start()
 
-    # Itemized payments
-    cur.execute(
-        "SELECT date, amount, method, reference, status FROM payments WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date",
-        (user_id, month),
-    )
-    payments_rows = cur.fetchall()
+    def _run(self):
+        while True:
+            try:
+                if self._daily_queued_on != date_type.today():
+                    queue_daily_jobs()
+                    self._daily_queued_on = date_type.today()
+                if run_next_job() is not None:
+                    continue
+            except Exception as e:
+                print(f"Job worker error: {e}")
+            time.sleep(self.interval)
+
+
+job_worker = JobWorker()
+
+
+@app.before_request
+def start_job_worker():
+    job_worker.ensure_started()
 
-    # Itemized meals by day
-    cur.execute(
-        "SELECT date, breakfast, lunch, dinner FROM meals WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date",
-        (user_id, month),
-    )
-    meals_rows = cur.fetchall()
 
+@app.cli.command("run-jobs")
+@click.option("--loop", is_flag=True, help="Keep polling for new jobs instead of exiting when the queue is empty.")
+def run_jobs_command(loop):
+    """Run queued background jobs in the foreground."""
+    count = 0
+    while True:
+        if run_next_job() is not None:
+            count += 1
+        elif loop:
+            time.sleep(JOB_POLL_INTERVAL)
+        else:
+            break
+    print(f"Ran {count} jobs")
+
+
+def job_summary(job):
+    """JSON-friendly view of a jobs row"""
+    total, processed = job["total"] or 0, job["processed"] or 0
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "label": JOB_LABELS.get(job["kind"], job["kind"]),
+        "month": job["month"],
+        "status": job["status"],
+        "processed": processed,
+        "total": total,
+        "percent": 100 if job["status"] == "done" else (min(100, processed * 100 // total) if total else 0),
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "last_error": job["last_error"],
+        "created_at": job["created_at"].isoformat() if job["created_at"] else None,
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+    }
+
+
+@app.route("/jobs/<int:job_id>")
+def job_status(job_id):
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    cur.execute("SELECT * FROM jobs WHERE id=%s", (job_id,))
+    job = cur.fetchone()
     cur.close()
     conn.close()
+    if not job:
+        return jsonify({"error": "job not found"}), 404
+    return jsonify(job_summary(job))
 
-    cost = meals_count * meal_rate
-    due = cost - payments_sum
-
-    return render_template(
-        "bill.html",
-        month=month,
-        user_name=user_name,
-        meals_count=meals_count,
-        payments_sum=payments_sum,
-        meal_rate=meal_rate,
-        cost=cost,
-        due=due,
-        payments_rows=payments_rows,
-        meals_rows=meals_rows,
-    )
 
-# --------- Menu Management (Admin) ---------
-@app.route("/menu", methods=["GET", "POST"])
-def menu():
-    # Menu should be visible to all logged-in users
-    if not require_login():
+@app.route("/all_bills/generate", methods=["POST"])
+def generate_bills():
+    if not require_login() or not require_admin():
         return redirect(url_for("login"))
 
+    month = resolve_month(request.form.get("month"))
     conn = get_connection()
     cur = conn.cursor(DictCursor)
+    job_id, created = enqueue_job(cur, "generate_bills", month, session.get("user_id"))
+    conn.commit()
+    cur.close()
+    conn.close()
 
-    if request.method == "POST":
-        form_type = request.form.get("form_type")
-        if form_type == "weekly":
-            from datetime import datetime, timedelta
-            week_start = request.form.get("week_start")
-            bm = request.form.get("breakfast_menu")
-            lm = request.form.get("lunch_menu")
-            sm = request.form.get("snacks_menu")
-            dm = request.form.get("dinner_menu")
-            try:
-                start_dt = datetime.strptime(week_start, "%Y-%m-%d")
-                for i in range(7):
-                    day = (start_dt + timedelta(days=i)).strftime("%Y-%m-%d")
-                    cur.execute(
-                        """
-                        INSERT INTO menu (date, breakfast_menu, lunch_menu, dinner_menu)
-                        VALUES (%s, %s, %s, %s)
-                        ON DUPLICATE KEY UPDATE breakfast_menu=VALUES(breakfast_menu), lunch_menu=VALUES(lunch_menu), dinner_menu=VALUES(dinner_menu)
-                        """,
-                        (day, bm, lm, dm),
-                    )
-                conn.commit()
-                flash("Weekly menu saved", "success")
-            except Exception as err:
-                flash(f"Error saving weekly menu: {err}", "error")
-        else:
-            date = request.form.get("date")
-            bm = request.form.get("breakfast_menu")
-            lm = request.form.get("lunch_menu")
-            dm = request.form.get("dinner_menu")
-            cur.execute(
-                """
-                INSERT INTO menu (date, breakfast_menu, lunch_menu, dinner_menu)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE breakfast_menu=VALUES(breakfast_menu), lunch_menu=VALUES(lunch_menu), dinner_menu=VALUES(dinner_menu)
-                """,
-                (date, bm, lm, dm),
-            )
-            conn.commit()
-            flash("Menu saved", "success")
+    if created:
+        flash(f"Bill generation for {month} queued", "success")
+    else:
+        flash(f"Bill generation for {month} is already in progress", "info")
+    return redirect(url_for("all_bills", month=month))
 
-    month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
-        month = _d.today().strftime("%Y-%m")
 
-    cur.execute(
-        "SELECT * FROM menu WHERE DATE_FORMAT(date, '%%Y-%%m')=%s ORDER BY date DESC",
-        (month,),
-    )
-    rows = cur.fetchall()
-    
-    # Get weekly fees for display
-    cur.execute("SELECT * FROM weekly_fees ORDER BY FIELD(weekday, 'Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')")
-    weekly_fees = cur.fetchall()
-    
-    # Create weekly menu structure with actual food items from the image
-    weekly_menu = {
-        'Sunday': {
-            'breakfast_menu': 'Puri, Upma, Alu-curry',
-            'lunch_menu': 'Rice, Roti, Dal, Fish Fry / Kabuli Paneer, Mustard Gravy, Dahi Salad',
-            'snacks_menu': 'Coffee & Biscuits',
-            'dinner_menu': 'Rice, Roti, Dal, Egg Tadka / Veg Tadka, Vegetable Fry'
-        },
-        'Monday': {
-            'breakfast_menu': 'Vegetable chow mien',
-            'lunch_menu': 'Rice, Roti, Dal, Sambar, Veg Curry, Vegetable Chips',
-            'snacks_menu': 'Tea & Biscuits',
-            'dinner_menu': 'Rice, Roti, Dal, Manchurian Chilli, Kheer'
-        },
-        'Tuesday': {
-            'breakfast_menu': 'Bara (4 pc), Upma, Alu-Matar-Curry',
-            'lunch_menu': 'Rice, Roti, Dal, Rasam, Chingudi Ghanta / Veg Ghanta, Guji Chana Bhaja',
-            'snacks_menu': 'Tea & Biscuits',
-            'dinner_menu': 'Rice, Jeera Rice, Roti, Dal, Cauliflower / Parwal Alu Curry, Soyabean Chilli'
-        },
-        'Wednesday': {
-            'breakfast_menu': 'Aloo Chop / Gulgula, Aloo Matar Curry',
-            'lunch_menu': 'Rice, Roti, Dal, Chicken Curry / Mushroom Alu Masala, Dahi Raita',
-            'snacks_menu': 'Coffee & Biscuits',
-            'dinner_menu': 'Lemon Rice, Rice, Roti, Dalma, Mix veg Fry, Achar'
-        },
-        'Thursday': {
-            'breakfast_menu': 'Idli, Sambar, Chutney',
-            'lunch_menu': 'Rice, Roti, Dal, Rasam, Egg Masala / Veg Masala, Alu Choka',
-            'snacks_menu': 'Tea & Biscuits',
-            'dinner_menu': 'Roti, Dal Fry, Veg Biriyani, Paneer & Green Motor Curry, Sweet Pickle'
-        },
-        'Friday': {
-            'breakfast_menu': 'Poha / Halwa, Alu-Matar-Curry',
-            'lunch_menu': 'Rice, Roti, Dal, Chicken Kasa / Paneer & Green Peas Curry, Pampad',
-            'snacks_menu': 'Tea & Biscuits',
-            'dinner_menu': 'Roti, Fried Rice, Dal, Chhole Masala, Sweet'
-        },
-        'Saturday': {
-            'breakfast_menu': 'Pesarattu / Chakuli, Alu-Curry, Chutney',
-            'lunch_menu': 'Rice, Roti, Dal, Sambar, Egg Curry / Veg Curry, Dahi Bundi',
-            'snacks_menu': 'Tea & Biscuits',
-            'dinner_menu': 'Roti, Rice, Dal, Mushroom Alu Masala, Jeera Aloo'
-        }
-    }
-    
-    # Update weekly menu with pricing information
-    for fee in weekly_fees:
-        weekday = fee['weekday']
-        if weekday in weekly_menu:
-            weekly_menu[weekday]['breakfast_price'] = f"₹{fee['breakfast_fee']:.2f}"
-            weekly_menu[weekday]['lunch_price'] = f"₹{fee['lunch_fee']:.2f}"
-            weekly_menu[weekday]['dinner_price'] = f"₹{fee['dinner_fee']:.2f}"
-    
-    # Default timings from the image
-    timings = {
-        'breakfast': '6:30 AM to 8:30 AM',
-        'lunch': '12:30 PM to 2:30 PM',
-        'tea': '6:00 PM to 7:00 PM',
-        'dinner': '8:00 PM to 9:45 PM',
-        'sunday_breakfast': '8:00 AM to 9:30 AM',
-        'sunday_lunch': '12:30 PM to 2:30 PM'
-    }
-    
-    # Get today's date for default values
-    from datetime import date
-    today = date.today().strftime("%Y-%m-%d")
-    
+@app.route("/all_bills/close", methods=["POST"])
+def close_bills_month():
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+
+    month = resolve_month(request.form.get("month"))
+    conn = get_connection()
+    cur = conn.cursor(DictCursor)
+    last = last_closed_month(cur)
+    if month >= datetime.now().strftime("%Y-%m"):
+        flash("Only past months can be closed", "error")
+    elif last and month <= last:
+        flash(f"{month} is already closed (last closed month: {last})", "error")
+    else:
+        _, created = enqueue_job(cur, "close_month", month, session.get("user_id"))
+        conn.commit()
+        if created:
+            flash(f"Closing {month} queued", "success")
+        else:
+            flash(f"{month} is already being closed", "info")
     cur.close()
     conn.close()
-    return render_template("menu.html", month=month, menu_rows=rows, weekly_menu=weekly_menu, timings=timings, today=today, user_name=session.get("user_name"), user_role=session.get("user_role"))
+    return redirect(url_for("all_bills", month=month))
 
 
 # --------- Admin View: All Monthly Bills ---------
@@ -1219,115 +3890,27 @@ def all_bills():
         return redirect(url_for("login"))
     
     month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
-        month = _d.today().strftime("%Y-%m")
+    month = resolve_month(month)
     
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cur = conn.cursor(DictCursor)
     
-    # First, ensure all active users have monthly bills generated for this month
-    cur.execute("SELECT id, name FROM users WHERE role = 'member'")
-    active_users = cur.fetchall()
-    
-    # Check if mess_start_date column exists
-    cur.execute("SHOW COLUMNS FROM users LIKE 'mess_start_date'")
-    has_mess_start_date = cur.fetchone() is not None
-    
-    for user in active_users:
-        # Generate bill for each user if not exists
-        user_id = user["id"]
-        mess_start_date = None
-        
-        if has_mess_start_date:
-            cur.execute("SELECT mess_start_date FROM users WHERE id=%s", (user_id,))
-            mess_start_date = cur.fetchone()["mess_start_date"]
-        
-        # Get total expenses for the month
-        cur.execute(
-            "SELECT IFNULL(SUM(amount),0) as total_expenses FROM expenses WHERE DATE_FORMAT(date, '%%Y-%%m')=%s",
-            (month,),
-        )
-        total_expenses = float(cur.fetchone()["total_expenses"] or 0)
-
-        # Get total meals for the month (excluding cancelled meals)
-        cur.execute(
-            """
-            SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals 
-            FROM meals 
-            WHERE DATE_FORMAT(date, '%%Y-%%m')=%s
-            """,
-            (month,),
-        )
-        total_meals = int(cur.fetchone()["total_meals"] or 0)
-        
-        # Calculate meal rate
-        meal_rate = (total_expenses / total_meals) if total_meals > 0 else 0.0
-
-        # Get user's meals for the month
-        cur.execute(
-            """
-            SELECT 
-                IFNULL(SUM(breakfast + lunch + dinner),0) as total_meals,
-                IFNULL(SUM(CASE WHEN breakfast=0 THEN 1 ELSE 0 END + 
-                           CASE WHEN lunch=0 THEN 1 ELSE 0 END + 
-                           CASE WHEN dinner=0 THEN 1 ELSE 0 END), 0) as cancelled_meals
-            FROM meals
-            WHERE user_id=%s AND DATE_FORMAT(date, '%%Y-%%m')=%s
-            """,
-            (user_id, month),
-        )
-        user_meals = cur.fetchone()
-        total_user_meals = int(user_meals["total_meals"] or 0)
-        cancelled_meals = int(user_meals["cancelled_meals"] or 0)
-        
-        # Calculate billable meals
-        if total_user_meals == 0 and cancelled_meals == 0:
-            from datetime import datetime, timedelta
-            month_start = datetime.strptime(month, "%Y-%m").date()
-            month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-            actual_start = max(month_start, mess_start_date or month_start)
-            days_in_month = (month_end - actual_start).days + 1
-            billable_meals = days_in_month * 3
-        else:
-            billable_meals = total_user_meals + cancelled_meals
-
-        # Calculate bill amount
-        bill_amount = billable_meals * meal_rate
-
-        # Get approved payments for the month
-        cur.execute(
-            "SELECT IFNULL(SUM(amount),0) as payments_sum FROM payments WHERE user_id=%s AND status='approved' AND DATE_FORMAT(date, '%%Y-%%m')=%s",
-            (user_id, month),
-        )
-        payments_sum = float(cur.fetchone()["payments_sum"] or 0)
-
-        # Calculate due amount
-        due_amount = bill_amount - payments_sum
+    # Bills are generated by a background job; this page only reads them and shows its progress
+    cur.execute(
+        "SELECT * FROM jobs WHERE kind IN ('generate_bills', 'close_month') AND month=%s ORDER BY id DESC LIMIT 1",
+        (month,),
+    )
+    job = cur.fetchone()
+    cur.execute("SELECT 1 FROM stale_bill_months WHERE month=%s", (month,))
+    is_stale = cur.fetchone() is not None
+    cur.execute("SELECT closed_at FROM ledger_periods WHERE month=%s", (month,))
+    closed = cur.fetchone()
 
-        # Insert or update monthly bill
-        cur.execute(
-            """
-            INSERT INTO monthly_bills (user_id, month, total_meals, cancelled_meals, billable_meals, 
-                                     meal_rate, total_amount, paid_amount, due_amount, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE 
-                total_meals=VALUES(total_meals), cancelled_meals=VALUES(cancelled_meals),
-                billable_meals=VALUES(billable_meals), meal_rate=VALUES(meal_rate),
-                total_amount=VALUES(total_amount), paid_amount=VALUES(paid_amount),
-                due_amount=VALUES(due_amount), status=VALUES(status)
-            """,
-            (user_id, month, total_user_meals, cancelled_meals, billable_meals, 
-             meal_rate, bill_amount, payments_sum, due_amount, 
-             "paid" if due_amount <= 0 else "pending")
-        )
-    
-    conn.commit()
-    
     # Get all monthly bills for the month
+    start_column = ", u.mess_start_date" if schema_caps.has_column("users", "mess_start_date") else ""
     cur.execute(
-        """
-        SELECT mb.*, u.name as user_name, u.email
+        f"""
+        SELECT mb.*, u.name as user_name, u.email{start_column}
         FROM monthly_bills mb
         JOIN users u ON u.id = mb.user_id
         WHERE mb.month = %s
@@ -1337,12 +3920,6 @@ def all_bills():
     )
     bills = cur.fetchall()
     
-    # Add mess_start_date to bills if column exists
-    if has_mess_start_date:
-        for bill in bills:
-            cur.execute("SELECT mess_start_date FROM users WHERE id=%s", (bill["user_id"],))
-            bill["mess_start_date"] = cur.fetchone()["mess_start_date"]
-    
     # Get summary statistics
     cur.execute(
         """
@@ -1367,55 +3944,281 @@ def all_bills():
         bills=bills, 
         month=month, 
         summary=summary,
+        job=job_summary(job) if job else None,
+        is_stale=is_stale,
+        closed_at=closed["closed_at"] if closed else None,
+        can_close=not closed and month < datetime.now().strftime("%Y-%m"),
         user_name=session.get("user_name"), 
         user_role=session.get("user_role")
     )
 
+# --------- Exports (Admin) ---------
+EXPORT_QUERIES = {
+    "meals": """
+        SELECT m.date, m.user_id, u.name as user_name, u.email, m.breakfast, m.lunch, m.dinner
+        FROM meals m
+        JOIN users u ON u.id = m.user_id
+        WHERE m.date >= %s AND m.date < %s
+        ORDER BY m.date, m.user_id
+    """,
+    "payments": """
+        SELECT p.id, p.date, p.user_id, u.name as user_name, u.email, p.amount, p.method, p.reference,
+               p.status, p.approved_by, p.approved_at
+        FROM payments p
+        JOIN users u ON u.id = p.user_id
+        WHERE p.date >= %s AND p.date < %s
+        ORDER BY p.date, p.id
+    """,
+    "expenses": """
+        SELECT id, date, amount, category, notes, created_by
+        FROM expenses
+        WHERE date >= %s AND date < %s
+        ORDER BY date, id
+    """,
+    "monthly_bills": """
+        SELECT mb.month, mb.user_id, u.name as user_name, u.email, mb.total_meals, mb.cancelled_meals,
+               mb.billable_meals, mb.meal_rate, mb.total_amount, mb.paid_amount, mb.due_amount, mb.status
+        FROM monthly_bills mb
+        JOIN users u ON u.id = mb.user_id
+        WHERE mb.month >= %s AND mb.month < %s
+        ORDER BY mb.month, mb.user_id
+    """,
+}
+EXPORT_FORMATS = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+
+
+def export_period(month=None, year=None):
+    """(start, end, label) for a whole year ('YYYY') or a month ('YYYY-MM', default current)"""
+    if year:
+        start = datetime.strptime(str(year), "%Y").date()
+        return start, start.replace(year=start.year + 1), start.strftime("%Y")
+    month = resolve_month(month)
+    start, end = month_range(month)
+    return start, end, month
+
+
+def open_export(dataset, start, end):
+    """Start an unbuffered (server-side cursor) read of dataset rows in [start, end)"""
+    if dataset == "monthly_bills":
+        # monthly_bills.month is 'YYYY-MM' text, which sorts like the dates it names
+        start, end = start.strftime("%Y-%m"), end.strftime("%Y-%m")
+    conn = get_connection(dedicated=True, readonly=True)
+    try:
+        cur = conn.cursor(SSCursor)
+        cur.execute(EXPORT_QUERIES[dataset], (start, end))
+    except Exception:
+        conn.discard()
+        raise
+    return conn, cur
+
+
+def _export_value(value):
+    if isinstance(value, (datetime, date_type)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def stream_export(conn, cur, fmt):
+    """Yield the export as CSV or JSON Lines chunks, one row at a time; memory stays flat"""
+    columns = [col[0] for col in cur.description]
+    finished = False
+    try:
+        if fmt == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for row in cur:
+                writer.writerow([_export_value(v) for v in row])
+                if buffer.tell() > 8192:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue()
+        else:
+            for row in cur:
+                yield json.dumps(dict(zip(columns, (_export_value(v) for v in row)))) + "\n"
+        finished = True
+    finally:
+        if finished:
+            cur.close()
+            conn.close()
+        else:
+            # Client went away mid-stream; dropping the connection is cheaper than draining the result
+            conn.discard()
+
+
+@app.route("/export/<dataset>")
+def export(dataset):
+    """Stream meals, payments, expenses or monthly_bills for ?month=YYYY-MM or ?year=YYYY"""
+    if not require_login() or not require_admin():
+        return redirect(url_for("login"))
+    fmt = request.args.get("format", "csv")
+    if dataset not in EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        return "Unknown export\n", 404, {"Content-Type": "text/plain"}
+    try:
+        start, end, label = export_period(request.args.get("month"), request.args.get("year"))
+    except ValueError:
+        return "Invalid year\n", 400, {"Content-Type": "text/plain"}
+
+    conn, cur = open_export(dataset, start, end)
+    response = Response(
+        stream_with_context(stream_export(conn, cur, fmt)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={dataset}-{label}.{fmt}"},
+    )
+    # A HEAD request never starts the generator, so its cleanup never runs; no-op once it has
+    response.call_on_close(conn.discard)
+    return response
+
+
+@app.cli.command("export")
+@click.argument("dataset", type=click.Choice(sorted(EXPORT_QUERIES)))
+@click.option("--month", help="YYYY-MM (default: current month)")
+@click.option("--year", help="YYYY; exports the whole year")
+@click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv")
+@click.option("--output", type=click.File("w"), default="-", help="File to write (default: stdout)")
+def export_command(dataset, month, year, fmt, output):
+    """Stream an export of DATASET to a file or stdout."""
+    start, end, _ = export_period(month, year)
+    conn, cur = open_export(dataset, start, end)
+    for chunk in stream_export(conn, cur, fmt):
+        output.write(chunk)
+
+
 # --------- Admin View: Student Meal Cancellations ---------
+# One row per (member, day) with at least one cancelled meal in [%s, %s), refund priced from weekly_fees
+CANCELLATION_REFUNDS_SQL = """
+    SELECT m.user_id, m.date, wf.weekday, m.breakfast, m.lunch, m.dinner,
+           (m.breakfast = 0) + (m.lunch = 0) + (m.dinner = 0) as cancelled_meals,
+           CASE WHEN m.breakfast = 0 THEN wf.breakfast_fee ELSE 0 END
+         + CASE WHEN m.lunch = 0 THEN wf.lunch_fee ELSE 0 END
+         + CASE WHEN m.dinner = 0 THEN wf.dinner_fee ELSE 0 END as refund
+    FROM meals m
+    JOIN weekly_fees wf ON wf.weekday = DAYNAME(m.date)
+    WHERE m.date >= %s AND m.date < %s
+    AND (m.breakfast = 0 OR m.lunch = 0 OR m.dinner = 0)
+"""
+
+
 @app.route("/cancellations")
 def cancellations():
     if not require_login() or not require_admin():
         return redirect(url_for("login"))
     
     month = request.args.get("month")
-    if not month:
-        from datetime import date as _d
-        month = _d.today().strftime("%Y-%m")
+    month = resolve_month(month)
+    first_day, next_month = month_range(month)
     
-    conn = get_connection()
+    conn = get_connection(readonly=True)
     cur = conn.cursor(DictCursor)
+    params = (first_day, next_month)
     
-    # Get cancellations (meals = 0) for the month
+    # Per-row cancellations (meals = 0) with the refund priced from that weekday's fees
     cur.execute(
-        """
-        SELECT m.*, u.name as user_name, 
-               DATE_FORMAT(m.date, '%%W') as weekday
-        FROM meals m
-        JOIN users u ON u.id = m.user_id
-        WHERE DATE_FORMAT(m.date, '%%Y-%%m')=%s 
-        AND (m.breakfast=0 OR m.lunch=0 OR m.dinner=0)
-        ORDER BY m.date DESC, u.name ASC
+        f"""
+        SELECT c.*, u.name as user_name
+        FROM ({CANCELLATION_REFUNDS_SQL}) c
+        JOIN users u ON u.id = c.user_id
+        ORDER BY c.date DESC, u.name ASC
         """,
-        (month,),
+        params,
     )
     cancellations = cur.fetchall()
     
-    # Get weekly fees for billing calculation
-    cur.execute("SELECT * FROM weekly_fees")
-    weekly_fees = {r["weekday"]: r for r in cur.fetchall()}
+    cur.execute(
+        f"""
+        SELECT c.user_id, u.name as user_name, COUNT(*) as days,
+               SUM(c.cancelled_meals) as cancelled_meals, SUM(c.refund) as refund
+        FROM ({CANCELLATION_REFUNDS_SQL}) c
+        JOIN users u ON u.id = c.user_id
+        GROUP BY c.user_id, u.name
+        ORDER BY refund DESC, u.name ASC
+        """,
+        params,
+    )
+    member_totals = cur.fetchall()
+    
+    cur.execute(
+        f"""
+        SELECT c.date, c.weekday, COUNT(*) as members,
+               SUM(c.cancelled_meals) as cancelled_meals, SUM(c.refund) as refund
+        FROM ({CANCELLATION_REFUNDS_SQL}) c
+        GROUP BY c.date, c.weekday
+        ORDER BY c.date DESC
+        """,
+        params,
+    )
+    day_totals = cur.fetchall()
     
     cur.close()
     conn.close()
     
+    grand_total = {
+        "cancelled_meals": sum(int(r["cancelled_meals"] or 0) for r in member_totals),
+        "refund": sum(float(r["refund"] or 0) for r in member_totals),
+    }
+    
     return render_template(
         "cancellations.html", 
         cancellations=cancellations, 
+        member_totals=member_totals,
+        day_totals=day_totals,
+        grand_total=grand_total,
         month=month, 
-        weekly_fees=weekly_fees,
         user_name=session.get("user_name"), 
         user_role=session.get("user_role")
     )
 
 
+# --------- Application Startup ---------
+def dispose_pools():
+    """Close idle pooled connections and forget both pools, e.g. in a preloading master before it forks"""
+    global _pool, _read_pool
+    with _pool_lock:
+        pools, _pool, _read_pool = (_pool, _read_pool), None, None
+    for pool in pools:
+        if pool is not None:
+            pool.close_idle()
+
+
+def reset_after_fork():
+    """Give a freshly forked worker its own connection state.
+
+    Pooled sockets inherited from the parent are dropped without being
+    closed (closing would end the parent's sessions), and the pool lock is
+    replaced in case a parent thread held it at fork time.
+    """
+    global _pool, _read_pool, _pool_lock
+    _pool_lock = threading.Lock()
+    _pool = _read_pool = None
+
+
+def start_background_workers():
+    """Start this process's bill refresher and job worker threads (no-op when disabled or running)"""
+    bill_refresher.ensure_started()
+    job_worker.ensure_started()
+
+
+def create_app(config=None, check_schema=True, start_workers=False):
+    """Configure the application and run its startup hooks.
+
+    Importing this module opens no connections and starts no threads, so a
+    gunicorn master can preload it and fork. Startup happens here instead:
+    config overrides, the schema version check (which migrates when
+    AUTO_MIGRATE is set) and, with start_workers, the background threads.
+    Without start_workers they start on each process's first request.
+    """
+    if config:
+        app.config.update(config)
+    if check_schema:
+        check_schema_version()
+    if start_workers:
+        start_background_workers()
+    return app
+
+
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    run_migrations()
+    create_app(check_schema=False).run(debug=True)
\ No newline at end of file
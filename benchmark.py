@@ -0,0 +1,567 @@
+#!/usr/bin/env python3
+"""
+Reproducible end-to-end benchmark for the mess app.
+
+Generates a deterministic synthetic hostel (members, meals with cancellations,
+expenses, payments), bulk-loads it into a dedicated benchmark database and
+drives every page through the Flask test client, reporting latency
+percentiles, queries per request and rows scanned.
+
+    python benchmark.py routes --members 500 --months 3 --output bench_results.json
+    python benchmark.py hashing --methods scrypt pbkdf2:sha256:600000
+    python benchmark.py capacity --workers 1 --threads 4 --duration 20
+
+`capacity` serves the app with gunicorn.conf.py over real HTTP and reports
+requests per second per worker for a mix of read pages, which is the number
+to size WEB_CONCURRENCY with. The load generator runs in this process, so on
+a machine with few cores it competes with the server: treat the result as a
+lower bound, or give the server host more cores than workers.
+
+Connection settings come from the same DATABASE_URL / DB_* variables as
+app.py; the data goes into BENCH_DB_NAME (default mess_benchmark), which is
+dropped and recreated unless --skip-load is given. With a sqlite:// URL the
+benchmark uses BENCH_DB_NAME.db in the working directory instead, and rows
+scanned are not reported (SQLite has no session status counters).
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+# The app reads its configuration at import time
+os.environ["DB_NAME"] = os.getenv("BENCH_DB_NAME", "mess_benchmark")
+if os.getenv("DATABASE_URL", "").startswith("sqlite:"):
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.environ['DB_NAME']}.db"
+USER_POOL_SIZE = os.getenv("DB_POOL_SIZE")
+os.environ.setdefault("DB_POOL_SIZE", "1")  # every request reuses one connection, so session counters are per request
+os.environ.setdefault("BILL_REFRESH_INTERVAL", "0")
+os.environ.setdefault("JOB_POLL_INTERVAL", "0")
+
+import app as mess_app  # noqa: E402
+
+CHUNK_SIZE = 5000
+STATUS_COUNTERS = ("Questions", "Handler_read_first", "Handler_read_key", "Handler_read_last",
+                   "Handler_read_next", "Handler_read_prev", "Handler_read_rnd", "Handler_read_rnd_next")
+
+
+# --------- Synthetic dataset ---------
+def month_starts(months, today=None):
+    """First day of each of the last `months` months, oldest first, ending with the current month"""
+    first = (today or date.today()).replace(day=1)
+    starts = [first]
+    for _ in range(months - 1):
+        starts.append((starts[-1] - timedelta(days=1)).replace(day=1))
+    return list(reversed(starts))
+
+
+def generate_dataset(members, months, seed=42, today=None):
+    """Build a deterministic hostel dataset; same arguments always give the same rows"""
+    rng = random.Random(seed)
+    today = today or date.today()
+    starts = month_starts(months, today)
+    first_day = starts[0]
+
+    users = []
+    for i in range(1, members + 1):
+        # Most members join at the start; a few join mid-period
+        joined = first_day if rng.random() < 0.9 else first_day + timedelta(days=rng.randrange(0, 28 * months))
+        users.append((f"Member {i:05d}", f"member{i:05d}@bench.local", min(joined, today)))
+
+    meals, expenses, payments = [], [], []
+    cancel_rates = [0.20 if rng.random() < 0.1 else 0.03 for _ in users]
+    day = first_day
+    while day <= today:
+        weekend = day.weekday() >= 5
+        for idx, (_, _, joined) in enumerate(users):
+            if day < joined:
+                continue
+            rate = cancel_rates[idx] * (2 if weekend else 1)
+            flags = [0 if rng.random() < rate else 1 for _ in range(3)]
+            # Members only write a row when they cancel something
+            if 0 in flags:
+                meals.append((idx + 1, day, *flags))
+        for _ in range(rng.randint(1, 3)):
+            expenses.append((day, round(rng.uniform(500, 5000), 2), rng.choice(["Groceries", "Gas", "Vegetables", "Staff"]), None))
+        day += timedelta(days=1)
+
+    for start in starts:
+        for idx in range(len(users)):
+            for _ in range(rng.randint(1, 2)):
+                paid_on = start + timedelta(days=rng.randrange(0, 28))
+                if paid_on > today:
+                    continue
+                roll = rng.random()
+                status = "approved" if roll < 0.85 else "pending" if roll < 0.95 else "rejected"
+                payments.append((idx + 1, paid_on, round(rng.uniform(1000, 3000), 2),
+                                 rng.choice(["UPI", "Cash", "Card"]), f"REF{rng.randrange(10**8):08d}", status))
+
+    return {"users": users, "meals": meals, "expenses": expenses, "payments": payments, "months": starts}
+
+
+def _insert_chunks(cur, sql, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        cur.executemany(sql, rows[i:i + CHUNK_SIZE])
+
+
+def load_dataset(dataset):
+    """Recreate the benchmark database, migrate it and bulk-load the dataset"""
+    conn = mess_app.get_connection(use_default=False)
+    cur = conn.cursor()
+    if mess_app.DB_BACKEND == "sqlite":
+        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        tables = [row[0] for row in cur.fetchall()]
+        cur.execute("PRAGMA foreign_keys=OFF")
+        for table in tables:
+            cur.execute(f"DROP TABLE {table}")
+        conn.commit()
+        cur.execute("PRAGMA foreign_keys=ON")
+    else:
+        cur.execute(f"DROP DATABASE IF EXISTS {mess_app.DEFAULT_DB_NAME}")
+    cur.close()
+    conn.close()
+    mess_app.run_migrations()
+    # Load the column registry now; with a one-connection pool it can't borrow one mid-load
+    mess_app.schema_caps.columns("users")
+
+    conn = mess_app.get_connection()
+    cur = conn.cursor()
+    password_hash = mess_app.hash_password("bench123")
+    cur.execute("SELECT IFNULL(MAX(id), 0) FROM users")
+    user_offset = cur.fetchone()[0]
+    _insert_chunks(
+        cur,
+        "INSERT INTO users (name, email, password_hash, role, mess_start_date) VALUES (%s, %s, %s, 'member', %s)",
+        [(name, email, password_hash, joined) for name, email, joined in dataset["users"]],
+    )
+    _insert_chunks(
+        cur,
+        "INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, %s, %s, %s)",
+        [(uid + user_offset, *rest) for uid, *rest in dataset["meals"]],
+    )
+    _insert_chunks(
+        cur,
+        "INSERT INTO expenses (date, amount, category, notes) VALUES (%s, %s, %s, %s)",
+        dataset["expenses"],
+    )
+    _insert_chunks(
+        cur,
+        "INSERT INTO payments (user_id, date, amount, method, reference, status) VALUES (%s, %s, %s, %s, %s, %s)",
+        [(uid + user_offset, *rest) for uid, *rest in dataset["payments"]],
+    )
+    conn.commit()
+    if mess_app.DB_BACKEND == "sqlite":
+        cur.execute("ANALYZE")
+    else:
+        cur.execute("ANALYZE TABLE users, meals, expenses, payments")
+        cur.fetchall()
+    cur.close()
+
+    # /all_bills only reads monthly_bills now, so generate them up front
+    cur = conn.cursor(mess_app.DictCursor)
+    for start in dataset["months"]:
+        mess_app.refresh_month_bills(cur, start.strftime("%Y-%m"))
+        conn.commit()
+    cur.close()
+    conn.close()
+
+
+# --------- Route driver ---------
+def session_counters():
+    if mess_app.DB_BACKEND == "sqlite":
+        # No server-side counters; count queries with the app's own request accounting
+        metrics = mess_app.request_metrics
+        with metrics._lock:
+            issued = sum(hist.sum for (name, _, _), hist in metrics.histograms.items() if name == "db_queries")
+        return {"Questions": int(issued), **{name: 0 for name in STATUS_COUNTERS[1:]}}
+    conn = mess_app.get_connection()
+    cur = conn.cursor()
+    cur.execute(
+        f"SHOW SESSION STATUS WHERE Variable_name IN ({', '.join(['%s'] * len(STATUS_COUNTERS))})",
+        STATUS_COUNTERS,
+    )
+    values = {name: int(value) for name, value in cur.fetchall()}
+    cur.close()
+    conn.close()
+    return values
+
+
+def counter_delta(before, after, baseline=None):
+    baseline = baseline or {}
+    queries = after["Questions"] - before["Questions"] - baseline.get("queries", 0)
+    scanned = sum(after[k] - before[k] for k in STATUS_COUNTERS[1:]) - baseline.get("rows_scanned", 0)
+    return max(queries, 0), max(scanned, 0)
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def login_as(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user["id"]
+        sess["user_name"] = user["name"]
+        sess["user_role"] = user["role"]
+
+
+def bench_routes(month, admin, member):
+    """(name, method, path, user, form) for every page in app.py"""
+    tomorrow = (date.today() + timedelta(days=1)).strftime("%Y-%m-%d")
+    in_a_month = (date.today() + timedelta(days=30)).strftime("%Y-%m-%d")
+    return [
+        ("dashboard", "GET", "/dashboard", member, None),
+        ("meals:member", "GET", f"/meals?month={month}", member, None),
+        ("meals:admin", "GET", f"/meals?month={month}", admin, None),
+        ("payments:member", "GET", f"/payments?month={month}", member, None),
+        ("payments:admin", "GET", f"/payments?month={month}", admin, None),
+        ("expenses", "GET", f"/expenses?month={month}", admin, None),
+        ("menu", "GET", f"/menu?month={month}", member, None),
+        ("monthly_bill", "GET", f"/monthly_bill?month={month}", member, None),
+        ("bill", "GET", f"/bill?month={month}", member, None),
+        ("members", "GET", "/members", admin, None),
+        ("all_bills", "GET", f"/all_bills?month={month}", admin, None),
+        ("cancellations", "GET", f"/cancellations?month={month}", admin, None),
+        ("pool_stats", "GET", "/pool_stats", admin, None),
+        # Writes last so they cannot change what the read routes see
+        ("bulk_cancel:30d_all", "POST", "/meals/bulk_cancel", admin,
+         {"start_date": tomorrow, "end_date": in_a_month, "breakfast": "on"}),
+    ]
+
+
+def bench_users():
+    """The (admin, member) the benchmark logs in as"""
+    conn = mess_app.get_connection()
+    cur = conn.cursor(mess_app.DictCursor)
+    cur.execute("SELECT id, name, role FROM users WHERE role='admin' ORDER BY id LIMIT 1")
+    admin = cur.fetchone()
+    cur.execute("SELECT id, name, role FROM users WHERE role='member' ORDER BY id LIMIT 1")
+    member = cur.fetchone()
+    cur.close()
+    conn.close()
+    return admin, member
+
+
+def run_routes(iterations, warmup=1):
+    client = mess_app.app.test_client()
+    admin, member = bench_users()
+
+    # Cost of reading the counters themselves
+    first = session_counters()
+    second = session_counters()
+    queries, scanned = counter_delta(first, second)
+    baseline = {"queries": queries, "rows_scanned": scanned}
+
+    month = date.today().strftime("%Y-%m")
+    results = {}
+    for name, method, path, user, form in bench_routes(month, admin, member):
+        login_as(client, user)
+        runs = 1 if method == "POST" else iterations
+        for _ in range(0 if method == "POST" else warmup):
+            client.open(path, method=method, data=form)
+        timings, query_counts, scan_counts, status = [], [], [], None
+        for _ in range(runs):
+            before = session_counters()
+            started = time.perf_counter()
+            response = client.open(path, method=method, data=form)
+            timings.append((time.perf_counter() - started) * 1000)
+            after = session_counters()
+            status = response.status_code
+            q, r = counter_delta(before, after, baseline)
+            query_counts.append(q)
+            scan_counts.append(r)
+        results[name] = {
+            "method": method,
+            "path": path,
+            "status": status,
+            "samples": runs,
+            "p50_ms": round(percentile(timings, 50), 3),
+            "p95_ms": round(percentile(timings, 95), 3),
+            "mean_ms": round(statistics.mean(timings), 3),
+            "queries": round(statistics.mean(query_counts), 1),
+            "rows_scanned": round(statistics.mean(scan_counts), 1) if mess_app.DB_BACKEND == "mysql" else None,
+        }
+        print(f"  {name:<22} {status}  p50 {results[name]['p50_ms']:>9.2f} ms  p95 {results[name]['p95_ms']:>9.2f} ms  "
+              f"queries {results[name]['queries']:>6}  rows scanned {str(results[name]['rows_scanned']):>10}")
+    return results
+
+
+def _git_revision():
+    try:
+        with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".git", "HEAD")) as head:
+            ref = head.read().strip()
+        if ref.startswith("ref: "):
+            with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".git", ref[5:])) as f:
+                return f.read().strip()
+        return ref
+    except OSError:
+        return None
+
+
+def cmd_routes(args):
+    if not args.skip_load:
+        started = time.perf_counter()
+        dataset = generate_dataset(args.members, args.months, args.seed)
+        load_dataset(dataset)
+        print(f"✓ Loaded {len(dataset['users'])} members, {len(dataset['meals'])} meal rows, "
+              f"{len(dataset['expenses'])} expenses, {len(dataset['payments'])} payments "
+              f"in {time.perf_counter() - started:.1f}s")
+    print(f"Benchmarking routes ({args.iterations} iterations each):")
+    results = run_routes(args.iterations)
+    report = {
+        "benchmark": "routes",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "database": mess_app.DEFAULT_DB_NAME,
+        "dataset": {"members": args.members, "months": args.months, "seed": args.seed},
+        "iterations": args.iterations,
+        "routes": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {args.output}")
+
+
+# --------- Password hashing ---------
+HASH_METHODS = ("scrypt", "scrypt:16384:8:1", "pbkdf2:sha256:1000000", "pbkdf2:sha256:600000", "pbkdf2:sha256:260000")
+
+
+def bench_hashing(methods, duration):
+    """Login verifications per second on one core for each werkzeug hash method"""
+    results = []
+    for method in methods:
+        stored = mess_app.generate_password_hash("bench-password", method=method)
+        count, started = 0, time.perf_counter()
+        while True:
+            mess_app.check_password_hash(stored, "bench-password")
+            count += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= duration and count >= 3:
+                break
+        results.append({
+            "method": method,
+            "parameters": stored.split("$", 1)[0],
+            "verify_ms": round(elapsed / count * 1000, 2),
+            "logins_per_sec_per_core": round(count / elapsed, 1),
+        })
+    return results
+
+
+def cmd_hashing(args):
+    cores = os.cpu_count() or 1
+    configured = mess_app._hash_parameters(mess_app.PASSWORD_HASH_METHOD)
+    print(f"Timing password verification ({args.duration:.1f}s per method, {cores} cores):")
+    results = bench_hashing(args.methods, args.duration)
+    for r in results:
+        marker = "  <- PASSWORD_HASH_METHOD" if r["parameters"] == configured else ""
+        print(f"  {r['parameters']:<28} {r['verify_ms']:>8.2f} ms  {r['logins_per_sec_per_core']:>8.1f} logins/s/core"
+              f"  ~{r['logins_per_sec_per_core'] * cores:.0f}/s on {cores} cores{marker}")
+    report = {
+        "benchmark": "hashing",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": cores,
+        "configured": configured,
+        "methods": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {args.output}")
+
+
+# --------- Capacity (gunicorn over HTTP) ---------
+def session_cookie(user):
+    """A signed session cookie for user, so load threads skip the login form"""
+    flask_app = mess_app.app
+    serializer = flask_app.session_interface.get_signing_serializer(flask_app)
+    value = serializer.dumps({"user_id": user["id"], "user_name": user["name"], "user_role": user["role"]})
+    return f"{flask_app.config['SESSION_COOKIE_NAME']}={value}"
+
+
+def start_server(port, workers, threads):
+    """Start gunicorn with the shipped config; returns (process, log file)"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = os.environ.copy()
+    env["GUNICORN_ACCESS_LOG"] = ""
+    if USER_POOL_SIZE is None:
+        env.pop("DB_POOL_SIZE", None)  # let gunicorn.conf.py size the pool for its threads
+    log = tempfile.NamedTemporaryFile("w+", prefix="bench_gunicorn_", suffix=".log", delete=False)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(here, "gunicorn.conf.py"), "--pythonpath", here,
+         "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--threads", str(threads), "app:create_app()"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            break
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", "/login")
+            conn.getresponse().read()
+            conn.close()
+            return process, log
+        except OSError:
+            time.sleep(0.2)
+    process.kill()
+    log.seek(0)
+    raise SystemExit(f"gunicorn did not start:\n{log.read()[-2000:]}")
+
+
+def drive(port, plan, duration, concurrency):
+    """Replay plan [(name, path, cookie)] from concurrency keep-alive clients; returns [(name, ms, ok)]"""
+    samples = []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        local = []
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        i = offset
+        while time.perf_counter() < deadline:
+            name, path, cookie = plan[i % len(plan)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path, headers={"Cookie": cookie})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status == 200
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            local.append((name, (time.perf_counter() - started) * 1000, ok))
+        conn.close()
+        with lock:
+            samples.extend(local)
+
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for t in clients:
+        t.start()
+    for t in clients:
+        t.join()
+    return samples
+
+
+def summarize(samples, duration):
+    timings = [ms for _, ms, _ in samples] or [0.0]
+    return {
+        "requests": len(samples),
+        "errors": sum(1 for _, _, ok in samples if not ok),
+        "rps": round(len(samples) / duration, 1),
+        "p50_ms": round(percentile(timings, 50), 2),
+        "p95_ms": round(percentile(timings, 95), 2),
+        "p99_ms": round(percentile(timings, 99), 2),
+    }
+
+
+def cmd_capacity(args):
+    if not args.skip_load:
+        load_dataset(generate_dataset(args.members, args.months, args.seed))
+    admin, member = bench_users()
+    mess_app.dispose_pools()
+    month = date.today().strftime("%Y-%m")
+    cookies = {admin["id"]: session_cookie(admin), member["id"]: session_cookie(member)}
+    plan = [(name, path, cookies[user["id"]]) for name, method, path, user, _ in bench_routes(month, admin, member)
+            if method == "GET" and name != "pool_stats"]
+    concurrency = args.concurrency or args.workers * args.threads * 2
+
+    process, log = start_server(args.port, args.workers, args.threads)
+    try:
+        if args.warmup > 0:
+            drive(args.port, plan, args.warmup, concurrency)
+        print(f"Driving {len(plan)} pages for {args.duration:.0f}s with {concurrency} clients "
+              f"against {args.workers} worker(s) x {args.threads} thread(s):")
+        samples = drive(args.port, plan, args.duration, concurrency)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.close()
+        os.unlink(log.name)
+
+    overall = summarize(samples, args.duration)
+    overall["rps_per_worker"] = round(overall["rps"] / args.workers, 1)
+    pages = {name: summarize([s for s in samples if s[0] == name], args.duration) for name, _, _ in plan}
+    for name, result in pages.items():
+        print(f"  {name:<22} {result['rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.2f} ms  "
+              f"p95 {result['p95_ms']:>8.2f} ms  errors {result['errors']}")
+    print(f"  {'total':<22} {overall['rps']:>8.1f} req/s  p50 {overall['p50_ms']:>8.2f} ms  "
+          f"p95 {overall['p95_ms']:>8.2f} ms  errors {overall['errors']}")
+    print(f"✓ {overall['rps_per_worker']} requests/s per worker")
+    report = {
+        "benchmark": "capacity",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "backend": mess_app.DB_BACKEND,
+        "workers": args.workers,
+        "threads": args.threads,
+        "concurrency": concurrency,
+        "duration_s": args.duration,
+        "overall": overall,
+        "pages": pages,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Results written to {args.output}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    routes = sub.add_parser("routes", help="load a synthetic hostel and time every page")
+    routes.add_argument("--members", type=int, default=500)
+    routes.add_argument("--months", type=int, default=3)
+    routes.add_argument("--seed", type=int, default=42)
+    routes.add_argument("--iterations", type=int, default=20)
+    routes.add_argument("--skip-load", action="store_true", help="reuse the data already in the benchmark database")
+    routes.add_argument("--output", default="bench_results.json")
+    routes.set_defaults(func=cmd_routes)
+
+    hashing = sub.add_parser("hashing", help="logins per second per core for each password hash setting")
+    hashing.add_argument("--methods", nargs="+", default=list(HASH_METHODS),
+                         help="werkzeug methods to compare (values for PASSWORD_HASH_METHOD)")
+    hashing.add_argument("--duration", type=float, default=2.0, help="seconds to spend on each method")
+    hashing.add_argument("--output", default="bench_hashing.json")
+    hashing.set_defaults(func=cmd_hashing)
+
+    capacity = sub.add_parser("capacity", help="requests per second per gunicorn worker over HTTP")
+    capacity.add_argument("--workers", type=int, default=1)
+    capacity.add_argument("--threads", type=int, default=4)
+    capacity.add_argument("--concurrency", type=int, default=0, help="client threads (default workers * threads * 2)")
+    capacity.add_argument("--duration", type=float, default=20.0, help="seconds to measure")
+    capacity.add_argument("--warmup", type=float, default=3.0, help="seconds of unmeasured load first")
+    capacity.add_argument("--port", type=int, default=8765)
+    capacity.add_argument("--members", type=int, default=500)
+    capacity.add_argument("--months", type=int, default=3)
+    capacity.add_argument("--seed", type=int, default=42)
+    capacity.add_argument("--skip-load", action="store_true", help="reuse the data already in the benchmark database")
+    capacity.add_argument("--output", default="bench_capacity.json")
+    capacity.set_defaults(func=cmd_capacity)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+"""
+Production serving profile for the mess app.
+
+    gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Every setting can be overridden with the environment variable next to it
+(or on the gunicorn command line). Measure what one worker sustains on your
+hardware with `python benchmark.py capacity` before changing WEB_CONCURRENCY
+or GUNICORN_THREADS.
+
+Sizing: requests are short and mostly wait on the database, so each worker
+runs a few threads (gthread). Every thread may hold one pooled connection,
+plus one each for the bill refresher and job worker threads, so
+DB_POOL_SIZE defaults to threads + 2 and the primary must accept
+workers * DB_POOL_SIZE connections.
+"""
+
+import multiprocessing
+import os
+import sys
+
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', '8000')}")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count() * 2 + 1)))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+
+# Exports stream for as long as they need; gthread timeouts only catch workers that stop heartbeating
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Recycle workers now and then so slow leaks can't accumulate; the jitter keeps them from restarting together
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "2000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "200"))
+
+# Import the app once in the master and fork it, so workers start fast and share memory copy-on-write
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() in ("1", "true", "yes")
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-") or None
+errorlog = "-"
+
+os.environ.setdefault("DB_POOL_SIZE", str(threads + 2))
+
+
+def _mess_app():
+    # Only touch the app module if it has already been imported in this process
+    return sys.modules.get("app")
+
+
+def when_ready(server):
+    # After preloading, the schema check's connection is idle in the master's pool; don't fork it
+    mess_app = _mess_app()
+    if mess_app is not None:
+        mess_app.dispose_pools()
+
+
+def post_fork(server, worker):
+    mess_app = _mess_app()
+    if mess_app is not None:
+        mess_app.reset_after_fork()
+
+
+def post_worker_init(worker):
+    # Runs once the worker has loaded the app, with or without preload
+    mess_app = _mess_app()
+    if mess_app is not None:
+        mess_app.start_background_workers()
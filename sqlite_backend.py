@@ -0,0 +1,342 @@
+"""
+Embedded SQLite storage backend for the mess app.
+
+Selected with DATABASE_URL=sqlite:///path/to/mess.db. connect() returns an
+object that behaves like the pymysql connections app.py already uses
+(cursor classes, %s placeholders, autocommit, ping, pymysql exceptions), and
+translates the MySQL dialect the app speaks into SQLite:
+
+    INSERT IGNORE                  -> INSERT OR IGNORE
+    ON DUPLICATE KEY ... VALUES(c) -> ON CONFLICT DO UPDATE SET ... excluded.c
+    LEAST / GREATEST               -> multi-argument MIN / MAX
+    DECIMAL(p,s)                   -> DECIMAL_s, read back rounded to s places
+    NOW(), CURDATE(), INTERVAL     -> datetime() / date() with modifiers
+    AUTO_INCREMENT, ENUM, ENGINE=, inline INDEX definitions in CREATE TABLE
+    SELECT ... FOR UPDATE          -> BEGIN IMMEDIATE, then a plain SELECT
+
+DAYNAME, FIELD, GET_LOCK and RELEASE_LOCK are registered as SQL functions.
+Statements MySQL-only at the schema level (SHOW, information_schema, ALTER
+... MODIFY) are not translated; app.py branches on the backend for those.
+
+The database runs in WAL mode, so readers never block the single writer.
+Transactions start at the first write (or locking read), not at the first
+SELECT, which keeps read-then-write requests from failing with a stale
+snapshot when another connection commits in between.
+"""
+
+import re
+import sqlite3
+import threading
+from datetime import date, datetime
+from decimal import ROUND_HALF_UP, Decimal
+from functools import lru_cache
+
+import pymysql
+from pymysql.constants import SERVER_STATUS
+from pymysql.cursors import DictCursorMixin
+
+WEEKDAY_NAMES = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday")
+
+
+# --------- Types ---------
+def _parse_date(raw):
+    return date.fromisoformat(raw.decode()[:10])
+
+
+def _parse_timestamp(raw):
+    return datetime.fromisoformat(raw.decode())
+
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(date, date.isoformat)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" ", timespec="seconds"))
+sqlite3.register_converter("DATE", _parse_date)
+sqlite3.register_converter("TIMESTAMP", _parse_timestamp)
+sqlite3.register_converter("DECIMAL", lambda raw: Decimal(raw.decode()))
+# SQLite keeps whatever precision it is given, so DECIMAL(p,s) columns are declared
+# as DECIMAL_s and rounded to s places on the way out, as MySQL rounds on the way in
+for _scale in range(7):
+    sqlite3.register_converter(
+        f"DECIMAL_{_scale}",
+        lambda raw, exp=Decimal(1).scaleb(-_scale): Decimal(raw.decode()).quantize(exp, ROUND_HALF_UP),
+    )
+
+
+# --------- SQL functions ---------
+def _dayname(value):
+    if value is None:
+        return None
+    day = value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+    return WEEKDAY_NAMES[day.weekday()]
+
+
+def _field(value, *options):
+    try:
+        return options.index(value) + 1
+    except ValueError:
+        return 0
+
+
+_named_locks = {}
+_named_locks_guard = threading.Lock()
+
+
+def _get_lock(name, timeout):
+    # Named locks only need to hold within this process; SQLite itself serializes writers
+    with _named_locks_guard:
+        lock = _named_locks.setdefault(name, threading.Lock())
+    return 1 if lock.acquire(timeout=max(float(timeout), 0)) else 0
+
+
+def _release_lock(name):
+    lock = _named_locks.get(name)
+    if lock is None or not lock.locked():
+        return None
+    lock.release()
+    return 1
+
+
+# --------- Dialect translation ---------
+_PLACEHOLDER = re.compile(r"%([%s])")
+_INTERVAL = re.compile(
+    r"(?:NOW\(\)|CURRENT_TIMESTAMP)\s*([+-])\s*INTERVAL\s+(\([^()]*\)|\?|\d+)\s+SECOND", re.IGNORECASE
+)
+_CREATE_TABLE = re.compile(r"^\s*CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*)\)\s*$", re.IGNORECASE | re.DOTALL)
+_INLINE_INDEX = re.compile(r"^(UNIQUE\s+)?(?:INDEX|KEY)\s+(\w+)\s*\((.*)\)$", re.IGNORECASE | re.DOTALL)
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE", "CREATE", "DROP", "ALTER")
+_SUBSTITUTIONS = [
+    (re.compile(r"\s*ENGINE\s*=\s*\w+", re.IGNORECASE), ""),
+    (re.compile(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b", re.IGNORECASE), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bENUM\s*\([^)]*\)", re.IGNORECASE), "TEXT"),
+    (re.compile(r"\bDECIMAL\s*\(\s*\d+\s*,\s*(\d)\s*\)", re.IGNORECASE), r"DECIMAL_\1"),
+    (re.compile(r"\s+ON\s+UPDATE\s+CURRENT_TIMESTAMP", re.IGNORECASE), ""),
+    (re.compile(r"\s+AFTER\s+\w+\s*$", re.IGNORECASE), ""),
+    (re.compile(r"\bINSERT\s+IGNORE\b", re.IGNORECASE), "INSERT OR IGNORE"),
+    (re.compile(r"\bLEAST\s*\(", re.IGNORECASE), "MIN("),
+    (re.compile(r"\bGREATEST\s*\(", re.IGNORECASE), "MAX("),
+    (re.compile(r"\bNOW\(\)", re.IGNORECASE), "datetime('now', 'localtime')"),
+    (re.compile(r"\bCURDATE\(\)", re.IGNORECASE), "date('now', 'localtime')"),
+    (re.compile(r"\bCURRENT_TIMESTAMP\b", re.IGNORECASE), "(datetime('now', 'localtime'))"),
+]
+
+
+def _split_top_level(body):
+    """Split a CREATE TABLE body on commas outside parentheses"""
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(body):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            parts.append(body[start:i].strip())
+            start = i + 1
+    parts.append(body[start:].strip())
+    return [part for part in parts if part]
+
+
+def _translate_create_table(sql):
+    """Move MySQL's inline INDEX / KEY definitions out into CREATE INDEX statements"""
+    match = _CREATE_TABLE.match(sql)
+    if not match:
+        return [sql]
+    table, body = match.groups()
+    columns, indexes = [], []
+    for part in _split_top_level(body):
+        index = _INLINE_INDEX.match(part)
+        if index is None:
+            columns.append(part)
+        elif index.group(1):
+            columns.append(f"CONSTRAINT {index.group(2)} UNIQUE ({index.group(3)})")
+        else:
+            indexes.append(f"CREATE INDEX IF NOT EXISTS {index.group(2)} ON {table} ({index.group(3)})")
+    return [f"CREATE TABLE IF NOT EXISTS {table} (\n    " + ",\n    ".join(columns) + "\n)"] + indexes
+
+
+@lru_cache(maxsize=1024)
+def translate(sql, has_args=True):
+    """MySQL statement as pymysql would send it -> (sqlite statements, is_locking_read).
+
+    Placeholders are only rewritten when the statement has arguments, matching
+    pymysql, which leaves %% alone in statements executed without any.
+    """
+    if has_args:
+        sql = _PLACEHOLDER.sub(lambda m: "?" if m.group(1) == "s" else "%", sql)
+    locking = bool(re.search(r"\s+FOR\s+UPDATE\s*$", sql, re.IGNORECASE))
+    if locking:
+        sql = re.sub(r"\s+FOR\s+UPDATE\s*$", "", sql, flags=re.IGNORECASE)
+    sql = _INTERVAL.sub(lambda m: f"datetime('now', 'localtime', '{m.group(1)}' || {m.group(2)} || ' seconds')", sql)
+    for pattern, replacement in _SUBSTITUTIONS:
+        sql = pattern.sub(replacement, sql)
+    upsert = re.search(r"\bON\s+DUPLICATE\s+KEY\s+UPDATE\b", sql, re.IGNORECASE)
+    if upsert:
+        updates = re.sub(r"\bVALUES\s*\(\s*(\w+)\s*\)", r"excluded.\1", sql[upsert.end():], flags=re.IGNORECASE)
+        sql = sql[:upsert.start()] + "ON CONFLICT DO UPDATE SET" + updates
+    return tuple(_translate_create_table(sql)), locking
+
+
+def _is_write(sql):
+    return sql.lstrip().upper().startswith(_WRITE_PREFIXES)
+
+
+# --------- Errors ---------
+def _mysql_error(err):
+    """The pymysql exception the app would have seen from MySQL for a sqlite3 error"""
+    message = str(err)
+    if isinstance(err, sqlite3.IntegrityError):
+        return pymysql.err.IntegrityError(1062, message)
+    if isinstance(err, sqlite3.OperationalError):
+        if message.startswith(("no such table", "no such column", "near ", "duplicate column")):
+            return pymysql.err.ProgrammingError(1146, message)
+        return pymysql.err.OperationalError(2013, message)
+    if isinstance(err, sqlite3.ProgrammingError):
+        return pymysql.err.InterfaceError(0, message)
+    return pymysql.err.DatabaseError(0, message)
+
+
+# --------- Connection / Cursor ---------
+class Cursor:
+    """pymysql-style cursor over sqlite3; rows are dicts for DictCursor classes"""
+
+    def __init__(self, connection, as_dict=False):
+        self.connection = connection
+        self._as_dict = as_dict
+        self._cursor = connection._raw.cursor()
+        self._columns = None
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    def _run(self, query, args, many=False):
+        statements, locking = translate(query, args is not None)
+        try:
+            self.connection._begin_for(statements[0], locking)
+            if many:
+                self._cursor.executemany(statements[0], [_params(row) for row in args])
+            elif args is not None:
+                self._cursor.execute(statements[0], _params(args))
+            else:
+                self._cursor.execute(statements[0])
+            for statement in statements[1:]:
+                self._cursor.execute(statement)
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+        self._columns = [col[0] for col in self._cursor.description] if self._cursor.description else None
+        return self._cursor.rowcount
+
+    def execute(self, query, args=None):
+        return self._run(query, args)
+
+    def executemany(self, query, args):
+        args = list(args)
+        if not args:
+            return 0
+        return self._run(query, args, many=True)
+
+    def _row(self, row):
+        if row is None or not self._as_dict:
+            return row
+        return dict(zip(self._columns, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size or self._cursor.arraysize)
+        return [self._row(row) for row in rows]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def __iter__(self):
+        for row in self._cursor:
+            yield self._row(row)
+
+    def close(self):
+        self._cursor.close()
+
+
+def _params(args):
+    if isinstance(args, (tuple, list)):
+        return tuple(args)
+    if isinstance(args, dict):
+        raise TypeError("named %(name)s parameters are not supported by the SQLite backend")
+    return (args,)
+
+
+class Connection:
+    """The subset of pymysql.connections.Connection that app.py relies on"""
+
+    def __init__(self, database, timeout=10.0, autocommit=False, **_ignored):
+        self._raw = sqlite3.connect(
+            database,
+            timeout=timeout,
+            isolation_level=None,  # we issue BEGIN ourselves
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            check_same_thread=False,  # pooled: used by one thread at a time, not always the same one
+        )
+        self._raw.execute("PRAGMA journal_mode=WAL")
+        self._raw.execute("PRAGMA synchronous=NORMAL")
+        self._raw.execute("PRAGMA foreign_keys=ON")
+        self._raw.create_function("DAYNAME", 1, _dayname, deterministic=True)
+        self._raw.create_function("FIELD", -1, _field, deterministic=True)
+        self._raw.create_function("GET_LOCK", 2, _get_lock)
+        self._raw.create_function("RELEASE_LOCK", 1, _release_lock)
+        self._autocommit = bool(autocommit)
+        self.open = True
+
+    def _begin_for(self, statement, locking):
+        if self._autocommit or self._raw.in_transaction:
+            return
+        if locking or _is_write(statement):
+            self._raw.execute("BEGIN IMMEDIATE")
+
+    def cursor(self, cursorclass=None):
+        return Cursor(self, as_dict=bool(cursorclass and issubclass(cursorclass, DictCursorMixin)))
+
+    def commit(self):
+        if self._raw.in_transaction:
+            self._raw.execute("COMMIT")
+
+    def rollback(self):
+        if self._raw.in_transaction:
+            self._raw.execute("ROLLBACK")
+
+    def autocommit(self, value):
+        if value and self._raw.in_transaction:
+            self._raw.execute("COMMIT")
+        self._autocommit = bool(value)
+
+    def get_autocommit(self):
+        return self._autocommit
+
+    @property
+    def server_status(self):
+        return SERVER_STATUS.SERVER_STATUS_IN_TRANS if self._raw.in_transaction else 0
+
+    def ping(self, reconnect=False):
+        try:
+            self._raw.execute("SELECT 1")
+        except sqlite3.Error as err:
+            raise _mysql_error(err) from err
+
+    def close(self):
+        if self.open:
+            self.open = False
+            self._raw.close()
+
+
+def connect(database, **kwargs):
+    # Upserts without a conflict target need SQLite 3.35
+    if sqlite3.sqlite_version_info < (3, 35):
+        raise pymysql.err.OperationalError(0, f"The SQLite backend needs SQLite 3.35 or newer, found {sqlite3.sqlite_version}")
+    return Connection(database, **kwargs)
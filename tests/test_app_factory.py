@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+
+import app as mess
+from conftest import DB_DIR
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_the_app_opens_no_connections_and_starts_no_threads():
+    path = os.path.join(DB_DIR, "import-only.db")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}")
+    probe = "import threading, app; print(threading.active_count(), app._pool is None)"
+    result = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["1", "True"]
+    assert not os.path.exists(path)
+
+
+def test_create_app_applies_its_config(mess_app):
+    try:
+        assert mess.create_app({"MESS_FACTORY_TEST": 1}, check_schema=False) is mess_app
+        assert mess_app.config["MESS_FACTORY_TEST"] == 1
+    finally:
+        mess_app.config.pop("MESS_FACTORY_TEST", None)
+
+
+def test_dispose_pools_closes_idle_connections(mess_app):
+    mess.get_connection().close()
+    pool = mess.get_pool()
+    assert pool.stats()["idle"] >= 1
+    mess.dispose_pools()
+    assert pool.stats()["idle"] == 0
+    assert mess.get_pool() is not pool
@@ -0,0 +1,128 @@
+from datetime import date
+
+import app as mess
+from conftest import add_member
+
+MONTH = date.today().strftime("%Y-%m")
+
+
+def _jobs(cur):
+    cur.connection.commit()
+    cur.execute("SELECT kind, month, status FROM jobs ORDER BY id")
+    return [(row["kind"], row["month"], row["status"]) for row in cur.fetchall()]
+
+
+def test_generating_twice_queues_one_job(admin, db):
+    add_member(db, "Asha")
+    admin.post("/all_bills/generate", data={"month": MONTH})
+    resp = admin.post("/all_bills/generate", data={"month": MONTH}, follow_redirects=True)
+    assert "already in progress" in resp.get_data(as_text=True)
+    assert _jobs(db) == [("generate_bills", MONTH, "queued")]
+
+
+def test_the_worker_bills_every_member_in_chunks(db, monkeypatch):
+    monkeypatch.setattr(mess, "BILL_JOB_CHUNK_SIZE", 2)
+    for name in ("Asha", "Ravi", "Meena"):
+        add_member(db, name)
+    mess.enqueue_job(db, "generate_bills", MONTH)
+    db.connection.commit()
+
+    assert mess.run_next_job() is not None
+    assert mess.run_next_job() is None
+    db.connection.commit()
+    db.execute("SELECT status, processed, total FROM jobs")
+    job = db.fetchone()
+    assert (job["status"], job["processed"], job["total"]) == ("done", 3, 3)
+    db.execute("SELECT COUNT(*) as n FROM monthly_bills WHERE month=%s", (MONTH,))
+    assert db.fetchone()["n"] == 3
+
+
+def test_a_failed_job_is_queued_again_with_its_error(db, monkeypatch):
+    add_member(db, "Asha")
+    mess.enqueue_job(db, "generate_bills", MONTH)
+    db.connection.commit()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(mess, "compute_monthly_bills", fail)
+    mess.run_next_job()
+    db.connection.commit()
+    db.execute("SELECT status, attempts, last_error FROM jobs")
+    job = db.fetchone()
+    assert (job["status"], job["attempts"], job["last_error"]) == ("queued", 1, "database went away")
+
+
+def test_stale_months_are_queued_once_and_generated_by_the_worker(db):
+    add_member(db, "Asha")
+    mess.mark_bills_stale(db, MONTH)
+    db.connection.commit()
+
+    assert mess.refresh_stale_bills() == [MONTH]
+    assert mess.refresh_stale_bills() == []
+    assert _jobs(db) == [("generate_bills", MONTH, "queued")]
+
+    assert mess.run_next_job() is not None
+    assert _jobs(db) == [("generate_bills", MONTH, "done")]
+    db.execute("SELECT COUNT(*) as n FROM monthly_bills WHERE month=%s", (MONTH,))
+    assert db.fetchone()["n"] == 1
+    db.execute("SELECT 1 FROM stale_bill_months WHERE month=%s", (MONTH,))
+    assert db.fetchone() is None
+
+
+def test_viewing_all_bills_writes_nothing(admin, db):
+    add_member(db, "Asha")
+    assert admin.get(f"/all_bills?month={MONTH}").status_code == 200
+    assert _jobs(db) == []
+
+
+def _flagged(cur):
+    cur.connection.commit()
+    cur.execute("SELECT month FROM stale_bill_months ORDER BY month")
+    return [row["month"] for row in cur.fetchall()]
+
+
+def test_flagging_a_month_twice_is_a_no_op(db):
+    mess.mark_bills_stale(db, MONTH, MONTH)
+    mess.mark_bills_stale(db, MONTH)
+    db.execute("SELECT version FROM stale_bill_months WHERE month=%s", (MONTH,))
+    assert db.fetchone()["version"] == 1
+
+
+def test_a_write_during_generation_flags_the_month_again(db, monkeypatch):
+    add_member(db, "Asha")
+    mess.mark_bills_stale(db, MONTH)
+    mess.enqueue_job(db, "generate_bills", MONTH)
+    db.connection.commit()
+
+    compute = mess.compute_monthly_bills
+
+    def compute_then_write(cur, *args, **kwargs):
+        bills = compute(cur, *args, **kwargs)
+        mess.mark_bills_stale(cur, MONTH)  # a meal cancelled while the chunk was computed
+        return bills
+
+    monkeypatch.setattr(mess, "compute_monthly_bills", compute_then_write)
+    mess.run_next_job()
+    assert _flagged(db) == [MONTH]
+
+
+def test_a_failed_generation_leaves_the_month_flagged(db, monkeypatch):
+    add_member(db, "Asha")
+    mess.mark_bills_stale(db, MONTH)
+    mess.enqueue_job(db, "generate_bills", MONTH)
+    db.connection.commit()
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database went away")
+
+    monkeypatch.setattr(mess, "compute_monthly_bills", fail)
+    mess.run_next_job()
+    assert _flagged(db) == [MONTH]
+
+
+def test_moving_a_start_date_back_flags_every_month_in_between(admin, db):
+    asha = add_member(db, "Asha", start=date(2026, 5, 10))
+    resp = admin.post("/members", data={"form_type": "update_mess_date", "user_id": asha, "mess_start_date": "2026-01-15"})
+    assert resp.status_code == 200
+    assert _flagged(db) == ["2026-01", "2026-02", "2026-03", "2026-04", "2026-05"]
@@ -0,0 +1,87 @@
+from datetime import date, timedelta
+
+import pytest
+
+import app as mess
+from conftest import add_member
+
+MONTH = "2024-02"
+FIRST_DAY, NEXT_FIRST_DAY = mess.month_range(MONTH)
+
+
+@pytest.fixture
+def members(db):
+    """Members who eat, skip everything, join mid-month and never record a meal"""
+    eats = add_member(db, "Asha", start=FIRST_DAY)
+    skips = add_member(db, "Ravi", start=FIRST_DAY)
+    joined_late = add_member(db, "Meera", start=FIRST_DAY + timedelta(days=10))
+    no_meals = add_member(db, "Kiran", start=FIRST_DAY)
+    for offset in range(5):
+        day = FIRST_DAY + timedelta(days=offset)
+        db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, %s)", (eats, day, offset % 2))
+        db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 0, 0, 0)", (skips, day))
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 0, 1)", (eats, NEXT_FIRST_DAY))
+    db.executemany(
+        "INSERT INTO expenses (date, amount, category) VALUES (%s, %s, 'Groceries')",
+        [(FIRST_DAY, 1234.5), (FIRST_DAY + timedelta(days=20), 800), (NEXT_FIRST_DAY, 999)],
+    )
+    db.executemany(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, %s, 'UPI', %s)",
+        [(eats, FIRST_DAY, 300, "approved"), (eats, FIRST_DAY, 50, "pending"), (joined_late, FIRST_DAY, 700, "approved"),
+         (no_meals, NEXT_FIRST_DAY, 100, "approved")],
+    )
+    db.connection.commit()
+    return {eats, skips, joined_late, no_meals}
+
+
+def _old_bill(cur, user_id):
+    """The bill as the original per-user loop computed it, one member at a time"""
+    cur.execute("SELECT IFNULL(SUM(amount),0) as total FROM expenses WHERE date >= %s AND date < %s", (FIRST_DAY, NEXT_FIRST_DAY))
+    total_expenses = float(cur.fetchone()["total"] or 0)
+    cur.execute("SELECT IFNULL(SUM(breakfast + lunch + dinner),0) as total FROM meals WHERE date >= %s AND date < %s", (FIRST_DAY, NEXT_FIRST_DAY))
+    total_meals = int(cur.fetchone()["total"] or 0)
+    meal_rate = (total_expenses / total_meals) if total_meals > 0 else 0.0
+
+    cur.execute("SELECT breakfast, lunch, dinner FROM meals WHERE user_id=%s AND date >= %s AND date < %s", (user_id, FIRST_DAY, NEXT_FIRST_DAY))
+    days = cur.fetchall()
+    eaten = sum(d["breakfast"] + d["lunch"] + d["dinner"] for d in days)
+    cancelled = sum(3 - (d["breakfast"] + d["lunch"] + d["dinner"]) for d in days)
+    if eaten == 0 and cancelled == 0:
+        cur.execute("SELECT mess_start_date FROM users WHERE id=%s", (user_id,))
+        start = cur.fetchone()["mess_start_date"] or FIRST_DAY
+        if isinstance(start, str):
+            start = date.fromisoformat(start)
+        billable = ((NEXT_FIRST_DAY - timedelta(days=1)) - max(FIRST_DAY, start)).days * 3 + 3
+    else:
+        billable = eaten + cancelled
+
+    cur.execute(
+        "SELECT IFNULL(SUM(amount),0) as paid FROM payments WHERE user_id=%s AND status='approved' AND date >= %s AND date < %s",
+        (user_id, FIRST_DAY, NEXT_FIRST_DAY),
+    )
+    paid = float(cur.fetchone()["paid"] or 0)
+    return {"billable_meals": billable, "total_amount": billable * meal_rate, "paid_amount": paid,
+            "due_amount": billable * meal_rate - paid}
+
+
+def test_grouped_bills_match_the_per_user_computation(db, members):
+    bills = {bill["user_id"]: bill for bill in mess.compute_monthly_bills(db, MONTH)}
+
+    assert set(bills) == members
+    for user_id, bill in bills.items():
+        old = _old_bill(db, user_id)
+        assert bill["billable_meals"] == old["billable_meals"]
+        for field in ("total_amount", "paid_amount", "due_amount"):
+            assert bill[field] == pytest.approx(old[field]), (user_id, field)
+
+
+def test_grouped_bills_match_each_members_bill_page(admin, db, members, rendered):
+    bills = {bill["user_id"]: bill for bill in mess.compute_monthly_bills(db, MONTH)}
+
+    for user_id in members:
+        admin.get(f"/monthly_bill?month={MONTH}&user_id={user_id}")
+        template, page = rendered[-1]
+        assert template == "monthly_bill.html"
+        assert page["billable_meals"] == bills[user_id]["billable_meals"]
+        for page_field, field in (("bill_amount", "total_amount"), ("payments_sum", "paid_amount"), ("due_amount", "due_amount")):
+            assert float(page[page_field]) == pytest.approx(bills[user_id][field]), (user_id, field)
@@ -0,0 +1,83 @@
+from datetime import date, timedelta
+
+from conftest import add_member, login_as
+
+TODAY = date.today()
+TOMORROW = (TODAY + timedelta(days=1)).isoformat()
+
+
+def _cancelled(cur):
+    cur.connection.commit()
+    cur.execute("SELECT user_id, date, breakfast, lunch, dinner FROM meals ORDER BY user_id, date")
+    return cur.fetchall()
+
+
+def test_admin_cancels_for_listed_members_over_several_days(admin, db):
+    asha, ravi, _ = add_member(db, "Asha"), add_member(db, "Ravi"), add_member(db, "Meena")
+    resp = admin.post("/meals/bulk_cancel", json={
+        "start_date": TOMORROW, "end_date": (TODAY + timedelta(days=3)).isoformat(),
+        "meals": ["lunch"], "user_ids": [asha, ravi],
+    })
+    assert resp.status_code == 200, resp.get_json()
+    assert resp.get_json()["rows"] == 6
+    rows = _cancelled(db)
+    assert [row["user_id"] for row in rows] == [asha] * 3 + [ravi] * 3
+    assert all((row["breakfast"], row["lunch"], row["dinner"]) == (1, 0, 1) for row in rows)
+
+
+def test_a_closure_covers_every_active_member(admin, db):
+    asha, ravi = add_member(db, "Asha"), add_member(db, "Ravi")
+    add_member(db, "Meena", active=False)
+    resp = admin.post("/meals/bulk_cancel", json={"start_date": TOMORROW, "meals": ["breakfast", "lunch", "dinner"]})
+    assert resp.get_json()["members"] == 2
+    assert [row["user_id"] for row in _cancelled(db)] == [asha, ravi]
+
+
+def test_earlier_cancellations_are_kept(admin, db):
+    asha = add_member(db, "Asha")
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 0, 1, 1)", (asha, TOMORROW))
+    db.connection.commit()
+    admin.post("/meals/bulk_cancel", json={"start_date": TOMORROW, "meals": ["dinner"], "user_ids": [asha]})
+    row = _cancelled(db)[0]
+    assert (row["breakfast"], row["lunch"], row["dinner"]) == (0, 1, 0)
+
+
+def test_cancellations_start_tomorrow_at_the_earliest(admin, db):
+    asha = add_member(db, "Asha")
+    resp = admin.post("/meals/bulk_cancel", json={"start_date": TODAY.isoformat(), "meals": ["lunch"], "user_ids": [asha]})
+    assert resp.status_code == 400
+    assert _cancelled(db) == []
+
+
+def test_string_user_ids_are_rejected(admin, db):
+    for name in ("Asha", "Ravi"):
+        add_member(db, name)
+    resp = admin.post("/meals/bulk_cancel", json={"start_date": TOMORROW, "meals": ["lunch"], "user_ids": "12"})
+    assert resp.status_code == 400
+    assert _cancelled(db) == []
+
+
+def test_malformed_json_is_a_400(admin, db):
+    for payload in ([1, 2], "x", {"start_date": TOMORROW, "meals": "lunch"}, {"start_date": 5, "meals": ["lunch"]}):
+        assert admin.post("/meals/bulk_cancel", json=payload).status_code == 400, payload
+    assert _cancelled(db) == []
+
+
+def test_admins_and_inactive_members_are_skipped(admin, db):
+    asha = add_member(db, "Asha")
+    gone = add_member(db, "Ravi", active=False)
+    db.execute("SELECT id FROM users WHERE role='admin'")
+    admin_id = db.fetchone()["id"]
+    resp = admin.post("/meals/bulk_cancel", json={
+        "start_date": TOMORROW, "meals": ["dinner"], "user_ids": [admin_id, gone, asha],
+    })
+    assert resp.get_json()["members"] == 1
+    assert [row["user_id"] for row in _cancelled(db)] == [asha]
+
+
+def test_members_only_cancel_their_own_meals(client, db):
+    asha, ravi = add_member(db, "Asha"), add_member(db, "Ravi")
+    login_as(client, asha)
+    resp = client.post("/meals/bulk_cancel", json={"start_date": TOMORROW, "meals": ["lunch"], "user_ids": [ravi]})
+    assert resp.status_code == 200
+    assert [row["user_id"] for row in _cancelled(db)] == [asha]
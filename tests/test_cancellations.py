@@ -0,0 +1,53 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import add_member
+
+MONTH = "2024-02"
+FIRST_DAY = date(2024, 2, 1)
+
+
+def _fees(cur):
+    cur.execute("SELECT weekday, breakfast_fee, lunch_fee, dinner_fee FROM weekly_fees")
+    return {row["weekday"]: (float(row["breakfast_fee"]), float(row["lunch_fee"]), float(row["dinner_fee"]))
+            for row in cur.fetchall()}
+
+
+def test_refund_totals_match_the_rows_priced_by_weekday(admin, db, rendered):
+    asha, ravi = add_member(db, "Asha"), add_member(db, "Ravi")
+    meals = [
+        (asha, FIRST_DAY, (0, 1, 1)),
+        (asha, FIRST_DAY + timedelta(days=1), (0, 0, 0)),
+        (asha, FIRST_DAY + timedelta(days=2), (1, 1, 1)),
+        (ravi, FIRST_DAY + timedelta(days=1), (1, 0, 1)),
+        (ravi, FIRST_DAY + timedelta(days=5), (1, 1, 0)),
+        (ravi, date(2024, 3, 1), (0, 0, 0)),
+    ]
+    db.executemany(
+        "INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, %s, %s, %s)",
+        [(uid, day) + flags for uid, day, flags in meals],
+    )
+    db.connection.commit()
+    fees = _fees(db)
+    members, days = {}, {}
+    for uid, day, flags in meals:
+        if day.strftime("%Y-%m") != MONTH or all(flags):
+            continue
+        cancelled = flags.count(0)
+        refund = sum(fee for fee, taken in zip(fees[day.strftime("%A")], flags) if not taken)
+        for totals, key in ((members, uid), (days, day.isoformat())):
+            count, meals_cancelled, amount = totals.get(key, (0, 0, 0.0))
+            totals[key] = (count + 1, meals_cancelled + cancelled, amount + refund)
+
+    admin.get(f"/cancellations?month={MONTH}")
+    template, page = rendered[-1]
+
+    assert template == "cancellations.html"
+    assert len(page["cancellations"]) == 4
+    assert {row["user_id"]: (row["days"], int(row["cancelled_meals"]), pytest.approx(float(row["refund"])))
+            for row in page["member_totals"]} == members
+    assert {str(row["date"]): (row["members"], int(row["cancelled_meals"]), pytest.approx(float(row["refund"])))
+            for row in page["day_totals"]} == days
+    assert page["grand_total"]["cancelled_meals"] == sum(t[1] for t in members.values())
+    assert page["grand_total"]["refund"] == pytest.approx(sum(t[2] for t in members.values()))
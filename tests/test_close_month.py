@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+import pytest
+
+import app as mess
+from conftest import add_member
+
+CLOSED = (date.today().replace(day=1) - timedelta(days=40)).strftime("%Y-%m")
+FIRST_DAY, NEXT_FIRST_DAY = mess.month_range(CLOSED)
+NEXT = NEXT_FIRST_DAY.strftime("%Y-%m")
+
+
+@pytest.fixture
+def members(db):
+    asha = add_member(db, "Asha", start=FIRST_DAY)
+    ravi = add_member(db, "Ravi", start=FIRST_DAY)
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 0)", (asha, FIRST_DAY))
+    db.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 3000, 'Groceries')", (FIRST_DAY,))
+    db.connection.commit()
+    return asha, ravi
+
+
+def _approved_payment(cur, user_id, day, amount):
+    cur.execute(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, %s, 'UPI', 'approved')",
+        (user_id, day, amount),
+    )
+    mess.post_payments_to_ledger(cur, [cur.lastrowid])
+    cur.connection.commit()
+
+
+def _stale_months(cur):
+    cur.connection.commit()
+    cur.execute("SELECT month FROM stale_bill_months ORDER BY month")
+    return [row["month"] for row in cur.fetchall()]
+
+
+def _close(cur, monkeypatch):
+    monkeypatch.setattr(mess, "BILL_JOB_CHUNK_SIZE", 1)
+    mess.enqueue_job(cur, "close_month", CLOSED)
+    cur.connection.commit()
+    mess.run_next_job()
+    cur.connection.commit()
+    cur.execute("SELECT status, processed, last_error FROM jobs WHERE kind='close_month'")
+    return cur.fetchone()
+
+
+def test_close_job_bills_charges_and_states_in_chunks(db, members, monkeypatch):
+    asha, ravi = members
+    _approved_payment(db, asha, FIRST_DAY, 100)
+
+    job = _close(db, monkeypatch)
+
+    assert (job["status"], job["processed"], job["last_error"]) == ("done", 2, None)
+    assert mess.last_closed_month(db) == CLOSED
+    db.execute("SELECT user_id, total_amount FROM monthly_bills WHERE month=%s", (CLOSED,))
+    totals = {row["user_id"]: float(row["total_amount"]) for row in db.fetchall()}
+    db.execute("SELECT user_id, charges, credits, closing_balance FROM member_statements WHERE month=%s", (CLOSED,))
+    statements = {row["user_id"]: row for row in db.fetchall()}
+    assert set(statements) == {asha, ravi}
+    assert float(statements[asha]["charges"]) == totals[asha]
+    assert float(statements[asha]["closing_balance"]) == totals[asha] - 100
+    assert float(statements[ravi]["closing_balance"]) == totals[ravi]
+
+
+def test_next_bill_is_due_with_the_balance_brought_forward(db, members, monkeypatch):
+    asha, _ = members
+    _approved_payment(db, asha, FIRST_DAY, 100)
+    _close(db, monkeypatch)
+    _approved_payment(db, asha, NEXT_FIRST_DAY, 40)
+    db.execute("SELECT closing_balance FROM member_statements WHERE user_id=%s AND month=%s", (asha, CLOSED))
+    closing = float(db.fetchone()["closing_balance"])
+
+    bill = mess.compute_monthly_bills(db, NEXT, [asha])[0]
+
+    assert bill["brought_forward"] == closing
+    assert bill["paid_amount"] == 40
+    assert bill["due_amount"] == pytest.approx(bill["total_amount"] + closing - 40)
+
+
+def test_closing_and_late_payments_flag_the_bills_that_carry_them(db, members, monkeypatch):
+    asha, _ = members
+    mess.refresh_month_bills(db, NEXT)
+    db.connection.commit()
+
+    _close(db, monkeypatch)
+    assert NEXT in _stale_months(db)
+
+    mess.refresh_month_bills(db, NEXT)
+    db.connection.commit()
+    _approved_payment(db, asha, FIRST_DAY + timedelta(days=3), 50)
+    assert NEXT in _stale_months(db)
@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+
+from pymysql.cursors import RE_INSERT_VALUES
+
+import app as mess
+from conftest import add_member, login_as
+
+TODAY = date.today()
+TOMORROW = TODAY + timedelta(days=1)
+MONTH = TODAY.strftime("%Y-%m")
+
+
+def test_meals_page_is_not_modified_until_a_meal_changes(client, db):
+    login_as(client, add_member(db, "Asha"))
+    url = f"/meals?month={TOMORROW:%Y-%m}"
+    etag = client.get(url).headers["ETag"]
+    assert client.get(url, headers={"If-None-Match": etag}).status_code == 304
+
+    client.post("/meals/bulk_cancel", json={"start_date": TOMORROW.isoformat(), "meals": ["lunch"]})
+    resp = client.get(url, headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["ETag"] != etag
+
+
+def _meal(cur, user_id):
+    cur.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 0)", (user_id, TODAY))
+
+
+def _expense_from_another_worker(cur, amount):
+    """An expense saved through some other process: versions move, this process's cache is untouched"""
+    cur.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, %s, 'Groceries')", (TODAY, amount))
+    mess.bump_data_version(cur, "expenses", MONTH)
+    cur.connection.commit()
+
+
+def test_bill_etag_never_covers_another_workers_old_rate(client, db):
+    asha = add_member(db, "Asha")
+    _meal(db, asha)
+    _expense_from_another_worker(db, 100)
+    login_as(client, asha)
+    first = client.get(f"/monthly_bill?month={MONTH}")
+    assert "₹50.00" in first.get_data(as_text=True)
+
+    _expense_from_another_worker(db, 100)
+    second = client.get(f"/monthly_bill?month={MONTH}", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert "₹100.00" in second.get_data(as_text=True)
+
+
+def test_ledger_entries_only_change_that_members_bill_etag(client, db):
+    asha, ravi = add_member(db, "Asha"), add_member(db, "Ravi")
+    etags = {}
+    for uid in (asha, ravi):
+        login_as(client, uid)
+        etags[uid] = client.get(f"/monthly_bill?month={MONTH}").headers["ETag"]
+
+    db.execute(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, 300, 'UPI', 'approved')",
+        (asha, TODAY),
+    )
+    mess.post_payments_to_ledger(db, [db.lastrowid])
+    db.connection.commit()
+
+    login_as(client, ravi)
+    assert client.get(f"/monthly_bill?month={MONTH}", headers={"If-None-Match": etags[ravi]}).status_code == 304
+    login_as(client, asha)
+    assert client.get(f"/monthly_bill?month={MONTH}", headers={"If-None-Match": etags[asha]}).status_code == 200
+
+
+class _Recorder:
+    def executemany(self, query, args):
+        self.query, self.args = query, args
+
+
+def test_ledger_versions_are_bumped_in_one_multi_row_insert(db):
+    recorder = _Recorder()
+    mess.bump_ledger_versions(recorder, [2, 1, 2])
+    # pymysql only batches executemany into one INSERT when the statement matches this
+    assert RE_INSERT_VALUES.match(recorder.query)
+    assert len(recorder.args) == 2
+
+    mess.bump_ledger_versions(db, [7])
+    mess.bump_ledger_versions(db, [7])
+    db.execute("SELECT version FROM data_versions WHERE entity=%s AND month=''", (mess.ledger_version_entity(7),))
+    assert db.fetchone()["version"] == 2
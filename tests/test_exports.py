@@ -0,0 +1,46 @@
+from datetime import date
+
+import app as mess
+from conftest import add_member
+
+
+def _in_use():
+    return mess.get_pool().stats()["in_use"]
+
+
+def _meal(cur, user_id):
+    cur.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 0, 1)", (user_id, date.today()))
+    cur.connection.commit()
+
+
+def test_head_requests_return_the_export_connection(admin, db):
+    add_member(db, "Asha")
+    baseline = _in_use()
+    for _ in range(mess.DB_POOL_SIZE + 1):
+        resp = admin.head("/export/meals")
+        assert resp.status_code == 200
+        resp.close()
+        assert _in_use() == baseline
+    assert admin.get("/export/meals").status_code == 200
+
+
+def test_streamed_export_returns_the_connection(admin, db):
+    _meal(db, add_member(db, "Asha"))
+    baseline = _in_use()
+    resp = admin.get("/export/meals?format=jsonl")
+    lines = resp.get_data(as_text=True).splitlines()
+    resp.close()
+    assert len(lines) == 1 and '"lunch": 0' in lines[0]
+    assert _in_use() == baseline
+
+
+def test_csv_export_has_a_header_and_one_line_per_row(admin, db):
+    member = add_member(db, "Asha")
+    _meal(db, member)
+    resp = admin.get(f"/export/meals?month={date.today():%Y-%m}")
+    assert resp.headers["Content-Disposition"] == f"attachment; filename=meals-{date.today():%Y-%m}.csv"
+    lines = resp.get_data(as_text=True).splitlines()
+    assert lines == [
+        "date,user_id,user_name,email,breakfast,lunch,dinner",
+        f"{date.today().isoformat()},{member},Asha,asha@example.com,1,0,1",
+    ]
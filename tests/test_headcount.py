@@ -0,0 +1,85 @@
+from datetime import date, timedelta
+
+import app as mess
+from conftest import add_member
+
+TOMORROW = date.today() + timedelta(days=1)
+
+
+def _counts(client, day, days=1):
+    rows = client.get(f"/headcount?date={day.isoformat()}&days={days}&format=json").get_json()
+    return [(row["members"], row["breakfast"], row["lunch"], row["dinner"]) for row in rows]
+
+
+def test_headcount_is_active_members_less_their_cancellations(admin, db):
+    asha = add_member(db, "Asha")
+    add_member(db, "Ravi")
+    add_member(db, "Meena", active=False)
+    add_member(db, "Kiran", start=TOMORROW + timedelta(days=1))
+    assert _counts(admin, TOMORROW, 2) == [(2, 2, 2, 2), (3, 3, 3, 3)]
+
+    admin.post("/meals/bulk_cancel", json={"start_date": TOMORROW.isoformat(), "meals": ["lunch"], "user_ids": [asha]})
+    assert _counts(admin, TOMORROW) == [(2, 2, 1, 2)]
+
+
+def _stored(cur):
+    cur.connection.commit()
+    cur.execute("SELECT COUNT(*) as n, MAX(date) as last FROM daily_headcount")
+    row = cur.fetchone()
+    return row["n"], row["last"] and mess._as_date(row["last"])
+
+
+def test_headcount_page_writes_nothing(admin, db):
+    add_member(db, "Asha")
+    beyond = date.today() + timedelta(days=mess.HEADCOUNT_HORIZON + 10)
+
+    response = admin.get(f"/headcount?date={beyond.isoformat()}&days=3&format=json")
+
+    assert response.status_code == 200
+    assert [row["lunch"] for row in response.get_json()] == [1, 1, 1]
+    assert _stored(db) == (0, None)
+
+
+def test_stored_days_are_read_and_missing_days_computed(admin, db):
+    member_id = add_member(db, "Asha")
+    add_member(db, "Ravi")
+    tomorrow = date.today() + timedelta(days=1)
+    db.execute(
+        "INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 0, 1, 0)",
+        (member_id, tomorrow),
+    )
+    mess.rebuild_headcount(db, tomorrow, tomorrow)
+    db.connection.commit()
+
+    rows = admin.get(f"/headcount?date={tomorrow.isoformat()}&days=2&format=json").get_json()
+
+    assert [(row["breakfast"], row["lunch"], row["dinner"]) for row in rows] == [(1, 2, 1), (2, 2, 2)]
+    assert _stored(db)[0] == 1
+
+
+def test_refresh_rebuilds_the_horizon_and_drops_rows_past_it(db):
+    add_member(db, "Asha")
+    today = date.today()
+    horizon_end = today + timedelta(days=mess.HEADCOUNT_HORIZON)
+    mess.rebuild_headcount(db, horizon_end + timedelta(days=1), horizon_end + timedelta(days=5))
+
+    mess.refresh_headcount_window(db)
+
+    assert _stored(db) == (mess.HEADCOUNT_HORIZON + 1, horizon_end)
+
+
+def test_worker_queues_the_daily_refresh_once(db):
+    add_member(db, "Asha")
+
+    mess.queue_daily_jobs()
+    mess.queue_daily_jobs()
+    db.connection.commit()
+    db.execute("SELECT kind FROM jobs")
+    assert [row["kind"] for row in db.fetchall()] == ["refresh_headcount"]
+
+    assert mess.run_next_job() is not None
+    mess.queue_daily_jobs()
+    db.connection.commit()
+    db.execute("SELECT status FROM jobs")
+    assert [row["status"] for row in db.fetchall()] == ["done"]
+    assert _stored(db)[0] == mess.HEADCOUNT_HORIZON + 1
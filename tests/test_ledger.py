@@ -0,0 +1,76 @@
+from datetime import date, timedelta
+
+import pytest
+
+import app as mess
+from conftest import add_member
+
+FIRST_DAY = (date.today().replace(day=1) - timedelta(days=70)).replace(day=1)
+MONTH = FIRST_DAY.strftime("%Y-%m")
+NEXT = mess.month_range(MONTH)[1].strftime("%Y-%m")
+
+
+def _payment(cur, user_id, amount):
+    cur.execute(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, %s, 'UPI', 'approved')",
+        (user_id, FIRST_DAY, amount),
+    )
+    return cur.lastrowid
+
+
+def _ledger(cur, user_id):
+    cur.execute("SELECT kind, month, amount, balance FROM member_ledger WHERE user_id=%s ORDER BY id", (user_id,))
+    return [(row["kind"], row["month"], float(row["amount"]), float(row["balance"])) for row in cur.fetchall()]
+
+
+def _statement(cur, user_id, month):
+    cur.execute(
+        "SELECT opening_balance, charges, credits, closing_balance FROM member_statements WHERE user_id=%s AND month=%s",
+        (user_id, month),
+    )
+    row = cur.fetchone()
+    return tuple(float(row[field]) for field in ("opening_balance", "charges", "credits", "closing_balance"))
+
+
+def test_payments_are_credited_reposted_idempotently_and_reversed(db):
+    asha = add_member(db, "Asha")
+    payment_id = _payment(db, asha, 300)
+    assert mess.post_payments_to_ledger(db, [payment_id]) == 1
+    assert mess.post_payments_to_ledger(db, [payment_id]) == 0
+
+    db.execute("UPDATE payments SET status='rejected' WHERE id=%s", (payment_id,))
+    mess.post_payments_to_ledger(db, [payment_id])
+    assert _ledger(db, asha) == [("payment", MONTH, -300, -300), ("payment", MONTH, 300, 0)]
+
+
+def test_each_close_states_what_was_posted_since_the_last(db):
+    asha = add_member(db, "Asha", start=FIRST_DAY)
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 0)", (asha, FIRST_DAY))
+    db.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 100, 'Groceries')", (FIRST_DAY,))
+    mess.post_payments_to_ledger(db, [_payment(db, asha, 120)])
+
+    mess.close_month(db, MONTH)
+    assert _statement(db, asha, MONTH) == (0, 150, 120, 30)
+
+    mess.close_month(db, NEXT)
+    assert _statement(db, asha, NEXT) == (30, 0, 0, 30)
+    assert mess.last_closed_month(db) == NEXT
+
+
+def test_months_close_in_order(db):
+    mess.close_month(db, NEXT)
+    with pytest.raises(ValueError):
+        mess.close_month(db, MONTH)
+
+
+def test_backfill_closes_every_month_from_the_first_payment(mess_app, db):
+    asha = add_member(db, "Asha", start=FIRST_DAY)
+    _payment(db, asha, 120)
+    db.connection.commit()
+
+    result = mess_app.test_cli_runner().invoke(args=["backfill-ledger", "--through", NEXT])
+    assert result.exit_code == 0, result.output
+    assert f"Closed {MONTH}" in result.output and f"Closed {NEXT}" in result.output
+    db.connection.commit()
+    assert mess.last_closed_month(db) == NEXT
+    assert _statement(db, asha, NEXT) == (-120, 0, 0, -120)
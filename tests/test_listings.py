@@ -0,0 +1,56 @@
+import html
+import re
+from datetime import date, timedelta
+
+from conftest import add_member
+
+ROW = re.compile(r"<td>(\d{4}-\d\d-\d\d)</td>\s*<td>([^<]*)</td>")
+NEXT = re.compile(r'href="([^"]*)">Next page')
+
+
+def _walk(client, url):
+    """Every (date, member) row across the keyset pages starting at url, and the page count"""
+    rows, pages = [], 0
+    while url:
+        body = client.get(url).get_data(as_text=True)
+        rows += ROW.findall(body)
+        pages += 1
+        link = NEXT.search(body)
+        url = html.unescape(link.group(1)) if link else None
+    return rows, pages
+
+
+def test_meal_pages_cover_every_row_once_in_order(admin, db):
+    names = ["Asha", "Ravi", "Meena"]
+    ids = {add_member(db, name): name for name in names}
+    first = date.today().replace(day=1)
+    days = [first + timedelta(days=n) for n in range(4)]
+    db.executemany(
+        "INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 1)",
+        [(uid, day) for uid in ids for day in days],
+    )
+    db.connection.commit()
+
+    # Page boundaries fall inside a day (2 rows per page, 3 members per day) and on a day's last row
+    for per_page, expected_pages in ((2, 6), (3, 4), (12, 1), (11, 2)):
+        rows, pages = _walk(admin, f"/meals?month={first:%Y-%m}&per_page={per_page}")
+        expected = [(day.isoformat(), ids[uid]) for day in reversed(days) for uid in sorted(ids, reverse=True)]
+        assert rows == expected, per_page
+        assert pages == expected_pages
+
+
+def test_payment_pages_cover_every_row_once(admin, db):
+    member = add_member(db, "Asha")
+    first = date.today().replace(day=1)
+    db.executemany(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, %s, 'UPI', 'approved')",
+        [(member, first + timedelta(days=n // 3), 100 + n) for n in range(7)],
+    )
+    db.connection.commit()
+    seen, url = [], f"/payments?month={first:%Y-%m}&per_page=2"
+    while url:
+        body = admin.get(url).get_data(as_text=True)
+        seen += re.findall(r"₹?(1\d\d)\.00", body)
+        link = NEXT.search(body)
+        url = html.unescape(link.group(1)) if link else None
+    assert sorted(seen) == [str(100 + n) for n in range(7)]
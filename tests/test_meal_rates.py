@@ -0,0 +1,57 @@
+from datetime import date
+
+import app as mess
+from conftest import add_member
+
+
+class _Cache(mess.MealRateCache):
+    """Cache whose computation returns scripted totals and can run a hook mid-compute"""
+
+    def __init__(self, results, during=None):
+        super().__init__(maxsize=4, ttl=60)
+        self.results = list(results)
+        self.during = during
+        self.computed = 0
+
+    def _compute(self, cur, month):
+        self.computed += 1
+        if self.during:
+            hook, self.during = self.during, None
+            hook()
+        return self.results.pop(0)
+
+
+def test_hits_are_served_from_the_cache():
+    cache = _Cache([{"meal_rate": 10.0}])
+    assert cache.get(None, "2026-01") == cache.get(None, "2026-01") == {"meal_rate": 10.0}
+    assert cache.computed == 1
+
+
+def test_a_new_expense_invalidates_the_month(admin, db):
+    today = date.today()
+    month = today.strftime("%Y-%m")
+    member = add_member(db, "Asha")
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 0)", (member, today))
+    db.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 100, 'Groceries')", (today,))
+    db.connection.commit()
+    assert mess.meal_rates.get(db, month)["meal_rate"] == 50
+
+    admin.post("/expenses", data={"date": today.isoformat(), "amount": "100", "category": "Groceries", "notes": ""})
+    db.connection.commit()
+    assert mess.meal_rates.get(db, month)["meal_rate"] == 100
+
+
+def test_invalidation_during_a_compute_is_not_lost():
+    cache = _Cache([{"meal_rate": 10.0}, {"meal_rate": 12.0}])
+    cache.during = lambda: cache.invalidate("2026-01")
+    # The first result was computed from data the invalidating write has since changed
+    assert cache.get(None, "2026-01") == {"meal_rate": 10.0}
+    assert cache.get(None, "2026-01") == {"meal_rate": 12.0}
+    assert cache.computed == 2
+
+
+def test_clear_during_a_compute_is_not_lost():
+    cache = _Cache([{"meal_rate": 10.0}, {"meal_rate": 12.0}])
+    cache.during = cache.clear
+    cache.get(None, "2026-01")
+    assert cache.get(None, "2026-01") == {"meal_rate": 12.0}
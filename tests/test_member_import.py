@@ -0,0 +1,51 @@
+import io
+import threading
+
+from werkzeug.security import check_password_hash
+
+import app as mess
+
+
+def _upload(client, content):
+    return client.post(
+        "/members",
+        data={"form_type": "import", "members_file": (io.BytesIO(content), "members.csv")},
+        content_type="multipart/form-data",
+    )
+
+
+def _members(cur):
+    cur.connection.commit()
+    cur.execute("SELECT email FROM users WHERE role='member' ORDER BY email")
+    return [row["email"] for row in cur.fetchall()]
+
+
+def test_import_creates_new_members_and_reports_the_rest(admin, db):
+    resp = _upload(admin, b"name,email,mess_start_date\nAsha,asha@example.com,2026-01-05\nBad,not-an-email,\nAsha again,ASHA@example.com,\n")
+    body = resp.get_data(as_text=True)
+    assert resp.status_code == 200
+    assert "1 created, 1 skipped, 1 rejected" in body
+    assert _members(db) == ["asha@example.com"]
+
+
+def test_a_file_that_is_not_utf8_is_reported_not_a_500(admin, db):
+    resp = _upload(admin, "name,email\nJosé,jose@example.com\n".encode("latin-1"))
+    assert resp.status_code == 200
+    assert "UTF-8" in resp.get_data(as_text=True)
+    assert _members(db) == []
+
+
+def test_large_batches_hash_on_threads_in_this_process(monkeypatch):
+    monkeypatch.setattr(mess, "MEMBER_IMPORT_HASH_WORKERS", 4)
+    seen = set()
+    original = mess.generate_password_hash
+
+    def recording_hash(password, **kwargs):
+        seen.add(threading.current_thread().name)
+        return original(password, **kwargs)
+
+    monkeypatch.setattr(mess, "generate_password_hash", recording_hash)
+    passwords = [f"pw{n}" for n in range(mess.MEMBER_IMPORT_PARALLEL_MIN)]
+    hashes = mess.hash_passwords(passwords)
+    assert all(check_password_hash(h, p) for h, p in zip(hashes, passwords))
+    assert seen and all(name.startswith("hash") for name in seen)
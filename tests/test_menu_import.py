@@ -0,0 +1,53 @@
+import io
+
+from conftest import add_member, login_as
+
+
+def _upload(client, content):
+    return client.post(
+        "/menu",
+        data={"form_type": "import", "menu_file": (io.BytesIO(content), "menu.csv")},
+        content_type="multipart/form-data",
+    )
+
+
+def _menus(cur):
+    cur.connection.commit()
+    cur.execute("SELECT date, breakfast_menu, snacks_menu, dinner_menu FROM menu ORDER BY date")
+    return [(str(row["date"]), row["breakfast_menu"], row["snacks_menu"], row["dinner_menu"]) for row in cur.fetchall()]
+
+
+def test_menu_rows_are_imported(admin, db):
+    resp = _upload(admin, b"date,breakfast,lunch,snacks,dinner\n2026-01-05,Idli,Dal,Tea,Roti\n2026-01-06,Dosa,Rice,,Pulao\n")
+    assert "Imported menus for 2 days" in resp.get_data(as_text=True)
+    assert _menus(db) == [("2026-01-05", "Idli", "Tea", "Roti"), ("2026-01-06", "Dosa", None, "Pulao")]
+
+
+def test_one_bad_row_rejects_the_whole_file(admin, db):
+    resp = _upload(admin, b"date,breakfast,lunch,dinner\n2026-01-05,Idli,Dal,Roti\n05/01/2026,Dosa,Rice,Pulao\n")
+    assert "Menu import rejected: line 3" in resp.get_data(as_text=True)
+    assert _menus(db) == []
+
+
+def test_members_cannot_change_the_menu(client, db):
+    login_as(client, add_member(db, "Asha"))
+    resp = _upload(client, b"date,breakfast,lunch,dinner\n2026-01-05,Idli,Dal,Roti\n")
+    assert "Only admins can change the menu" in resp.get_data(as_text=True)
+    assert _menus(db) == []
+
+
+def test_the_weekly_form_fills_seven_days(admin, db):
+    admin.post("/menu", data={
+        "form_type": "weekly", "week_start": "2026-01-05",
+        "breakfast_menu": "Idli", "lunch_menu": "Dal", "snacks_menu": "Tea", "dinner_menu": "Roti",
+    })
+    menus = _menus(db)
+    assert [day for day, *_ in menus] == [f"2026-01-{n:02d}" for n in range(5, 12)]
+    assert {tuple(rest) for _, *rest in menus} == {("Idli", "Tea", "Roti")}
+
+
+def test_a_file_that_is_not_utf8_is_reported_not_a_500(admin, db):
+    resp = _upload(admin, "date,breakfast,lunch,dinner\n2026-01-05,Idli,Dal,Crème\n".encode("latin-1"))
+    assert resp.status_code == 200
+    assert "UTF-8" in resp.get_data(as_text=True)
+    assert _menus(db) == []
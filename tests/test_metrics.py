@@ -0,0 +1,54 @@
+import pytest
+
+import app as mess
+from conftest import login_as
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    fresh = mess.RequestMetrics()
+    monkeypatch.setattr(mess, "request_metrics", fresh)
+    return fresh
+
+
+@pytest.fixture
+def token(monkeypatch):
+    monkeypatch.setattr(mess, "METRICS_TOKEN", "s3cret")
+    return "s3cret"
+
+
+def test_each_request_is_counted_with_its_queries(admin, metrics):
+    assert admin.get("/expenses").status_code == 200
+    assert metrics.requests[("expenses", "GET", "200")] == 1
+    queries = metrics.histograms[("db_queries", "expenses", "GET")]
+    assert queries.total == 1 and queries.sum >= 2
+
+
+def test_metrics_are_served_in_the_prometheus_format(admin, metrics):
+    admin.get("/expenses")
+    resp = admin.get("/metrics")
+    assert resp.status_code == 200
+    body = resp.get_data(as_text=True)
+    assert 'mess_http_requests_total{endpoint="expenses",method="GET",status="200"} 1' in body
+    assert "# TYPE mess_db_queries histogram" in body
+
+
+def test_loopback_address_alone_is_not_enough(client):
+    resp = client.get("/metrics", environ_base={"REMOTE_ADDR": "127.0.0.1"})
+    assert resp.status_code == 403
+
+
+def test_bearer_token_is_accepted(client, token):
+    assert client.get("/metrics", headers={"Authorization": f"Bearer {token}"}).status_code == 200
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 403
+
+
+def test_no_token_configured_means_no_token_access(client):
+    assert client.get("/metrics", headers={"Authorization": "Bearer "}).status_code == 403
+
+
+def test_admins_can_read_metrics(client):
+    login_as(client, 1, role="admin")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert "mess_http_requests_total" in resp.get_data(as_text=True)
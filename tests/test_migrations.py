@@ -0,0 +1,27 @@
+import app as mess
+
+
+def _seed_counts(cur):
+    cur.execute("SELECT COUNT(*) FROM users WHERE role='admin'")
+    admins = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM weekly_fees")
+    fees = cur.fetchone()[0]
+    cur.execute("SELECT COUNT(*) FROM schema_version")
+    return admins, fees, cur.fetchone()[0]
+
+
+def test_a_second_run_applies_nothing(db):
+    assert mess.run_migrations() == []
+    assert mess.get_schema_version(db.connection.cursor()) == mess.LATEST_SCHEMA_VERSION
+
+
+def test_every_step_can_run_again_on_a_migrated_database(db):
+    cur = db.connection.cursor()
+    before = _seed_counts(cur)
+    db.connection.autocommit(True)
+    try:
+        for version, description, step in mess.MIGRATIONS:
+            step(cur)
+    finally:
+        db.connection.autocommit(False)
+    assert _seed_counts(cur) == before
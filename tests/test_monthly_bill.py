@@ -0,0 +1,63 @@
+from datetime import date
+
+import pytest
+
+import app as mess
+from conftest import add_member, login_as
+
+TODAY = date.today()
+MONTH = TODAY.strftime("%Y-%m")
+
+
+@pytest.fixture
+def asha(db):
+    """A member with 2 meals eaten and 1 cancelled in a month whose rate is 50"""
+    member = add_member(db, "Asha")
+    db.execute("INSERT INTO meals (user_id, date, breakfast, lunch, dinner) VALUES (%s, %s, 1, 1, 0)", (member, TODAY))
+    db.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 100, 'Groceries')", (TODAY,))
+    db.connection.commit()
+    return member
+
+
+def _bill_amount(client, pages):
+    client.get(f"/monthly_bill?month={MONTH}")
+    template, page = pages[-1]
+    assert template == "monthly_bill.html"
+    return float(page["bill_amount"])
+
+
+def _stored_bills(cur):
+    cur.connection.commit()
+    cur.execute("SELECT COUNT(*) as n FROM monthly_bills")
+    return cur.fetchone()["n"]
+
+
+def test_viewing_a_bill_writes_nothing(client, db, asha, rendered):
+    login_as(client, asha)
+    assert _bill_amount(client, rendered) == 150
+    assert _stored_bills(db) == 0
+
+
+def test_the_stored_bill_is_served_until_its_month_is_flagged(client, db, asha, rendered):
+    mess.refresh_month_bills(db, MONTH)
+    db.execute("UPDATE monthly_bills SET total_amount=999 WHERE user_id=%s", (asha,))
+    db.connection.commit()
+    login_as(client, asha)
+    assert _bill_amount(client, rendered) == 999
+
+    mess.mark_bills_stale(db, MONTH)
+    db.connection.commit()
+    assert _bill_amount(client, rendered) == 150
+
+
+def test_expired_bills_are_regenerated_once_not_recomputed_on_every_read(db, asha):
+    mess.refresh_month_bills(db, MONTH)
+    db.execute("UPDATE monthly_bills SET refreshed_at = NOW() - INTERVAL %s SECOND", (mess.MONTHLY_BILL_MAX_AGE + 60,))
+    db.connection.commit()
+    assert mess.read_monthly_bill(db, asha, MONTH) is None
+
+    assert mess.refresh_stale_bills() == [MONTH]
+    assert mess.run_next_job() is not None
+    db.connection.commit()
+    assert mess.read_monthly_bill(db, asha, MONTH)["total_amount"] == 150
+    assert mess.refresh_stale_bills() == []
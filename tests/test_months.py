@@ -0,0 +1,30 @@
+from datetime import date
+
+import app as mess
+
+
+def test_month_range_is_half_open():
+    assert mess.month_range("2024-02") == (date(2024, 2, 1), date(2024, 3, 1))
+    assert mess.month_range("2023-12") == (date(2023, 12, 1), date(2024, 1, 1))
+
+
+def test_missing_or_malformed_months_fall_back_to_this_month():
+    this_month = date.today().strftime("%Y-%m")
+    assert mess.resolve_month("2024-02") == "2024-02"
+    for month in (None, "", "2024-13", "february", "2024-02-01"):
+        assert mess.resolve_month(month) == this_month, month
+
+
+def test_expenses_listing_keeps_to_the_month(admin, db, rendered):
+    db.executemany(
+        "INSERT INTO expenses (date, amount, category) VALUES (%s, %s, 'Groceries')",
+        [(date(2024, 1, 31), 100), (date(2024, 2, 1), 200), (date(2024, 2, 29), 300), (date(2024, 3, 1), 400)],
+    )
+    db.connection.commit()
+
+    admin.get("/expenses?month=2024-02")
+
+    template, page = rendered[-1]
+    assert template == "expenses.html"
+    assert sorted(float(row["amount"]) for row in page["expenses"]) == [200, 300]
+    assert float(page["total"]) == 500
@@ -0,0 +1,45 @@
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import app as mess
+
+
+def _member(cur, password, method):
+    cur.execute(
+        "INSERT INTO users (name, email, password_hash, role) VALUES ('Asha', 'asha@example.com', %s, 'member')",
+        (generate_password_hash(password, method=method),),
+    )
+    cur.connection.commit()
+    return cur.lastrowid
+
+
+def _stored_hash(cur, user_id):
+    cur.connection.commit()
+    cur.execute("SELECT password_hash FROM users WHERE id=%s", (user_id,))
+    return cur.fetchone()["password_hash"]
+
+
+def _login(client, password):
+    return client.post("/login", data={"email": "asha@example.com", "password": password})
+
+
+def test_login_upgrades_a_hash_made_with_another_work_factor(client, db):
+    member = _member(db, "s3cret", "pbkdf2:sha256:2000")
+    assert _login(client, "s3cret").status_code == 302
+    stored = _stored_hash(db, member)
+    assert stored.startswith("pbkdf2:sha256:1000$")
+    assert check_password_hash(stored, "s3cret")
+    assert not mess.password_needs_rehash(stored)
+
+
+def test_a_current_hash_is_left_alone(client, db):
+    member = _member(db, "s3cret", mess.PASSWORD_HASH_METHOD)
+    before = _stored_hash(db, member)
+    assert _login(client, "s3cret").status_code == 302
+    assert _stored_hash(db, member) == before
+
+
+def test_a_wrong_password_rehashes_nothing(client, db):
+    member = _member(db, "s3cret", "pbkdf2:sha256:2000")
+    before = _stored_hash(db, member)
+    assert _login(client, "wrong").status_code == 200
+    assert _stored_hash(db, member) == before
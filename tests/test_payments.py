@@ -0,0 +1,54 @@
+from datetime import date
+
+from conftest import add_member
+
+
+def _pending(cur, user_id, amount, day=None):
+    cur.execute(
+        "INSERT INTO payments (user_id, date, amount, method, status) VALUES (%s, %s, %s, 'UPI', 'pending')",
+        (user_id, day or date.today(), amount),
+    )
+    cur.connection.commit()
+    return cur.lastrowid
+
+
+def _statuses(cur):
+    cur.connection.commit()
+    cur.execute("SELECT id, status FROM payments ORDER BY id")
+    return {row["id"]: row["status"] for row in cur.fetchall()}
+
+
+def test_batch_approves_only_the_listed_ids(admin, db):
+    member = add_member(db, "Asha")
+    ids = [_pending(db, member, 100 + n) for n in range(3)]
+    resp = admin.post("/payments/batch", json={"action": "approve", "payment_ids": [ids[0], ids[2]]})
+    assert resp.status_code == 200
+    assert resp.get_json()["updated"] == 2
+    assert _statuses(db) == {ids[0]: "approved", ids[1]: "pending", ids[2]: "approved"}
+
+
+def test_batch_rejects_a_string_of_ids(admin, db):
+    member = add_member(db, "Asha")
+    ids = [_pending(db, member, 100) for _ in range(12)]
+    resp = admin.post("/payments/batch", json={"action": "approve", "payment_ids": str(ids[-1])})
+    assert resp.status_code == 400
+    assert set(_statuses(db).values()) == {"pending"}
+
+
+def test_batch_rejects_malformed_json(admin, db):
+    member = add_member(db, "Asha")
+    pid = _pending(db, member, 100)
+    for payload in ([pid], "approve", {"action": ["approve"], "payment_ids": [pid]},
+                    {"action": "approve", "payment_ids": [True]}, {"action": "approve", "payment_ids": [[pid]]}):
+        assert admin.post("/payments/batch", json=payload).status_code == 400, payload
+    assert _statuses(db) == {pid: "pending"}
+
+
+def test_batch_requires_admin(client, db):
+    member = add_member(db, "Asha")
+    pid = _pending(db, member, 100)
+    from conftest import login_as
+    login_as(client, member)
+    resp = client.post("/payments/batch", json={"action": "approve", "payment_ids": [pid]})
+    assert resp.status_code == 403
+    assert _statuses(db) == {pid: "pending"}
@@ -0,0 +1,46 @@
+from datetime import date
+
+import pytest
+
+import app as mess
+
+
+def _in_use():
+    return mess.get_pool().stats()["in_use"]
+
+
+def _small_pool():
+    return mess.ConnectionPool(mess.get_pool().config, size=1, timeout=0.1)
+
+
+def test_a_request_borrows_one_connection_and_returns_it_on_teardown(db):
+    baseline = _in_use()
+    with mess.app.app_context():
+        conn = mess.get_connection()
+        assert mess.get_connection() is conn
+        conn.close()  # request-scoped, so still borrowed
+        assert _in_use() == baseline + 1
+    assert _in_use() == baseline
+
+
+def test_an_exhausted_pool_times_out():
+    pool = _small_pool()
+    held = pool.connection()
+    with pytest.raises(mess.PoolTimeout):
+        pool.connection()
+    held.close()
+    assert pool.stats()["timeouts"] == 1
+    pool.connection().close()
+
+
+def test_a_returned_connection_carries_no_open_transaction(db):
+    pool = _small_pool()
+    conn = pool.connection()
+    conn.cursor().execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 10, 'Groceries')", (date.today(),))
+    conn.close()
+
+    conn = pool.connection()
+    cur = conn.cursor()
+    cur.execute("SELECT COUNT(*) FROM expenses")
+    assert cur.fetchone()[0] == 0
+    conn.close()
@@ -0,0 +1,64 @@
+import shutil
+from datetime import date
+
+import pytest
+from pymysql.cursors import DictCursor
+
+import app as mess
+from conftest import DB_DIR
+
+MONTH = date.today().strftime("%Y-%m")
+
+pytestmark = pytest.mark.skipif(mess.DB_BACKEND != "sqlite", reason="the replica stands in as a copy of the SQLite file")
+
+
+@pytest.fixture
+def replica(db, monkeypatch):
+    """A read replica that is a snapshot of the primary taken now, and so lags every later write"""
+    db.connection.commit()
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    path = f"{DB_DIR}/replica.db"
+    shutil.copyfile(mess.DB_CONFIG["database"], path)
+    monkeypatch.setattr(mess, "READ_DB_CONFIG", {"database": path, "autocommit": True})
+    mess.dispose_pools()
+    yield
+    mess.dispose_pools()
+
+
+def _expense(cur, amount):
+    cur.execute("INSERT INTO expenses (date, amount, category) VALUES (%s, %s, 'Groceries')", (date.today(), amount))
+    cur.connection.commit()
+
+
+def _expenses(conn):
+    cur = conn.cursor(DictCursor)
+    cur.execute("SELECT COUNT(*) as n FROM expenses")
+    return cur.fetchone()["n"]
+
+
+def test_readonly_connections_come_from_the_replica(db, replica):
+    _expense(db, 500)
+    with mess.app.test_request_context():
+        mess.start_request_accounting()
+        assert _expenses(mess.get_connection(readonly=True)) == 0
+        assert _expenses(mess.get_connection()) == 1
+
+
+def test_a_request_that_wrote_reads_from_the_primary(db, replica):
+    with mess.app.test_request_context():
+        mess.start_request_accounting()
+        primary = mess.get_connection()
+        primary.cursor().execute("INSERT INTO expenses (date, amount, category) VALUES (%s, 500, 'Groceries')", (date.today(),))
+        assert mess.get_connection(readonly=True) is primary
+        assert _expenses(primary) == 1
+        primary.rollback()
+
+
+def test_replica_totals_are_not_cached(db, replica):
+    _expense(db, 500)
+    with mess.app.test_request_context():
+        replica_cur = mess.get_connection(readonly=True).cursor(DictCursor)
+        assert replica_cur.from_replica
+        assert mess.meal_rates.get(replica_cur, MONTH)["total_expenses"] == 0
+    # The primary, as a session pinned after its write reads it, sees the expense
+    assert mess.meal_rates.get(db, MONTH)["total_expenses"] == 500
@@ -0,0 +1,37 @@
+import app as mess
+
+
+class _CountingCaps(mess.SchemaCapabilities):
+    def __init__(self):
+        super().__init__()
+        self.loads = 0
+
+    def _load(self):
+        self.loads += 1
+        return super()._load()
+
+
+def test_columns_are_read_once_until_invalidated(db):
+    caps = _CountingCaps()
+    assert caps.has_column("users", "mess_start_date")
+    assert caps.has_column("meals", "breakfast")
+    assert not caps.has_column("meals", "snack_count")
+    assert caps.loads == 1
+
+    caps.invalidate()
+    assert caps.has_column("users", "is_active")
+    assert caps.loads == 2
+
+
+def test_a_new_column_shows_up_after_invalidate(db):
+    caps = mess.SchemaCapabilities()
+    assert not caps.has_column("expenses", "receipt_url")
+    db.execute("ALTER TABLE expenses ADD COLUMN receipt_url VARCHAR(255) DEFAULT NULL")
+    db.connection.commit()
+    try:
+        assert not caps.has_column("expenses", "receipt_url")
+        caps.invalidate()
+        assert caps.has_column("expenses", "receipt_url")
+    finally:
+        db.execute("ALTER TABLE expenses DROP COLUMN receipt_url")
+        db.connection.commit()
@@ -0,0 +1,79 @@
+from datetime import date
+from decimal import Decimal
+
+import pymysql
+import pytest
+from pymysql.cursors import DictCursor
+
+import sqlite_backend
+from sqlite_backend import translate
+
+
+def test_upserts_become_on_conflict_with_excluded_values():
+    statements, locking = translate(
+        "INSERT INTO meals (user_id, date, lunch) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE lunch=LEAST(lunch, VALUES(lunch))"
+    )
+    assert statements == (
+        "INSERT INTO meals (user_id, date, lunch) VALUES (?, ?, ?) "
+        "ON CONFLICT DO UPDATE SET lunch=MIN(lunch, excluded.lunch)",
+    )
+    assert not locking
+
+
+def test_insert_ignore_and_least_greatest():
+    assert translate("INSERT IGNORE INTO member_balances (user_id) VALUES (%s)")[0] == (
+        "INSERT OR IGNORE INTO member_balances (user_id) VALUES (?)",
+    )
+    assert translate("SELECT GREATEST(a, 1), LEAST(b, 2) FROM t", has_args=False)[0] == ("SELECT MAX(a, 1), MIN(b, 2) FROM t",)
+
+
+def test_for_update_is_dropped_and_reported_as_a_locking_read():
+    assert translate("SELECT user_id FROM member_balances ORDER BY user_id FOR UPDATE", has_args=False) == (
+        ("SELECT user_id FROM member_balances ORDER BY user_id",), True,
+    )
+
+
+def test_inline_keys_move_out_of_create_table():
+    statements, _ = translate(
+        """CREATE TABLE IF NOT EXISTS daily_headcount (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            date DATE NOT NULL,
+            kind ENUM('a','b') NOT NULL,
+            amount DECIMAL(10,2) NOT NULL DEFAULT 0,
+            UNIQUE KEY uniq_day (date, kind),
+            INDEX idx_amount (amount)
+        ) ENGINE=InnoDB""",
+        has_args=False,
+    )
+    table, index = statements
+    assert "id INTEGER PRIMARY KEY AUTOINCREMENT" in table
+    assert "kind TEXT NOT NULL" in table and "amount DECIMAL_2" in table
+    assert "CONSTRAINT uniq_day UNIQUE (date, kind)" in table
+    assert "INDEX" not in table and "ENGINE" not in table
+    assert index == "CREATE INDEX IF NOT EXISTS idx_amount ON daily_headcount (amount)"
+
+
+def test_a_connection_speaks_the_mysql_dialect(tmp_path):
+    conn = sqlite_backend.connect(str(tmp_path / "mess.db"))
+    cur = conn.cursor(DictCursor)
+    cur.execute(
+        """CREATE TABLE IF NOT EXISTS meals (
+            user_id INT NOT NULL, date DATE NOT NULL, lunch TINYINT NOT NULL DEFAULT 1,
+            fee DECIMAL(10,2) NOT NULL DEFAULT 0,
+            UNIQUE KEY uniq_user_date (user_id, date)
+        ) ENGINE=InnoDB"""
+    )
+    upsert = (
+        "INSERT INTO meals (user_id, date, lunch, fee) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE lunch=LEAST(lunch, VALUES(lunch)), fee=VALUES(fee)"
+    )
+    cur.executemany(upsert, [(1, date(2026, 1, 5), 0, "12.345"), (1, date(2026, 1, 5), 1, "40.005")])
+    conn.commit()
+    cur.execute("SELECT date, lunch, fee FROM meals")
+    assert cur.fetchall() == [{"date": date(2026, 1, 5), "lunch": 0, "fee": Decimal("40.01")}]
+
+    with pytest.raises(pymysql.err.IntegrityError):
+        cur.execute("INSERT INTO meals (user_id, date) VALUES (%s, %s)", (1, date(2026, 1, 5)))
+    conn.rollback()
+    conn.close()
@@ -0,0 +1,46 @@
+import pytest
+
+import app as mess
+
+
+class _CountingMenus(mess.WeeklyMenuCache):
+    def __init__(self):
+        super().__init__()
+        self.builds = 0
+
+    def _build(self, cur):
+        self.builds += 1
+        return super()._build(cur)
+
+
+@pytest.fixture
+def template(db):
+    """The stored weekly template as the admin form posts it; saved back after the test"""
+    db.execute("SELECT * FROM weekly_menu")
+    form = {f"{row['weekday']}_{col}": row[col] or "" for row in db.fetchall() for col in mess.WEEKLY_MENU_COLUMNS}
+    db.execute("SELECT name, timing FROM meal_timings")
+    form.update({f"timing_{row['name']}": row["timing"] or "" for row in db.fetchall()})
+    yield dict(form)
+    mess.save_weekly_template(db, form)
+    db.connection.commit()
+
+
+def test_the_menu_is_built_once_per_version(db):
+    menus = _CountingMenus()
+    first = menus.get(db)
+    assert menus.get(db) is first
+    assert menus.builds == 1
+
+    mess.bump_data_version(db, "weekly_menu")
+    db.connection.commit()
+    menus.get(db)
+    assert menus.builds == 2
+
+
+def test_a_saved_template_reaches_every_workers_cache(admin, db, template):
+    other_worker = mess.WeeklyMenuCache()
+    other_worker.get(db)
+
+    admin.post("/menu", data={**template, "form_type": "template", "Monday_lunch_menu": "Khichdi"})
+    db.connection.commit()
+    assert other_worker.get(db)["weekly_menu"]["Monday"]["lunch_menu"] == "Khichdi"